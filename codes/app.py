@@ -1,14 +1,38 @@
-from flask import Flask, request, jsonify, render_template, render_template_string, session, redirect, url_for
-import mysql.connector
+from flask import Flask, Response, g, has_request_context, request, jsonify, render_template, render_template_string, session, redirect, url_for
 import hashlib
 import os
+import time
 from dotenv import load_dotenv
 from mysql.connector.errors import DatabaseError
-from datetime import datetime
+from datetime import datetime, timedelta
 from flask_cors import CORS
+from db_pool import ConnectionPool
+from db_router import ReplicaSet, replica_configs
+from catalog import EventCatalog
+from facets import facet_query, summarize as summarize_facets
+from pagination import paginate, page_limit, encode_cursor, decode_cursor
+from search_index import TitleIndex
+from result_cache import ResultCache
+from ticket_stats import TICKETS_SELECT, iter_chunks, summarize_event, summarize_events
+from city_counts import adjust_city_count, top_cities, start_reconciler
+from bulk_ingest import iter_rows, ingest
+from export import CONTENT_TYPES, parse_projection, stream_table
+from notifications import NotificationHub, StreamSlots, claim_notifications
+from job_queue import NotificationWorker, enqueue_cancellation, queue_stats
+from versions import VersionCounters, conditional_get
+from fast_json import init_json
+from compression import init_compression
+from metrics import Registry, QueryMetrics
+from slow_queries import SlowQueryLog
+from migrations import require_schema, start_index_check
+import wishlist
+import ticket_holds
+from transactions import IdempotencyConflict, TransactionRunner, start_key_purger
+from wishlist_counts import adjust_wishlist_counts, start_reconciler as start_wishlist_count_reconciler
 
 app = Flask(__name__)
 CORS(app)
+init_json(app)
 
 # Configure FLASK_DEBUG from environment variable
 app.config['DEBUG'] = os.environ.get('FLASK_DEBUG')
@@ -25,15 +49,441 @@ APP_SECRET_KEY = os.getenv('APP_SECRET_KEY')
 
 app.secret_key = APP_SECRET_KEY
 
+# gzip/brotli for large buffered responses
+init_compression(app, min_size=int(os.getenv('COMPRESS_MIN_SIZE', '1024')))
+
 db_config = {
     'host': GCP_DB_HOST,
     'user': GCP_DB_USER,
     'password': GCP_DB_PASSWORD,
     'database': GCP_DB_NAME,
 }
-# Connect to MySQL
+# Connection pool, sized to the gunicorn thread count (see Dockerfile)
+db_pool = ConnectionPool(
+    db_config,
+    size=int(os.getenv('DB_POOL_SIZE', '8')),
+    timeout=float(os.getenv('DB_POOL_TIMEOUT', '10')),
+    max_lifetime=float(os.getenv('DB_POOL_MAX_LIFETIME', '1800')),
+    validate_idle=float(os.getenv('DB_POOL_VALIDATE_IDLE', '30')),
+)
+
+# Read replicas (REPLICA_DB_HOSTS=host[:port],...) for the read-only routes
+replica_pools = []
+for name, replica_config in replica_configs(os.getenv('REPLICA_DB_HOSTS', ''), db_config,
+                                            os.getenv('REPLICA_DB_USER'), os.getenv('REPLICA_DB_PASSWORD')):
+    pool = ConnectionPool(
+        replica_config,
+        size=int(os.getenv('DB_POOL_SIZE', '8')),
+        timeout=float(os.getenv('REPLICA_POOL_TIMEOUT', '2')),
+        max_lifetime=float(os.getenv('DB_POOL_MAX_LIFETIME', '1800')),
+        validate_idle=float(os.getenv('DB_POOL_VALIDATE_IDLE', '30')),
+    )
+    pool.query_listeners = db_pool.query_listeners
+    replica_pools.append((name, pool))
+replicas = ReplicaSet(
+    db_pool,
+    replica_pools,
+    retry_after=float(os.getenv('REPLICA_RETRY_SECONDS', '30')),
+    max_lag=float(os.getenv('REPLICA_MAX_LAG', '10')),
+)
+if replica_pools:
+    replicas.start_health_checker(float(os.getenv('REPLICA_CHECK_INTERVAL', '5')))
+# A session reads from the primary for this long after it writes
+READ_YOUR_WRITES_SECONDS = float(os.getenv('READ_YOUR_WRITES_SECONDS', '5'))
+
+# Prometheus metrics, served at /metrics
+metrics = Registry()
+request_latency = metrics.histogram(
+    'http_request_duration_seconds', 'Flask request latency.', ['endpoint', 'method', 'status'])
+connection_wait = metrics.histogram(
+    'db_connection_acquire_seconds', 'Time to borrow a pooled connection.')
+db_pool.query_listeners.append(QueryMetrics(metrics))
+
+# Statements slower than SLOW_QUERY_MS, with EXPLAIN plans, for /admin/slow-queries
+slow_query_log = SlowQueryLog(
+    threshold=float(os.getenv('SLOW_QUERY_MS', '200')) / 1000,
+    size=int(os.getenv('SLOW_QUERY_LOG_SIZE', '200')),
+)
+db_pool.query_listeners.append(slow_query_log)
+metrics.gauge('db_pool', 'Connection pool counters and occupancy.', ['stat'],
+              lambda: {(k,): v for k, v in db_pool.stats().items()})
+metrics.gauge('db_replica_healthy', 'Whether each read replica is in rotation.', ['replica'],
+              lambda: {(name,): int(r['healthy']) for name, r in replicas.stats()['replicas'].items()})
+
+# Borrow a pooled MySQL connection; conn.close() returns it to the pool
 def get_db_connection():
-    return mysql.connector.connect(**db_config)
+    start = time.perf_counter()
+    try:
+        return db_pool.get_connection()
+    finally:
+        connection_wait.observe(time.perf_counter() - start)
+
+def reads_pinned_to_primary():
+    return has_request_context() and session.get('primary_until', 0) > time.time()
+
+# Borrow a connection for a read-only query: a replica when one is healthy,
+# the primary if there is none, this session has just written, or the
+# request fills an ETag or cache entry that another session just changed
+def get_read_connection():
+    if not replica_pools or reads_pinned_to_primary() or (has_request_context() and g.get('read_from_primary')):
+        return get_db_connection()
+    start = time.perf_counter()
+    try:
+        return replicas.read_connection()
+    finally:
+        connection_wait.observe(time.perf_counter() - start)
+
+slow_query_log.start_explainer(get_db_connection)
+
+# Apply pending migrations before serving, or refuse to start on an old schema
+if os.getenv('SCHEMA_CHECK', '1') == '1':
+    require_schema(get_db_connection, run_migrations=os.getenv('RUN_MIGRATIONS', '1') == '1')
+
+# Warn at startup about missing hot-predicate indexes
+if os.getenv('INDEX_CHECK', '1') == '1':
+    start_index_check(get_db_connection)
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def pin_reads_after_write(response):
+    if replica_pools and request.method in ('POST', 'PUT', 'DELETE') and response.status_code < 400:
+        session['primary_until'] = time.time() + READ_YOUR_WRITES_SECONDS
+    return response
+
+@app.after_request
+def record_request_latency(response):
+    started = g.pop('request_started', None)
+    if started is not None:
+        request_latency.observe(time.perf_counter() - started,
+                                request.endpoint or 'unmatched', request.method, response.status_code)
+    return response
+
+# Stable sort key for event listings; keyset cursors are built from it
+EVENT_ORDER = ['datetime_local', 'event_title']
+EVENT_LISTING_FROM = "FROM ActiveEvents NATURAL JOIN Locations"
+EVENT_LISTING_SELECT = "SELECT event_title, datetime_local, location_name, promoter_name, city " + EVENT_LISTING_FROM
+
+# Wishlisted events ranked by popularity, filterable like the listing above.
+# Counts come from EventWishlistCounts, read in index order; ticket totals
+# are looked up per returned event through Tickets.event_title.
+POPULAR_ORDER = ['w.wishlist_count DESC', 'w.event_title']
+POPULAR_FROM = """
+    FROM (SELECT event_title, wishlist_count FROM EventWishlistCounts WHERE wishlist_count > 0) w
+    JOIN ActiveEvents e ON e.event_title = w.event_title
+    JOIN Locations l ON l.location_name = e.location_name
+"""
+POPULAR_EVENTS_SELECT = """
+    SELECT e.event_title, e.datetime_local, e.location_name, e.promoter_name, l.city,
+           w.wishlist_count,
+           (SELECT SUM(t.quantity) FROM Tickets t WHERE t.event_title = e.event_title) AS number_of_tickets
+""" + POPULAR_FROM
+
+def parse_date_filter(value):
+    """Parse a YYYY-MM-DD filter value; raises ValueError if malformed."""
+    try:
+        return datetime.strptime(value, '%Y-%m-%d')
+    except ValueError:
+        raise ValueError(f'Invalid date: {value}')
+
+def date_range(args):
+    """(start, end) datetimes of the date filters; the end is exclusive, None if unset."""
+    start_date = args.get('start_date', '')
+    end_date = args.get('end_date', '')
+    start = parse_date_filter(start_date) if start_date else None
+    # Inclusive of the whole end day
+    end = parse_date_filter(end_date) + timedelta(days=1) if end_date else None
+    return start, end
+
+def event_filters(args, include_city=True):
+    """WHERE conditions and params for the city and date filters of /filtered-events."""
+    conditions = []
+    params = []
+    city = args.get('city', 'all')
+    if city != 'all' and include_city:
+        conditions.append("city = %s")
+        params.append(city)
+
+    start, end = date_range(args)
+    if start:
+        conditions.append("datetime_local >= %s")
+        params.append(start)
+    if end:
+        conditions.append("datetime_local < %s")
+        params.append(end)
+    return conditions, params
+
+# Facet counts for a search go through the matched titles unless there are
+# more than this many, when a LIKE over titles stands in
+FACET_SEARCH_LIMIT = int(os.getenv('FACET_SEARCH_LIMIT', '5000'))
+
+# A page of a search ranks only the SEARCH_MAX_MATCHES best matches past its
+# cursor position, and issues at most SEARCH_MAX_CHUNKS queries before it is
+# returned short with a next_cursor
+SEARCH_MAX_MATCHES = int(os.getenv('SEARCH_MAX_MATCHES', '1000'))
+SEARCH_MAX_CHUNKS = int(os.getenv('SEARCH_MAX_CHUNKS', '4'))
+
+def facets_requested(args):
+    return args.get('facets') in ('1', 'true')
+
+def facets_query(args, tab, query, cities=None, matches=None):
+    """(sql, params) counting the /filtered-events matches by city and month,
+    or None when nothing can match. `cities` are the major-tab cities and
+    `matches` the title index results of the search, if any."""
+    conditions, params = event_filters(args, include_city=False)
+    if cities is not None:
+        if not cities:
+            return None
+        conditions.append("city IN (" + ", ".join(["%s"] * len(cities)) + ")")
+        params.extend(cities)
+    if query:
+        if matches is not None and len(matches) <= FACET_SEARCH_LIMIT:
+            if not matches:
+                return None
+            conditions.append("event_title IN (" + ", ".join(["%s"] * len(matches)) + ")")
+            params.extend(matches)
+        else:
+            conditions.append("LOWER(e.event_title) LIKE %s" if tab == 'popular' else "LOWER(event_title) LIKE %s")
+            params.append(f'%{query}%')
+    from_sql = POPULAR_FROM if tab == 'popular' else EVENT_LISTING_FROM
+    return facet_query(from_sql, conditions, params)
+
+# Change counters behind the ETags of the listing routes
+table_versions = VersionCounters(
+    replica_lag=replicas.max_lag if replica_pools else 0,
+    max_age=float(os.getenv('ETAG_MAX_AGE', '30')),
+)
+
+def logged_in_tables(*tables):
+    """ETag inputs for a login-only listing; per-user names use '{user}'."""
+    def tables_for_request(*args, **kwargs):
+        if 'user' not in session:
+            return None
+        return [t.format(user=session['user']) for t in tables]
+    return tables_for_request
+
+# Title search index, kept in sync by the event create/update/delete routes.
+# It is built in the background at startup; searches scan with LIKE until then.
+# Writes through other processes or straight into MySQL change the watermark
+# (event_changed_at also moves on cancellation); it is checked every
+# TITLE_INDEX_REFRESH_INTERVAL seconds and the index rebuilt when it moved.
+title_index = TitleIndex()
+
+EVENT_TITLES_SELECT = "SELECT event_title FROM ActiveEvents"
+EVENT_TITLES_WATERMARK = "SELECT MAX(event_changed_at), COUNT(*) FROM Events"
+
+def query_primary(sql):
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute(sql)
+        return cursor.fetchall()
+    finally:
+        conn.close()
+
+def load_event_titles():
+    return [row[0] for row in query_primary(EVENT_TITLES_SELECT)]
+
+def load_event_titles_watermark():
+    return tuple(query_primary(EVENT_TITLES_WATERMARK)[0])
+
+title_index.start_loader(load_event_titles, float(os.getenv('TITLE_INDEX_RETRY_INTERVAL', '30')),
+                         load_event_titles_watermark, float(os.getenv('TITLE_INDEX_REFRESH_INTERVAL', '30')))
+
+def search_position(after):
+    """Position in the ranked matches that a search cursor points at."""
+    pos = decode_cursor(after, 1)[0] if after else 0
+    if not isinstance(pos, int) or pos < 0:
+        raise ValueError('Invalid cursor')
+    return pos
+
+def search_matches(query, after):
+    """(titles, truncated): the best matches of `query`, ranked, through
+    SEARCH_MAX_MATCHES past the cursor; `truncated` when there are more."""
+    wanted = search_position(after) + SEARCH_MAX_MATCHES
+    matches = title_index.search(query, wanted)
+    return matches, len(matches) >= wanted
+
+def search_facet_titles(query, matches, truncated):
+    """The titles to count facets over: all of them when the ranked matches were cut off."""
+    return title_index.matching(query) if truncated else matches
+
+# Shorter queries only match word prefixes in the index, so they keep the
+# substring semantics of the LIKE scan instead ("ft" finds "Swift")
+SEARCH_MIN_INDEX_QUERY = 3
+
+def search_by_index(query, after):
+    """Whether a search is answered from the title index: once it is built,
+    for queries the trigrams can answer, except for later pages of a search
+    that began as a LIKE scan."""
+    if not query or len(query.strip()) < SEARCH_MIN_INDEX_QUERY or not title_index.loaded:
+        return False
+    if after:
+        try:
+            decode_cursor(after, 1)
+        except ValueError:
+            return False
+    return True
+
+# Cached results of the ranking procedures; cleared whenever an event or
+# wishlist write commits
+procedure_cache = ResultCache(
+    ttl=float(os.getenv('PROCEDURE_CACHE_TTL', '30')),
+    max_entries=int(os.getenv('PROCEDURE_CACHE_SIZE', '128')),
+)
+
+# Ticket price analytics per event, keyed by lowercased title (titles compare
+# case-insensitively). A ticket write or an event rename/delete (which cascade
+# to Tickets) drops the entries of the events it touched and the 'all' entry.
+ticket_summary_cache = ResultCache(
+    ttl=float(os.getenv('TICKET_SUMMARY_TTL', '300')),
+    max_entries=int(os.getenv('TICKET_SUMMARY_CACHE_SIZE', '1024')),
+)
+TICKET_SUMMARY_CHUNK = int(os.getenv('TICKET_SUMMARY_CHUNK', '50000'))
+
+def ticket_summary_key(event_title):
+    return ('event', event_title.lower())
+
+# procedure_cache entries that carry number_of_tickets: the popular tab's
+# pages and GetPopularEvents
+POPULAR_CACHE_GROUPS = ['popular', 'GetPopularEvents']
+
+def tickets_changed(event_titles):
+    """After a commit that changed the tickets of `event_titles`."""
+    if not event_titles:
+        return
+    table_versions.bump('Tickets')
+    ticket_summary_cache.invalidate([ticket_summary_key(title) for title in event_titles if title] + ['all'])
+    procedure_cache.invalidate(groups=POPULAR_CACHE_GROUPS)
+
+def cached_read(cache, key, load):
+    """cache.get_or_load(), except for a session that just wrote: a result cached
+    from a lagging replica must not hide its own change. Within REPLICA_MAX_LAG
+    of an invalidation, the cache is filled from the primary for the same reason."""
+    if reads_pinned_to_primary():
+        return load()
+    if replica_pools and cache.invalidated_within(replicas.max_lag, key):
+        g.read_from_primary = True
+    return cache.get_or_load(key, load)
+
+def call_cached_procedure(name, arg):
+    """Return the rows of `CALL name(arg)`, served from procedure_cache when fresh."""
+    def load():
+        conn = get_read_connection()
+        try:
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute(f"CALL {name}(%s)", (arg,))
+            return cursor.fetchall()
+        finally:
+            conn.close()
+    return cached_read(procedure_cache, (name, arg), load)
+
+def counters_repaired(table):
+    """A reconciler changed `table`: the listings ranked by it are stale."""
+    table_versions.bump(table)
+    procedure_cache.invalidate()
+
+# Keep CityEventCounts in step with Events (0 disables the job)
+CITY_COUNTS_RECONCILE_INTERVAL = float(os.getenv('CITY_COUNTS_RECONCILE_INTERVAL', '300'))
+if CITY_COUNTS_RECONCILE_INTERVAL > 0:
+    start_reconciler(get_db_connection, CITY_COUNTS_RECONCILE_INTERVAL,
+                     on_repaired=lambda _: counters_repaired('CityEventCounts'))
+
+# Keep EventWishlistCounts in step with WishList (0 disables the job)
+WISHLIST_COUNTS_RECONCILE_INTERVAL = float(os.getenv('WISHLIST_COUNTS_RECONCILE_INTERVAL', '300'))
+if WISHLIST_COUNTS_RECONCILE_INTERVAL > 0:
+    start_wishlist_count_reconciler(get_db_connection, WISHLIST_COUNTS_RECONCILE_INTERVAL,
+                                    on_repaired=lambda _: counters_repaired('EventWishlistCounts'))
+
+# Wakes notification streams; the poller picks up rows from other processes
+notification_hub = NotificationHub()
+NOTIFY_STREAM_SECONDS = float(os.getenv('NOTIFY_STREAM_SECONDS', '55'))
+NOTIFY_POLL_INTERVAL = float(os.getenv('NOTIFY_POLL_INTERVAL', '1'))
+if NOTIFY_POLL_INTERVAL > 0:
+    notification_hub.start_poller(get_db_connection, NOTIFY_POLL_INTERVAL)
+# Each open stream or long-poll holds a gunicorn thread; past this many,
+# they are turned away so the other routes keep a thread to run on
+notification_slots = StreamSlots(int(os.getenv('NOTIFY_MAX_STREAMS', '4')))
+
+# Drains cancellation fan-out jobs queued by delete_event
+def notify_users(usernames):
+    for username in usernames:
+        notification_hub.notify(username)
+
+notification_worker = NotificationWorker(
+    get_db_connection,
+    batch_size=int(os.getenv('NOTIFY_JOB_BATCH_SIZE', '500')),
+    interval=float(os.getenv('NOTIFY_JOB_INTERVAL', '5')),
+    on_delivered=notify_users,
+)
+if os.getenv('NOTIFY_JOB_WORKER', '1') == '1':
+    notification_worker.start()
+
+metrics.gauge('procedure_cache', 'Procedure result cache counters.', ['stat'],
+              lambda: {(k,): v for k, v in procedure_cache.stats().items()})
+metrics.gauge('notification_streams', 'Open notification streams and long-polls, and those turned away.',
+              ['stat'], lambda: {(k,): v for k, v in notification_slots.stats().items() if v is not None})
+metrics.gauge('notification_worker', 'Notification fan-out worker counters.', ['stat'],
+              lambda: {(k,): v for k, v in notification_worker.stats().items()})
+
+def fetch_ranked_events(cursor, ranked_titles, conditions, params, after, limit, truncated=False):
+    """Page through search matches in rank order, keeping rows that pass `conditions`.
+
+    With `truncated`, more matches follow `ranked_titles`, so the page gets a
+    next_cursor even when it reaches their end.
+    """
+    pos = search_position(after)
+    chunk_size = max(limit * 2, 100)
+    events = []
+    chunks = 0
+    while pos < len(ranked_titles) and len(events) < limit and chunks < SEARCH_MAX_CHUNKS:
+        chunk = ranked_titles[pos:pos + chunk_size]
+        cursor.execute(*ranked_events_query(chunk, conditions, params))
+        pos = collect_ranked_events(events, chunk, cursor.fetchall(), pos, limit)
+        chunks += 1
+    next_cursor = encode_cursor([pos]) if pos < len(ranked_titles) or truncated else None
+    return events, next_cursor
+
+def ranked_events_query(chunk, conditions, params):
+    sql = EVENT_LISTING_SELECT + " WHERE event_title IN (" + ", ".join(["%s"] * len(chunk)) + ")"
+    for condition in conditions:
+        sql += " AND " + condition
+    return sql, tuple(chunk) + tuple(params)
+
+def collect_ranked_events(events, chunk, rows, pos, limit):
+    """Append the rows of `chunk` to `events` in rank order; returns the new position."""
+    found = {row['event_title'].lower(): row for row in rows}
+    for title in chunk:
+        pos += 1
+        row = found.get(title.lower())
+        if row:
+            events.append(row)
+            if len(events) == limit:
+                break
+    return pos
+
+def is_admin():
+    return 'user' in session and session.get('is_admin') == 1
+
+def listing_payload(rows, next_cursor, fmt, facets=None):
+    """A page of rows; format 'compact' sends column names once and rows as arrays."""
+    if fmt == 'compact':
+        columns = list(rows[0].keys()) if rows else []
+        payload = {
+            'columns': columns,
+            'rows': [[row[c] for c in columns] for row in rows],
+            'next_cursor': next_cursor,
+        }
+    else:
+        payload = {'results': rows, 'next_cursor': next_cursor}
+    if facets is not None:
+        payload['facets'] = facets
+    return payload
+
+def listing_response(rows, next_cursor, facets=None):
+    return jsonify(listing_payload(rows, next_cursor, request.args.get('format'), facets))
 
 # Helper function to hash passwords
 def hash_password(password):
@@ -51,301 +501,434 @@ def home():
 def index():
     return render_template('index.html')
 
+@app.route('/pool/stats')
+def pool_stats():
+    """Report connection pool counters."""
+    return jsonify(db_pool.stats())
+
+@app.route('/admin/slow-queries', methods=['GET', 'DELETE'])
+def slow_queries():
+    """View (GET) or clear (DELETE) the slow query log. Admins only."""
+    if not is_admin():
+        return jsonify({'error': 'Unauthorized access'}), 403
+    if request.method == 'DELETE':
+        slow_query_log.reset()
+        return jsonify({'message': 'Slow query log cleared'})
+    return jsonify({
+        'threshold_ms': slow_query_log.threshold * 1000,
+        'entries': slow_query_log.entries(),
+    })
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """Prometheus text exposition of the app's metrics."""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/jobs/stats')
+def jobs_stats():
+    """Report notification queue depth, lag and worker counters."""
+    conn = None
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        stats = queue_stats(cursor)
+        stats['worker'] = notification_worker.stats()
+        return jsonify(stats)
+    except Exception as e:
+        print(e)
+        return jsonify({'error': f'An error occurred: {str(e)}'}), 500
+    finally:
+        if conn:
+            conn.close()
+
+@app.route('/cache/stats')
+def cache_stats():
+    """Report stored procedure result cache counters."""
+    return jsonify(procedure_cache.stats())
+
+@app.route('/replicas/stats')
+def replica_stats():
+    """Report read replica health, lag and routing counters."""
+    return jsonify(replicas.stats())
+
 # CRUD APIs
 
+# Write routes run their statements through here: one transaction, retried
+# on deadlocks and lock wait timeouts, made idempotent by an Idempotency-Key
+# header. `work(cursor)` returns (body, status); `after_commit` runs once the
+# write is durable, and not at all when a stored response is replayed.
+transaction_runner = TransactionRunner(
+    get_db_connection,
+    metrics,
+    budget=float(os.getenv('TX_RETRY_BUDGET_SECONDS', '10')),
+    base_delay=float(os.getenv('TX_RETRY_BASE_DELAY', '0.05')),
+    max_delay=float(os.getenv('TX_RETRY_MAX_DELAY', '2')),
+)
+IDEMPOTENCY_KEY_TTL = float(os.getenv('IDEMPOTENCY_KEY_TTL_HOURS', '24')) * 3600
+IDEMPOTENCY_PURGE_INTERVAL = float(os.getenv('IDEMPOTENCY_PURGE_INTERVAL', '3600'))
+if IDEMPOTENCY_PURGE_INTERVAL > 0:
+    start_key_purger(get_db_connection, IDEMPOTENCY_KEY_TTL, IDEMPOTENCY_PURGE_INTERVAL)
+
+def request_hash():
+    """What an Idempotency-Key is bound to: the caller, the target and the body."""
+    digest = hashlib.sha256()
+    for part in (session.get('user') or '', request.method, request.full_path):
+        digest.update(part.encode() + b'\0')
+    digest.update(request.get_data())
+    return digest.hexdigest()
+
+def run_write(work, after_commit=None, isolation_level=None):
+    key = request.headers.get('Idempotency-Key')
+    if key is not None and not 0 < len(key) <= 255:
+        return jsonify({'error': 'Idempotency-Key must be 1 to 255 characters'}), 400
+    try:
+        body, status, replayed = transaction_runner.run(
+            work, request.endpoint, key, request_hash() if key else None, isolation_level)
+    except IdempotencyConflict:
+        return jsonify({'error': 'Idempotency-Key was already used for a different request'}), 422
+    except DatabaseError as e:
+        print(e)
+        if e.errno == 1205:  # Lock wait timeout exceeded, still after retrying
+            return jsonify({'error': 'Lock wait timeout exceeded. Please try again later.'}), 503, {'Retry-After': '1'}
+        if e.errno == 1213:
+            return jsonify({'error': 'Deadlock detected. Please try again later.'}), 503, {'Retry-After': '1'}
+        return jsonify({'error': f'Database error: {str(e)}'}), 500
+    except Exception as e:
+        print(e)
+        return jsonify({'error': f'An unexpected error occurred: {str(e)}'}), 500
+    if replayed:
+        return jsonify(body), status, {'Idempotent-Replayed': 'true'}
+    if after_commit:
+        after_commit()
+    return jsonify(body), status
+
+
 # Create User
 @app.route('/users/create', methods=['POST'])
 def create_user():
     data = request.json
-    conn = None
-    try:
+
+    def work(cursor):
         hashed_password = hash_password(data['password'])
-        conn = get_db_connection()
-        cursor = conn.cursor()
         query = "INSERT INTO Users (username, name, password, is_admin) VALUES (%s, %s, %s, %s)"
         cursor.execute(query, (data['username'], data['name'], hashed_password, data['is_admin']))
-        conn.commit()
-        return jsonify({'message': 'User created successfully!'}), 201
-    except DatabaseError as e:
-        if conn:
-            conn.rollback()
-        print(e)
-        error_code = e.args[0]
-        if error_code == 1205: 
-            return jsonify({'error': 'Lock wait timeout exceeded. Please try again later.'}), 500
-        else:
-            return jsonify({'error': f'Database error: {str(e)}'}), 500
-    except Exception as e:
-        if conn:
-            conn.rollback() 
-        return jsonify({'error': f'An unexpected error occurred: {str(e)}'}), 500
-    finally:
-        if conn:
-            conn.close()
+        return {'message': 'User created successfully!'}, 201
+    return run_write(work)
 # Create Ticket
 @app.route('/tickets/create', methods=['POST'])
 def create_ticket():
     data = request.json
-    conn = None
-    try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
+
+    def work(cursor):
         query = "INSERT INTO Tickets (ticket_id, event_title, ticket_price, fee, total_price, quantity, full_section, section, row_num) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)"
         cursor.execute(query, (data["ticket_id"], data["event_title"], data["ticket_price"], data["fee"], data["total_price"], data["quantity"], data["full_section"], data["section"], data["row_num"]))
-        conn.commit()
-        return jsonify({'message': 'Ticket created successfully!'}), 201
-    except DatabaseError as e:
-        if conn:
-            conn.rollback()
-        print(e)
-        error_code = e.args[0]
-        if error_code == 1205: 
-            return jsonify({'error': 'Lock wait timeout exceeded. Please try again later.'}), 500
-        else:
-            return jsonify({'error': f'Database error: {str(e)}'}), 500
-    except Exception as e:
-        if conn:
-            conn.rollback() 
-        return jsonify({'error': f'An unexpected error occurred: {str(e)}'}), 500
-    finally:
-        if conn:
-            conn.close()
+        return {'message': 'Ticket created successfully!'}, 201
+    return run_write(work, lambda: tickets_changed([data["event_title"]]))
 
 # Create Event
 @app.route('/events/create', methods=['POST'])
 def create_event():
     data = request.json
-    conn = None
-    try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
+    created = []
+
+    def work(cursor):
+        created.clear()
+        cursor.execute("SELECT event_cancelled_at FROM Events WHERE event_title = %s FOR UPDATE",
+                       (data["event_title"],))
+        existing = cursor.fetchall()
+        if existing:
+            if existing[0][0] is not None:
+                return {'error': 'An event with this title was cancelled and is still being removed. '
+                                 'Please try again later.'}, 409
+            return {'error': 'An event with this title already exists'}, 409
         query = """
             INSERT INTO Events (event_title, event_url, datetime_local, location_name, promoter_name)
             VALUES (%s, %s, %s, %s, %s)
         """
         cursor.execute(query, (data["event_title"], data["event_url"], data["datetime_local"], data["location_name"], data["promoter_name"]))
-        conn.commit()
-        return jsonify({'message': 'Events created successfully!'}), 201
-    except DatabaseError as e:
-        if conn:
-            conn.rollback()  # Instantly remove locks by rolling back the transaction
-        print(e)
-        error_code = e.args[0]
-        if error_code == 1205:  # Lock wait timeout exceeded
-            return jsonify({'error': 'Lock wait timeout exceeded. Please try again later.'}), 500
-        else:
-            return jsonify({'error': f'Database error: {str(e)}'}), 500
+        adjust_city_count(cursor, data["location_name"], 1)
+        created.append(True)
+        return {'message': 'Events created successfully!'}, 201
+
+    def after_commit():
+        if not created:
+            return
+        title_index.add(data["event_title"])
+        event_catalog.mark_stale()
+        procedure_cache.invalidate()
+        table_versions.bump('Events')
+    return run_write(work, after_commit)
+
+# Bulk create Tickets / Events from a streamed NDJSON or CSV body
+TICKET_COLUMNS = ['ticket_id', 'event_title', 'ticket_price', 'fee', 'total_price', 'quantity', 'full_section', 'section', 'row_num']
+EVENT_COLUMNS = ['event_title', 'event_url', 'datetime_local', 'location_name', 'promoter_name']
+
+def bulk_batch_size():
+    try:
+        return max(1, min(int(request.args.get('batch_size', 1000)), 10000))
+    except ValueError:
+        raise ValueError('batch_size must be an integer')
+
+@app.route('/tickets/bulk', methods=['POST'])
+def bulk_create_tickets():
+    conn = None
+    changed_titles = set()
+    try:
+        batch_size = bulk_batch_size()
+        conn = get_db_connection()
+
+        def after_commit(rows):
+            changed_titles.update(str(row['event_title']) for row in rows)
+
+        rows = iter_rows(request.stream, request.content_type)
+        summary = ingest(conn, rows, 'Tickets', TICKET_COLUMNS, batch_size, after_commit=after_commit)
+        return jsonify(summary), 201 if summary['inserted'] else 400
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
+        print(e)
+        return jsonify({'error': f'An unexpected error occurred: {str(e)}'}), 500
+    finally:
+        # Batches committed before a failure stay in
         if conn:
-            conn.rollback()  # Ensure rollback for any unexpected error
+            conn.close()
+        tickets_changed(changed_titles)
+
+@app.route('/events/bulk', methods=['POST'])
+def bulk_create_events():
+    conn = None
+    inserted_titles = []
+    try:
+        batch_size = bulk_batch_size()
+        conn = get_db_connection()
+
+        def on_batch(cursor, rows):
+            locations = {}
+            for row in rows:
+                locations[row['location_name']] = locations.get(row['location_name'], 0) + 1
+            for location_name, count in locations.items():
+                adjust_city_count(cursor, location_name, count)
+
+        def after_commit(rows):
+            inserted_titles.extend(row['event_title'] for row in rows)
+
+        rows = iter_rows(request.stream, request.content_type)
+        summary = ingest(conn, rows, 'Events', EVENT_COLUMNS, batch_size, on_batch, after_commit)
+        return jsonify(summary), 201 if summary['inserted'] else 400
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
         print(e)
         return jsonify({'error': f'An unexpected error occurred: {str(e)}'}), 500
     finally:
         if conn:
             conn.close()
+        for title in inserted_titles:
+            title_index.add(title)
+        if inserted_titles:
+            event_catalog.mark_stale()
+            procedure_cache.invalidate()
+            table_versions.bump('Events')
 
 # Read Users
 @app.route('/users/records', methods=['GET'])
 def get_users():
-    conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
-    cursor.execute("SELECT username, name, is_admin FROM Users")
-    records = cursor.fetchall()
-    conn.close()
+    conn = get_read_connection()
+    try:
+        cursor = conn.cursor(dictionary=True)
+        cursor.execute("SELECT username, name, is_admin FROM Users")
+        records = cursor.fetchall()
+    finally:
+        conn.close()
     return jsonify(records)
 # Read Tickets
 @app.route('/tickets/records', methods=['GET'])
 def get_tickets():
-    conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
-    cursor.execute("SELECT * FROM Tickets LIMIT 15")
-    records = cursor.fetchall()
-    conn.close()
-    return jsonify(records)
+    try:
+        limit = page_limit(request.args, 15)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    conn = get_read_connection()
+    try:
+        cursor = conn.cursor(dictionary=True)
+        records, next_cursor = paginate(cursor, "SELECT * FROM Tickets", [], [],
+                                        ['ticket_id'], request.args.get('after'), limit)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    finally:
+        conn.close()
+    return listing_response(records, next_cursor)
 # Read Events
 @app.route('/events/records', methods=['GET'])
 def get_events():
-    conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
-    cursor.execute("SELECT * FROM Events LIMIT 10")
-    records = cursor.fetchall()
-    conn.close()
-    return jsonify(records)
+    try:
+        limit = page_limit(request.args, 10)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    conn = get_read_connection()
+    try:
+        cursor = conn.cursor(dictionary=True)
+        records, next_cursor = paginate(cursor, "SELECT * FROM ActiveEvents", [], [],
+                                        EVENT_ORDER, request.args.get('after'), limit)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    finally:
+        conn.close()
+    return listing_response(records, next_cursor)
+
+# Export whole tables as NDJSON or CSV, streamed from an unbuffered cursor
+EXPORT_TABLES = {
+    'users': ('Users', ['username', 'name', 'is_admin']),
+    'tickets': ('Tickets', TICKET_COLUMNS),
+    'events': ('ActiveEvents', EVENT_COLUMNS),
+}
+
+@app.route('/<any(users, tickets, events):resource>/export', methods=['GET'])
+def export_records(resource):
+    table, allowed = EXPORT_TABLES[resource]
+    fmt = request.args.get('format', 'ndjson')
+    if fmt not in CONTENT_TYPES:
+        return jsonify({'error': 'format must be ndjson or csv'}), 400
+    try:
+        columns = parse_projection(request.args.get('columns'), allowed)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    headers = {'Content-Disposition': f'attachment; filename={resource}.{fmt}'}
+    return Response(stream_table(get_read_connection, table, columns, fmt, app.json.dumps),
+                    mimetype=CONTENT_TYPES[fmt], headers=headers)
 
 # Update User
 @app.route('/users/update/<old_username>', methods=['PUT'])
 def update_user(old_username):
     print(request.json)
-    conn = None
     data = request.json
-    try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
+
+    def work(cursor):
         hashed_password = hash_password(data['password']) if 'password' in data else None
         query = "UPDATE Users SET username = %s, name = %s, password = %s, is_admin = %s WHERE username = %s"
         cursor.execute(query, (data['new_username'], data['name'], hashed_password, data['is_admin'], old_username))
-        conn.commit()
-        return jsonify({'message': 'User updated successfully!'})
-    except DatabaseError as e:
-        if conn:
-            conn.rollback()
-        print(e)
-        error_code = e.args[0]
-        if error_code == 1205: 
-            return jsonify({'error': 'Lock wait timeout exceeded. Please try again later.'}), 500
-        else:
-            return jsonify({'error': f'Database error: {str(e)}'}), 500
-    except Exception as e:
-        if conn:
-            conn.rollback() 
-        return jsonify({'error': f'An unexpected error occurred: {str(e)}'}), 500
-    finally:
-        if conn:
-            conn.close()
+        return {'message': 'User updated successfully!'}, 200
+    return run_write(work)
 # Update Ticket
 @app.route('/tickets/update/<ticket_id>', methods=['PUT'])
 def update_ticket(ticket_id):
-    conn = None
     data = request.json
-    try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
+    titles = []
+
+    def work(cursor):
+        # The summaries of the event the ticket moves away from change too
+        cursor.execute("SELECT event_title FROM Tickets WHERE ticket_id = %s FOR UPDATE", (data["ticket_id"],))
+        titles[:] = [row[0] for row in cursor.fetchall()] + [data['event_title']]
         # ticket_id, event_title, ticket_price, fee, total_price, quantity, full_section, section, row_num
         query = "UPDATE Tickets SET event_title = %s, ticket_price = %s, fee = %s, total_price = %s, quantity = %s, full_section = %s, section = %s, row_num = %s WHERE ticket_id = %s"
         cursor.execute(query, (data['event_title'], data['ticket_price'], data['fee'], data['total_price'], data['quantity'], data['full_section'], data['section'], data['row_num'], data["ticket_id"]))
-        conn.commit()
-        return jsonify({'message': 'Ticket updated successfully!'})
-    except DatabaseError as e:
-        if conn:
-            conn.rollback()
-        print(e)
-        error_code = e.args[0]
-        if error_code == 1205: 
-            return jsonify({'error': 'Lock wait timeout exceeded. Please try again later.'}), 500
-        else:
-            return jsonify({'error': f'Database error: {str(e)}'}), 500
-    except Exception as e:
-        if conn:
-            conn.rollback() 
-        return jsonify({'error': f'An unexpected error occurred: {str(e)}'}), 500
-    finally:
-        if conn:
-            conn.close()
+        return {'message': 'Ticket updated successfully!'}, 200
+    return run_write(work, lambda: tickets_changed(titles))
 
 # Update Events
 @app.route('/events/update/<old_event_title>', methods=['PUT'])
 def update_event(old_event_title):
-    conn = None
     data = request.json
-    try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
+    found = {}
+
+    def work(cursor):
+        cursor.execute("SELECT location_name FROM Events WHERE event_title = %s AND event_cancelled_at IS NULL "
+                       "FOR UPDATE", (old_event_title,))
+        old_event = cursor.fetchone()
+        found['event'] = old_event
         # event_title, event_url, datetime_local, location_name, promoter_name
-        query = "UPDATE Events SET event_title = %s, event_url = %s, datetime_local = %s, location_name = %s, promoter_name = %s WHERE event_title = %s"
+        query = "UPDATE Events SET event_title = %s, event_url = %s, datetime_local = %s, location_name = %s, promoter_name = %s WHERE event_title = %s AND event_cancelled_at IS NULL"
         cursor.execute(query, (data['event_title'], data['event_url'], data['datetime_local'], data['location_name'], data['promoter_name'], old_event_title))
-        conn.commit()
-        return jsonify({'message': 'Event updated successfully!'})
-    except DatabaseError as e:
-        if conn:
-            conn.rollback()
-        print(e)
-        error_code = e.args[0]
-        if error_code == 1205: 
-            return jsonify({'error': 'Lock wait timeout exceeded. Please try again later.'}), 500
-        else:
-            return jsonify({'error': f'Database error: {str(e)}'}), 500
-    except Exception as e:
-        if conn:
-            conn.rollback() 
-        return jsonify({'error': f'An unexpected error occurred: {str(e)}'}), 500
-    finally:
-        if conn:
-            conn.close()
+        if old_event and old_event[0] != data['location_name']:
+            adjust_city_count(cursor, old_event[0], -1)
+            adjust_city_count(cursor, data['location_name'], 1)
+        return {'message': 'Event updated successfully!'}, 200
+
+    def after_commit():
+        if found['event']:
+            title_index.rename(old_event_title, data['event_title'])
+        renamed = old_event_title.lower() != data['event_title'].lower()
+        event_catalog.mark_stale([old_event_title] if renamed else [])
+        procedure_cache.invalidate()
+        ticket_summary_cache.invalidate([ticket_summary_key(old_event_title), ticket_summary_key(data['event_title']), 'all'])
+        table_versions.bump('Events')
+    return run_write(work, after_commit)
 
 # Delete User
 @app.route('/users/delete/<username>', methods=['DELETE'])
 def delete_user(username):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("DELETE FROM Users WHERE username = %s", (username,))
-    conn.commit()
-    conn.close()
-    return jsonify({'message': 'User deleted successfully!'})
+    removed = []
+
+    def work(cursor):
+        # The delete cascades to the user's WishList rows; lower their events' counters with it
+        cursor.execute("SELECT event_title FROM WishList WHERE username = %s FOR UPDATE", (username,))
+        removed[:] = [row[0] for row in cursor.fetchall()]
+        cursor.execute("DELETE FROM Users WHERE username = %s", (username,))
+        if cursor.rowcount:
+            adjust_wishlist_counts(cursor, removed, -1)
+        else:
+            removed.clear()
+        return {'message': 'User deleted successfully!'}, 200
+
+    def after_commit():
+        if removed:
+            procedure_cache.invalidate()
+            table_versions.bump('WishList', f'WishList:{username}')
+    return run_write(work, after_commit)
 # Delete Ticket
 @app.route('/tickets/delete/<ticket_id>', methods=['DELETE'])
 def delete_ticket(ticket_id):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("DELETE FROM Tickets WHERE ticket_id = %s", (ticket_id,))
-    conn.commit()
-    conn.close()
-    return jsonify({'message': 'Ticket deleted successfully!'})
+    titles = []
+
+    def work(cursor):
+        cursor.execute("SELECT event_title FROM Tickets WHERE ticket_id = %s FOR UPDATE", (ticket_id,))
+        titles[:] = [row[0] for row in cursor.fetchall()]
+        cursor.execute("DELETE FROM Tickets WHERE ticket_id = %s", (ticket_id,))
+        return {'message': 'Ticket deleted successfully!'}, 200
+    return run_write(work, lambda: tickets_changed(titles))
 # Delete Event
 @app.route('/events/delete/<event_title>', methods=['DELETE'])
 def delete_event(event_title):
-
-    conn = get_db_connection()
-    cursor = conn.cursor()
-
-    try:
-        # Set isolation level
-        cursor.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ")
-
-        # Start transaction
-        conn.start_transaction()
-        
-
-        # Insert the new wishlist entry
-        cursor.execute("""
-                    INSERT INTO Notifications (username, event_title, message)
-                    SELECT 
-                        w.username,
-                        e.event_title,
-                        CONCAT('The event "', e.event_title,
-                            ' at ', l.location_name, ' (', l.city, ', ', l.state, ') ',
-                            'has been cancelled. ',
-                            'There are ', other_events.event_count, ' other events happening in ', l.city, '. ',
-                            'Check them out!') AS message
-                    FROM WishList w
-                    JOIN Events e ON w.event_title = e.event_title
-                    JOIN Locations l ON e.location_name = l.location_name
-                    JOIN (
-                        SELECT city, COUNT(*) as event_count
-                        FROM Events natural join Locations
-                        WHERE event_title != %s
-                        GROUP BY city
-                    ) other_events ON l.city = other_events.city
-                    WHERE e.event_title = %s;
-        """, (event_title, event_title))
-
-        # Insert notification
-        cursor.execute("""
-                    DELETE FROM Events
-                    WHERE event_title = %s;
-        """, (event_title,))
-
-        # Commit the transaction
-        conn.commit()
-        return jsonify({'message': 'Event deleted successfully!'}), 200
-    except Exception as e:
-        conn.rollback()
-        print(e)
-        return jsonify({'error': f'An error occurred: {str(e)}'}), 500
-    finally:
-        cursor.close()
-        conn.close()
+    def work(cursor):
+        cursor.execute("SELECT location_name FROM Events WHERE event_title = %s AND event_cancelled_at IS NULL "
+                       "FOR UPDATE", (event_title,))
+        event = cursor.fetchone()
+
+        if event:
+            # Hide the event and take its tickets off sale. The worker sends the
+            # cancellation notices in batches after commit, then deletes the row.
+            enqueue_cancellation(cursor, event_title)
+            cursor.execute("UPDATE Events SET event_cancelled_at = NOW(6) WHERE event_title = %s", (event_title,))
+            cursor.execute("DELETE FROM Tickets WHERE event_title = %s", (event_title,))
+            adjust_city_count(cursor, event[0], -1)
+        return {'message': 'Event deleted successfully!'}, 200
+
+    def after_commit():
+        title_index.remove(event_title)
+        event_catalog.mark_stale([event_title])
+        procedure_cache.invalidate()
+        ticket_summary_cache.invalidate([ticket_summary_key(event_title), 'all'])
+        table_versions.bump('Events')
+        notification_worker.wake()
+    return run_write(work, after_commit)
 
 # ----------------------------------------------------------------------------------
 @app.route('/events')
+@conditional_get(table_versions, lambda: ['Events'])
 def view_events():
     """Display a list of events for end-users."""
     conn = None
     try:
-        conn = get_db_connection()
+        limit = page_limit(request.args, 150)
+        if EVENT_CATALOG and event_catalog.fresh():
+            return listing_response(*event_catalog.page(after=request.args.get('after'), limit=limit))
+        conn = get_read_connection()
         cursor = conn.cursor(dictionary=True)
-        cursor.execute("SELECT event_title, datetime_local, location_name, promoter_name, city FROM Events natural join Locations LIMIT 150")
-        events = cursor.fetchall()
-        return jsonify(events)
+        events, next_cursor = paginate(cursor, EVENT_LISTING_SELECT, [], [],
+                                       EVENT_ORDER, request.args.get('after'), limit)
+        return listing_response(events, next_cursor)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         print(e)
         return jsonify({'error': f'An error occurred while fetching events: {str(e)}'}), 500
@@ -357,7 +940,8 @@ def view_events():
 def events_page():
     if 'user' not in session:
         return redirect(url_for('login'))
-    return render_template('events.html', username=session['user'], check_notifications=True)
+    return render_template('events.html', username=session['user'], check_notifications=True,
+                           push_notifications=notification_slots.available())
 
 # Not Used
 @app.route('/tickets')
@@ -378,20 +962,22 @@ def view_tickets():
             conn.close()
 
 
+TICKETS_FOR_EVENT_SELECT = """
+    SELECT distinct t.section, t.row_num, t.quantity, t.total_price
+    FROM Tickets t
+    WHERE t.event_title = %s
+"""
+
 @app.route('/tickets/<event_title>')
+@conditional_get(table_versions, lambda event_title: ['Tickets', 'Events'])
 def view_tickets_by_title(event_title):
     """Display a list of tickets for a given event title."""
     conn = None
     try:
-        conn = get_db_connection()
+        conn = get_read_connection()
         cursor = conn.cursor(dictionary=True)
 
-        query = """
-        SELECT distinct t.section, t.row_num, t.quantity, t.total_price
-        FROM Tickets t
-        WHERE t.event_title = %s
-        """
-        cursor.execute(query, (event_title,))
+        cursor.execute(TICKETS_FOR_EVENT_SELECT, (event_title,))
         tickets = cursor.fetchall()
         if not tickets:
             return jsonify({'message': f'No tickets found for event: {event_title}'}), 404
@@ -403,6 +989,150 @@ def view_tickets_by_title(event_title):
         if conn:
             conn.close()
 
+@app.route('/tickets/<event_title>/summary')
+@conditional_get(table_versions, lambda event_title: ['Tickets', 'Events'])
+def ticket_summary(event_title):
+    """Price and quantity stats for an event, overall, per section and per price band."""
+    def load():
+        conn = get_read_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute(TICKETS_SELECT + " WHERE event_title = %s", (event_title,))
+            rows = cursor.fetchall()
+        finally:
+            conn.close()
+        return summarize_event(rows) if rows else None
+
+    try:
+        summary = cached_read(ticket_summary_cache, ticket_summary_key(event_title), load)
+        if summary is None:
+            return jsonify({'message': f'No tickets found for event: {event_title}'}), 404
+        return jsonify({'event_title': event_title, **summary})
+    except Exception as e:
+        print(e)
+        return jsonify({'error': f'An error occurred while summarizing tickets: {str(e)}'}), 500
+
+@app.route('/tickets/summary')
+def all_ticket_summaries():
+    """Price and quantity stats for every event, computed over Tickets in chunks. Admins only."""
+    if not is_admin():
+        return jsonify({'error': 'Unauthorized access'}), 403
+
+    def load():
+        conn = get_read_connection()
+        finished = False
+        try:
+            events = summarize_events(iter_chunks(conn.cursor(buffered=False), TICKET_SUMMARY_CHUNK))
+            finished = True
+            return events
+        finally:
+            # A half-read unbuffered result can't go back to the pool
+            if finished:
+                conn.close()
+            else:
+                conn.discard()
+
+    try:
+        return jsonify({'events': cached_read(ticket_summary_cache, 'all', load)})
+    except Exception as e:
+        print(e)
+        return jsonify({'error': f'An error occurred while summarizing tickets: {str(e)}'}), 500
+
+# Ticket holds
+
+# Buyers reserve seats, then confirm (buy) or release them. A hold takes its
+# seats out of Tickets.quantity when it is made and gives them back when it
+# is released or expires, so quantity is always what is left to sell.
+TICKET_HOLD_SECONDS = int(os.getenv('TICKET_HOLD_SECONDS', '600'))
+TICKET_HOLD_REAP_INTERVAL = float(os.getenv('TICKET_HOLD_REAP_INTERVAL', '5'))
+
+if TICKET_HOLD_REAP_INTERVAL > 0:
+    ticket_holds.start_reaper(get_db_connection, TICKET_HOLD_REAP_INTERVAL,
+                              on_reaped=lambda expired, titles: tickets_changed(titles))
+
+def run_hold(action, after_commit=None):
+    """run_write() for a hold action(cursor) -> body; HoldErrors become their status."""
+    changed = []
+
+    def work(cursor):
+        changed.clear()
+        try:
+            body = action(cursor)
+        except ticket_holds.HoldError as e:
+            return {'error': str(e)}, e.status
+        changed.append(True)
+        return body
+
+    def on_commit():
+        if changed and after_commit:
+            after_commit()
+    # READ COMMITTED: locking reads lock only the rows they return, not the gaps between them
+    return run_write(work, on_commit, isolation_level='READ COMMITTED')
+
+@app.route('/tickets/holds', methods=['POST'])
+def reserve_tickets():
+    """Hold seats for the logged-in user.
+
+    Accepts {"ticket_id": ..., "quantity": n} for one listing, or
+    {"event_title": ..., "section": optional, "quantity": n} for the
+    cheapest listing with n seats left.
+    """
+    if 'user' not in session:
+        return jsonify({'error': 'Unauthorized access'}), 401
+
+    username = session['user']
+    data = request.json or {}
+    try:
+        quantity = ticket_holds.parse_quantity(data.get('quantity', 1))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    ticket_id = data.get('ticket_id')
+    if ticket_id is None and not data.get('event_title'):
+        return jsonify({'error': 'ticket_id or event_title is required'}), 400
+    if ticket_id is not None and (isinstance(ticket_id, bool) or not isinstance(ticket_id, int)):
+        return jsonify({'error': 'ticket_id must be an integer'}), 400
+
+    titles = set()
+
+    def action(cursor):
+        hold = ticket_holds.reserve(cursor, username, quantity, TICKET_HOLD_SECONDS, ticket_id=ticket_id,
+                                    event_title=data.get('event_title'), section=data.get('section'))
+        titles.clear()
+        titles.update(ticket_holds.event_titles(cursor, [hold['ticket_id']]))
+        return hold, 201
+    return run_hold(action, lambda: tickets_changed(titles))
+
+@app.route('/tickets/holds/<int:hold_id>/confirm', methods=['POST'])
+def confirm_hold(hold_id):
+    """Buy the seats of one of the user's holds before it expires."""
+    if 'user' not in session:
+        return jsonify({'error': 'Unauthorized access'}), 401
+
+    username = session['user']
+
+    def action(cursor):
+        purchase = ticket_holds.confirm(cursor, hold_id, username)
+        return {'message': 'Purchase confirmed', **purchase}, 200
+    return run_hold(action)
+
+@app.route('/tickets/holds/<int:hold_id>', methods=['DELETE'])
+def release_hold(hold_id):
+    """Give the seats of one of the user's holds back."""
+    if 'user' not in session:
+        return jsonify({'error': 'Unauthorized access'}), 401
+
+    username = session['user']
+
+    titles = set()
+
+    def action(cursor):
+        released = ticket_holds.release(cursor, hold_id, username)
+        titles.clear()
+        if released is not None:
+            titles.update(ticket_holds.event_titles(cursor, [released]))
+        return {'message': 'Hold released'}, 200
+    return run_hold(action, lambda: tickets_changed(titles))
+
 @app.route('/tickets-page/<event_title>')
 def tickets_page(event_title):
     """Serve the tickets.html page for a specific event."""
@@ -463,67 +1193,57 @@ def wishlist_page():
 
 @app.route('/wishlist', methods=['POST'])
 def add_to_wishlist():
-    """Add an event to the wishlist."""
+    """Add an event, or a list of events, to the wishlist.
+
+    Accepts {"event_title": ...} or {"event_titles": [...]}; a list is applied
+    in one transaction and answered with a status per title.
+    """
     if 'user' not in session:
         return jsonify({'error': 'Unauthorized access'}), 401
 
     username = session['user']
-    event_title = request.json.get('event_title')
-
-    if not event_title:
-        return jsonify({'error': 'Event title is required'}), 400
-
-    conn = get_db_connection()
-    cursor = conn.cursor()
-
-    try:
-        wishlist_date = datetime.now()
-        
-        # Set isolation level
-        cursor.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ")
-
-        # Start transaction
-        conn.start_transaction()
-        
-
-        # Insert the new wishlist entry
-        cursor.execute("""
-            INSERT INTO WishList (username, event_title, wishlist_date)
-            VALUES (%s, %s, %s)
-            ON DUPLICATE KEY UPDATE wishlist_date = VALUES(wishlist_date)
-        """, (username, event_title, wishlist_date))
-
-        # Insert notification
-        cursor.execute("""
-            INSERT INTO Notifications (username, event_title, message)
-            SELECT 
-                %s,
-                e.event_title,
-                CONCAT('You have added "', e.event_title, '" to your wishlist. ',
-                    ' at ', e.location_name, ' (', l.city, ', ', l.state, '). ',
-                    'Promoted by ', e.promoter_name, '. ',
-                    'Currently, ', COUNT(w.username), ' user(s) have wishlisted this event, ',
-                    'including you. ')
-            FROM Events e
-            JOIN Locations l ON e.location_name = l.location_name
-            LEFT JOIN WishList w ON e.event_title = w.event_title
-            WHERE e.event_title = %s
-            GROUP BY e.event_title, e.location_name, l.city, l.state, e.promoter_name
-        """, (username, event_title))
-
-        # Commit the transaction
-        conn.commit()
-        return jsonify({'message': 'Event added to wishlist successfully'}), 200
-    except Exception as e:
-        conn.rollback()
-        print(e)
-        return jsonify({'error': f'An error occurred: {str(e)}'}), 500
-    finally:
-        cursor.close()
-        conn.close()
-
+    data = request.json or {}
+    batch = 'event_titles' in data
+    if batch:
+        try:
+            titles = wishlist.parse_titles(data['event_titles'])
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+    else:
+        event_title = data.get('event_title')
+        if not event_title:
+            return jsonify({'error': 'Event title is required'}), 400
+        titles = [event_title]
+
+    results = {}
+
+    def work(cursor):
+        # Upsert the wishlist entries and their notifications
+        results.clear()
+        results.update(wishlist.add_items(cursor, username, titles, datetime.now()))
+        if batch:
+            return {'results': [{'event_title': t, 'status': s} for t, s in results.items()]}, 200
+        if results[event_title] == 'not_found':
+            return {'error': 'Event not found'}, 404
+        return {'message': 'Event added to wishlist successfully'}, 200
+
+    def after_commit():
+        if any(status != 'not_found' for status in results.values()):
+            procedure_cache.invalidate()
+            table_versions.bump('WishList', f'WishList:{username}')
+            notification_hub.notify(username)
+    return run_write(work, after_commit, isolation_level='REPEATABLE READ')
+
+
+WISHLIST_SELECT = """
+    SELECT W.event_title, E.datetime_local, E.location_name, E.promoter_name
+    FROM WishList W
+    JOIN ActiveEvents E ON W.event_title = E.event_title
+    WHERE W.username = %s
+"""
 
 @app.route('/wishlist', methods=['GET'])
+@conditional_get(table_versions, logged_in_tables('WishList:{user}', 'Events'))
 def fetch_wishlist():
     """Fetch wishlist for the logged-in user."""
     if 'user' not in session:
@@ -531,74 +1251,62 @@ def fetch_wishlist():
 
     username = session['user']
 
+    conn = None
     try:
-        conn = get_db_connection()
+        conn = get_read_connection()
         cursor = conn.cursor(dictionary=True)
-        cursor.execute(
-            """
-            SELECT W.event_title, E.datetime_local, E.location_name, E.promoter_name
-            FROM WishList W
-            JOIN Events E ON W.event_title = E.event_title
-            WHERE W.username = %s
-            """,
-            (username,)
-        )
+        cursor.execute(WISHLIST_SELECT, (username,))
         wishlist_events = cursor.fetchall()
         return jsonify(wishlist_events), 200
     except Exception as e:
         print(e)
         return jsonify({'error': f'Error fetching wishlist: {str(e)}'}), 500
     finally:
-        conn.close()
+        if conn:
+            conn.close()
 
 @app.route('/wishlist', methods=['DELETE'])
 def remove_from_wishlist():
-    """Remove an event from the wishlist."""
+    """Remove an event, or a list of events, from the wishlist."""
     if 'user' not in session:
         return jsonify({'error': 'Unauthorized access'}), 401
 
     username = session['user']
-    event_title = request.json.get('event_title')
-
-    if not event_title:
-        return jsonify({'error': 'Event title is required'}), 400
-
-    try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute(
-            """
-            DELETE FROM WishList
-            WHERE username = %s AND event_title = %s
-            """,
-            (username, event_title)
-        )
-        conn.commit()
-        return jsonify({'message': f'Event "{event_title}" removed from wishlist successfully'}), 200
-    except Exception as e:
-        print(e)
-        return jsonify({'error': f'Error removing event: {str(e)}'}), 500
-    finally:
-        conn.close()
+    data = request.json or {}
+    if 'event_titles' in data:
+        try:
+            titles = wishlist.parse_titles(data['event_titles'])
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        event_title = None
+    else:
+        event_title = data.get('event_title')
+        if not event_title:
+            return jsonify({'error': 'Event title is required'}), 400
+        titles = [event_title]
+
+    def work(cursor):
+        results = wishlist.remove_items(cursor, username, titles)
+        if event_title is None:
+            return {'results': [{'event_title': t, 'status': s} for t, s in results.items()]}, 200
+        return {'message': f'Event "{event_title}" removed from wishlist successfully'}, 200
+
+    def after_commit():
+        procedure_cache.invalidate()
+        table_versions.bump('WishList', f'WishList:{username}')
+    return run_write(work, after_commit)
 
 @app.route('/popular-events')
 def get_popular_events():
     if 'user' not in session:
         return jsonify({'error': 'Unauthorized access'}), 401
     
-    conn = None
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
-        cursor.execute("CALL GetPopularEvents(10)")
-        popular_events = cursor.fetchall()
+        popular_events = call_cached_procedure('GetPopularEvents', 10)
         return jsonify(popular_events)
     except Exception as e:
         print(e)
         return jsonify({'error': f'An error occurred while fetching popular events: {str(e)}'}), 500
-    finally:
-        if conn:
-            conn.close()
 
 @app.route('/top-cities-events')
 def top_cities_events():
@@ -606,81 +1314,158 @@ def top_cities_events():
     if 'user' not in session:
         return jsonify({'error': 'Unauthorized access'}), 401
 
-    conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
-
     try:
         # Query events happening in the top 5 major cities
-        query = """
-            call GetTopCitiesEvents(10);
-            """
-        cursor.execute(query)
-        events = cursor.fetchall()
+        events = call_cached_procedure('GetTopCitiesEvents', 10)
         return jsonify(events)
     except Exception as e:
         print(e)
         return jsonify({'error': f'An error occurred: {str(e)}'}), 500
-    finally:
-        conn.close()
+
+# Optional in-process copy of Events joined with Locations (EVENT_CATALOG=1).
+# It answers the event listings without a query once loaded, and needs the
+# change timestamps of schema migration 4.
+EVENT_CATALOG = os.getenv('EVENT_CATALOG', '0') == '1'
+event_catalog = EventCatalog(
+    get_db_connection,
+    overlap=float(os.getenv('EVENT_CATALOG_OVERLAP', '5')),
+    full_reload_after=float(os.getenv('EVENT_CATALOG_FULL_RELOAD', '600')),
+)
+if EVENT_CATALOG:
+    event_catalog.start_refresher(float(os.getenv('EVENT_CATALOG_REFRESH_INTERVAL', '5')))
+metrics.gauge('event_catalog', 'Event catalog size and refresh counters.', ['stat'],
+              lambda: {(k,): int(v) if isinstance(v, bool) else v
+                       for k, v in event_catalog.stats().items() if isinstance(v, (int, float))})
+
+def catalog_listing(args, tab, query, after, limit, refresh=True):
+    """(events, next_cursor, facets) for /filtered-events from the event catalog,
+    or None when the database has to answer."""
+    if not EVENT_CATALOG or tab == 'popular' or not event_catalog.fresh(refresh):
+        return None
+    city = args.get('city', 'all')
+    start, end = date_range(args)
+    major = event_catalog.top_cities(5) if tab == 'major' else None
+    cities = major
+    if city != 'all':
+        cities = [city] if major is None or city.lower() in {c.lower() for c in major} else []
+
+    matches = None
+    truncated = False
+    if query:
+        if not search_by_index(query, after):
+            return None
+        matches, truncated = search_matches(query, after)
+        events, next_cursor = event_catalog.ranked_page(matches, cities, start, end, after, limit, truncated)
+    else:
+        events, next_cursor = event_catalog.page(cities, start, end, after, limit)
+
+    facets = None
+    if facets_requested(args):
+        titles = search_facet_titles(query, matches, truncated) if query else None
+        facets = summarize_facets(event_catalog.facet_rows(major, start, end, titles), city)
+    return events, next_cursor, facets
+
+@app.route('/catalog/stats')
+def catalog_stats():
+    """Report the event catalog's size, memory footprint and refresh cost."""
+    return jsonify(dict(event_catalog.stats(), enabled=EVENT_CATALOG))
+
+def load_facets(facet_sql):
+    """Facet rows for facets_query()'s (sql, params), through the procedure cache."""
+    if facet_sql is None:
+        return []
+
+    def load():
+        facet_conn = get_read_connection()
+        try:
+            cursor = facet_conn.cursor(dictionary=True)
+            cursor.execute(*facet_sql)
+            return cursor.fetchall()
+        finally:
+            facet_conn.close()
+    return cached_read(procedure_cache, ('facets',) + facet_sql, load)
+
+# ETag inputs of /filtered-events: the popular tab also shows ticket and
+# wishlist counts, and the major tab's cities come from the city counters
+FILTERED_EVENTS_TABLES = {
+    'popular': ['Events', 'WishList', 'EventWishlistCounts', 'Tickets'],
+    'major': ['Events', 'WishList', 'CityEventCounts'],
+    'all': ['Events', 'WishList'],
+}
+
+def filtered_events_tables(*args, **kwargs):
+    if 'user' not in session:
+        return None
+    return FILTERED_EVENTS_TABLES.get(request.args.get('tab', 'all'), FILTERED_EVENTS_TABLES['all'])
 
 @app.route('/filtered-events')
+@conditional_get(table_versions, filtered_events_tables)
 def filtered_events():
     if 'user' not in session:
         return jsonify({'error': 'Unauthorized access'}), 401
     
     query = request.args.get('query', '').lower()
-    city = request.args.get('city', 'all')
-    start_date = request.args.get('start_date', '')
-    end_date = request.args.get('end_date', '')
     tab = request.args.get('tab', 'all')
+    after = request.args.get('after')
     
     conn = None
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
+        limit = page_limit(request.args, 150)
+        listing = catalog_listing(request.args, tab, query, after, limit)
+        if listing is not None:
+            return listing_response(*listing)
+
+        conditions, params = event_filters(request.args)
         
+        cities = matches = None
+        truncated = False
+
         if tab == 'popular':
-            cursor.execute("CALL GetPopularEvents(10)")
-            events = cursor.fetchall()
+            if query:
+                conditions.append("LOWER(e.event_title) LIKE %s")
+                params.append(f'%{query}%')
+
+            def load():
+                page_conn = get_read_connection()
+                try:
+                    return paginate(page_conn.cursor(dictionary=True), POPULAR_EVENTS_SELECT,
+                                    conditions, params, POPULAR_ORDER, after, limit)
+                finally:
+                    page_conn.close()
+            key = ('popular', tuple(conditions), tuple(params), after, limit)
+            events, next_cursor = cached_read(procedure_cache, key, load)
         else:
-            sql_query = """
-            SELECT event_title, datetime_local, location_name, promoter_name, city 
-            FROM Events 
-            NATURAL JOIN Locations 
-            WHERE LOWER(event_title) LIKE %s
-            """
-            params = [f'%{query}%']
-            if city != 'all':
-                sql_query += " AND city = %s"
-                params.append(city)
-            
-            if start_date:
-                sql_query += " AND datetime_local >= %s"
-                params.append(start_date)
-            
-            if end_date:
-                sql_query += " AND datetime_local <= %s"
-                params.append(end_date)
-            
+            conn = get_read_connection()
+            cursor = conn.cursor(dictionary=True)
             if tab == 'major':
-                sql_query += """ AND city in ( Select city from 
-                    (select city, count(event_title) from Locations natural join Events group by city order by 2 desc limit 5) z
-                    )"""
-            
-            sql_query += " LIMIT 150"
-            
-            cursor.execute(sql_query, tuple(params))
-            events = cursor.fetchall()
-        
-        # Apply client-side filtering for the popular tab
-        if tab == 'popular':
-            events = [event for event in events if
-                      (city == 'all' or event['city'] == city) and
-                      (not start_date or str(event['datetime_local']) >= start_date) and
-                      (not end_date or str(event['datetime_local']) <= end_date) and
-                      query in event['event_title'].lower()]
-        
-        return jsonify(events)
+                cities = top_cities(cursor, 5)
+                if cities:
+                    conditions.append("city IN (" + ", ".join(["%s"] * len(cities)) + ")")
+                    params.extend(cities)
+
+            if cities == []:
+                events, next_cursor = [], None
+            elif search_by_index(query, after):
+                # Title matches come from the search index, ranked; MySQL
+                # only applies the remaining filters to those candidates.
+                matches, truncated = search_matches(query, after)
+                events, next_cursor = fetch_ranked_events(
+                    cursor, matches, conditions, params, after, limit, truncated)
+            else:
+                if query:
+                    conditions.append("LOWER(event_title) LIKE %s")
+                    params.append(f'%{query}%')
+                events, next_cursor = paginate(cursor, EVENT_LISTING_SELECT, conditions, params,
+                                               EVENT_ORDER, after, limit)
+
+        facets = None
+        if facets_requested(request.args):
+            facet_titles = search_facet_titles(query, matches, truncated) if matches is not None else None
+            facet_sql = facets_query(request.args, tab, query, cities, facet_titles)
+            facets = summarize_facets(load_facets(facet_sql), request.args.get('city', 'all'))
+        return listing_response(events, next_cursor, facets)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         print(e)
         return jsonify({'error': f'An error occurred while fetching events: {str(e)}'}), 500
@@ -697,24 +1482,8 @@ def get_notifications():
     conn = None
     try:
         conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
-        
-        # Fetch unread notifications
-        cursor.execute("""
-            SELECT notification_id, message FROM Notifications 
-            WHERE username = %s AND is_read = 0
-        """, (username,))
-        notifications = cursor.fetchall()
-        
-        # Mark notifications as read
-        if notifications:
-            cursor.execute("""
-                UPDATE Notifications 
-                SET is_read = 1 
-                WHERE username = %s AND is_read = 0
-            """, (username,))
-            conn.commit()
-        
+        # Fetch unread notifications and mark exactly those as read
+        notifications = claim_notifications(conn, username)
         return jsonify(notifications)
     except Exception as e:
         print(e)
@@ -723,6 +1492,90 @@ def get_notifications():
         if conn:
             conn.close()
 
+def claim_for(username, limit=None):
+    conn = get_db_connection()
+    try:
+        return claim_notifications(conn, username, limit)
+    finally:
+        conn.close()
+
+def poll_timeout(args):
+    """Seconds a long-poll may wait (?timeout=, default 25); raises ValueError."""
+    try:
+        return max(0.0, min(float(args.get('timeout', 25)), NOTIFY_STREAM_SECONDS))
+    except ValueError:
+        raise ValueError('timeout must be a number')
+
+def no_stream_slot():
+    return jsonify({'error': 'Too many open notification streams. Please try again later.'}), 503, {'Retry-After': '30'}
+
+@app.route('/notifications/stream')
+def notifications_stream():
+    """Push notifications to the browser as Server-Sent Events."""
+    if 'user' not in session:
+        return jsonify({'error': 'Unauthorized access'}), 401
+
+    username = session['user']
+    if not notification_slots.acquire():
+        return no_stream_slot()
+
+    def stream():
+        # Each stream holds a worker thread, so it ends after a while and
+        # the browser's EventSource reconnects on its own
+        deadline = time.monotonic() + NOTIFY_STREAM_SECONDS
+        yield 'retry: 3000\n\n'
+        try:
+            while True:
+                version = notification_hub.version(username)
+                notifications = claim_for(username, 100)
+                for notification in notifications:
+                    yield (f"id: {notification['notification_id']}\n"
+                           f"event: notification\n"
+                           f"data: {app.json.dumps(notification)}\n\n")
+                if len(notifications) == 100:
+                    continue
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                if notification_hub.wait(username, version, min(15, remaining)) == version:
+                    yield ': keep-alive\n\n'
+        except Exception as e:
+            print(e)
+
+    response = Response(stream(), mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    # Runs when the server closes the response, even if it never started streaming
+    response.call_on_close(notification_slots.release)
+    return response
+
+@app.route('/notifications/poll')
+def notifications_poll():
+    """Long-poll fallback: return as soon as there are notifications, or after ?timeout= seconds."""
+    if 'user' not in session:
+        return jsonify({'error': 'Unauthorized access'}), 401
+
+    username = session['user']
+    try:
+        timeout = poll_timeout(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if not notification_slots.acquire():
+        return no_stream_slot()
+    deadline = time.monotonic() + timeout
+    try:
+        while True:
+            version = notification_hub.version(username)
+            notifications = claim_for(username)
+            remaining = deadline - time.monotonic()
+            if notifications or remaining <= 0:
+                return jsonify(notifications)
+            notification_hub.wait(username, version, remaining)
+    except Exception as e:
+        print(e)
+        return jsonify({'error': f'An error occurred: {str(e)}'}), 500
+    finally:
+        notification_slots.release()
+
 if __name__ == '__main__':
     app.run()
 
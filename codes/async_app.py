@@ -0,0 +1,531 @@
+"""Asyncio serving mode.
+
+The read-heavy listing routes and the notification stream and long-poll
+run as coroutines on aiomysql pools, so a single process can keep
+hundreds of queries in flight and of clients waiting. Reads go to the
+replicas the Flask app's health checker keeps in rotation, under the same
+read-your-writes rules. Every other route
+is the unchanged Flask view from app.py, run in a thread pool behind the
+same ASGI entry point. Install requirements-async.txt and start with
+
+    hypercorn async_app:application --bind :8080
+
+Sessions, ETags and caches are shared with the Flask app, so clients see
+the same cookies, JSON and headers in either mode.
+"""
+import asyncio
+import functools
+import os
+import time
+
+import aiomysql
+from hypercorn.middleware import AsyncioWSGIMiddleware
+from quart import Quart, g, jsonify, make_response, request, session
+from werkzeug.exceptions import HTTPException
+
+import app as threaded
+from city_counts import TOP_CITIES_SQL
+from compression import COMPRESSIBLE_TYPES, compress_body
+from facets import summarize as summarize_facets
+from fast_json import init_json
+from notifications import claim_query, mark_read_query
+from pagination import encode_cursor, page_limit, page_query, page_result
+
+ASYNC_DB_POOL_SIZE = int(os.getenv('ASYNC_DB_POOL_SIZE', '100'))
+ASYNC_DB_POOL_TIMEOUT = float(os.getenv('ASYNC_DB_POOL_TIMEOUT', '10'))
+COMPRESS_MIN_SIZE = int(os.getenv('COMPRESS_MIN_SIZE', '1024'))
+
+async_app = Quart(__name__)
+async_app.secret_key = threaded.APP_SECRET_KEY
+init_json(async_app)
+
+ASYNC_REPLICA_POOL_TIMEOUT = float(os.getenv('REPLICA_POOL_TIMEOUT', '2'))
+
+db_pool = None
+replica_db_pools = {}  # replica name -> aiomysql pool, for the names in threaded.replicas
+
+
+def create_pool(config):
+    return aiomysql.create_pool(
+        host=config.get('host') or 'localhost',
+        port=config.get('port', 3306),
+        user=config.get('user'),
+        password=config.get('password') or '',
+        db=config.get('database'),
+        charset='utf8mb4',
+        autocommit=True,
+        minsize=0,
+        maxsize=ASYNC_DB_POOL_SIZE,
+        pool_recycle=float(os.getenv('DB_POOL_MAX_LIFETIME', '1800')),
+    )
+
+
+@async_app.before_serving
+async def open_pool():
+    global db_pool
+    db_pool = await create_pool(threaded.db_config)
+    for name, pool in threaded.replica_pools:
+        replica_db_pools[name] = await create_pool(pool.db_config)
+
+
+@async_app.after_serving
+async def close_pool():
+    for pool in [db_pool, *replica_db_pools.values()]:
+        pool.close()
+        await pool.wait_closed()
+
+
+def reads_pinned_to_primary():
+    return session.get('primary_until', 0) > time.time()
+
+
+async def acquire_read():
+    """(pool, connection) for a read, by threaded.get_read_connection()'s rules:
+    a replica in rotation, unless this session has just written or the
+    request fills an ETag or cache entry that another session just changed."""
+    if not replica_db_pools or reads_pinned_to_primary() or g.get('read_from_primary'):
+        return db_pool, await asyncio.wait_for(db_pool.acquire(), ASYNC_DB_POOL_TIMEOUT)
+    replicas = threaded.replicas
+    for name in replicas.rotation():
+        pool = replica_db_pools[name]
+        try:
+            conn = await asyncio.wait_for(pool.acquire(), ASYNC_REPLICA_POOL_TIMEOUT)
+        except asyncio.TimeoutError:
+            # Busy, not broken
+            continue
+        except Exception as e:
+            replicas.mark_down(name, e)
+            continue
+        replicas.count('replica_reads')
+        return pool, conn
+    replicas.count('failovers')
+    replicas.count('primary_reads')
+    return db_pool, await asyncio.wait_for(db_pool.acquire(), ASYNC_DB_POOL_TIMEOUT)
+
+
+class Database:
+    """One pooled aiomysql connection for the duration of a request.
+
+    With `read`, the connection comes from a healthy replica when the Flask
+    app would read from one, else from the primary.
+    """
+
+    def __init__(self, read=False):
+        self.read = read
+
+    async def __aenter__(self):
+        start = time.perf_counter()
+        try:
+            if self.read:
+                self.pool, self.conn = await acquire_read()
+            else:
+                self.pool = db_pool
+                self.conn = await asyncio.wait_for(db_pool.acquire(), ASYNC_DB_POOL_TIMEOUT)
+        except asyncio.TimeoutError:
+            raise RuntimeError(f'Timed out after {ASYNC_DB_POOL_TIMEOUT}s waiting for a database connection')
+        finally:
+            threaded.connection_wait.observe(time.perf_counter() - start)
+        self.cursor = await self.conn.cursor(aiomysql.DictCursor)
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.cursor.close()
+        if exc_type is not None:
+            # Don't reuse a connection that may still hold part of a result
+            self.conn.close()
+        self.pool.release(self.conn)
+
+    async def fetchall(self, sql, params=()):
+        await self.cursor.execute(sql, params)
+        rows = await self.cursor.fetchall()
+        # CALL returns a trailing status result set
+        while await self.cursor.nextset():
+            pass
+        return list(rows)
+
+
+_loading = {}  # key -> task loading it
+
+
+async def cached(key, load):
+    """Serve `key` from the shared procedure cache, loading it at most once at a time."""
+    if reads_pinned_to_primary():
+        # As threaded.cached_read(): a session that just wrote skips the cache
+        return await load()
+    hit, value = threaded.procedure_cache.lookup(key)
+    if hit:
+        return value
+    if replica_db_pools and threaded.procedure_cache.invalidated_within(threaded.replicas.max_lag, key):
+        g.read_from_primary = True
+    generation = value
+    task = _loading.get(key)
+    if task is None:
+        async def run():
+            try:
+                result = await load()
+                threaded.procedure_cache.store(key, result, generation)
+                return result
+            finally:
+                _loading.pop(key, None)
+        task = _loading[key] = asyncio.ensure_future(run())
+    return await asyncio.shield(task)
+
+
+def logged_in_tables(*tables):
+    def tables_for_request(*args, **kwargs):
+        if 'user' not in session:
+            return None
+        return [t.format(user=session['user']) for t in tables]
+    return tables_for_request
+
+
+def conditional_get(tables_for_request, cache_control='private, no-cache'):
+    """versions.conditional_get for coroutine views, on the Flask app's counters."""
+    def decorator(view):
+        @functools.wraps(view)
+        async def wrapper(*args, **kwargs):
+            tables = tables_for_request(*args, **kwargs)
+            if tables is None:
+                return await view(*args, **kwargs)
+            etag = threaded.table_versions.etag(tables)
+            if request.if_none_match.contains_weak(etag):
+                response = await make_response('', 304)
+            else:
+                if threaded.table_versions.recently_bumped(tables):
+                    g.read_from_primary = True
+                response = await make_response(await view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag)
+            response.headers['Cache-Control'] = cache_control
+            return response
+        return wrapper
+    return decorator
+
+
+def listing_response(rows, next_cursor, facets=None):
+    return jsonify(threaded.listing_payload(rows, next_cursor, request.args.get('format'), facets))
+
+
+@async_app.before_request
+async def start_request_timer():
+    g.request_started = time.perf_counter()
+
+
+@async_app.after_request
+async def finish_response(response):
+    # The Flask app's CORS, compression and latency hooks, for these routes
+    origin = request.headers.get('Origin')
+    response.headers['Access-Control-Allow-Origin'] = origin or '*'
+    if origin:
+        response.vary.add('Origin')
+    if (response.status_code == 200 and response.mimetype in COMPRESSIBLE_TYPES
+            and 'Content-Encoding' not in response.headers):
+        response.vary.add('Accept-Encoding')
+        body = await response.get_data()
+        if len(body) >= COMPRESS_MIN_SIZE:
+            encoding, body = compress_body(body, request.accept_encodings)
+            if encoding is not None:
+                response.set_data(body)
+                response.headers['Content-Encoding'] = encoding
+                etag, weak = response.get_etag()
+                if etag and not weak:
+                    response.set_etag(etag, weak=True)
+    started = g.pop('request_started', None)
+    if started is not None:
+        threaded.request_latency.observe(time.perf_counter() - started,
+                                         request.endpoint or 'unmatched', request.method, response.status_code)
+    return response
+
+
+@async_app.route('/events')
+@conditional_get(lambda: ['Events'])
+async def view_events():
+    """Display a list of events for end-users."""
+    try:
+        limit = page_limit(request.args, 150)
+        # A stale catalog is left to the refresher rather than refreshed on the
+        # loop; reads of a fresh one wait on its lock, so they run in a thread
+        if threaded.EVENT_CATALOG and threaded.event_catalog.fresh(refresh=False):
+            page = await asyncio.to_thread(threaded.event_catalog.page, after=request.args.get('after'), limit=limit)
+            return listing_response(*page)
+        sql, params = page_query(threaded.EVENT_LISTING_SELECT, [], [], threaded.EVENT_ORDER,
+                                 request.args.get('after'), limit)
+        async with Database(read=True) as db:
+            rows = await db.fetchall(sql, params)
+        return listing_response(*page_result(rows, threaded.EVENT_ORDER, limit))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        print(e)
+        return jsonify({'error': f'An error occurred while fetching events: {str(e)}'}), 500
+
+
+@async_app.route('/tickets/<event_title>')
+@conditional_get(lambda event_title: ['Tickets', 'Events'])
+async def view_tickets_by_title(event_title):
+    """Display a list of tickets for a given event title."""
+    try:
+        async with Database(read=True) as db:
+            tickets = await db.fetchall(threaded.TICKETS_FOR_EVENT_SELECT, (event_title,))
+        if not tickets:
+            return jsonify({'message': f'No tickets found for event: {event_title}'}), 404
+        return jsonify(tickets)
+    except Exception as e:
+        print(e)
+        return jsonify({'error': f'An error occurred while fetching tickets: {str(e)}'}), 500
+
+
+@async_app.route('/wishlist', methods=['GET'])
+@conditional_get(logged_in_tables('WishList:{user}', 'Events'))
+async def fetch_wishlist():
+    """Fetch wishlist for the logged-in user."""
+    if 'user' not in session:
+        return jsonify({'error': 'Unauthorized access'}), 401
+    try:
+        async with Database(read=True) as db:
+            wishlist_events = await db.fetchall(threaded.WISHLIST_SELECT, (session['user'],))
+        return jsonify(wishlist_events), 200
+    except Exception as e:
+        print(e)
+        return jsonify({'error': f'Error fetching wishlist: {str(e)}'}), 500
+
+
+async def call_cached_procedure(name, arg):
+    async def load():
+        async with Database(read=True) as db:
+            return await db.fetchall(f"CALL {name}(%s)", (arg,))
+    return await cached((name, arg), load)
+
+
+@async_app.route('/popular-events')
+async def get_popular_events():
+    if 'user' not in session:
+        return jsonify({'error': 'Unauthorized access'}), 401
+    try:
+        return jsonify(await call_cached_procedure('GetPopularEvents', 10))
+    except Exception as e:
+        print(e)
+        return jsonify({'error': f'An error occurred while fetching popular events: {str(e)}'}), 500
+
+
+@async_app.route('/top-cities-events')
+async def top_cities_events():
+    """Fetch events happening in the top 5 major cities."""
+    if 'user' not in session:
+        return jsonify({'error': 'Unauthorized access'}), 401
+    try:
+        return jsonify(await call_cached_procedure('GetTopCitiesEvents', 10))
+    except Exception as e:
+        print(e)
+        return jsonify({'error': f'An error occurred: {str(e)}'}), 500
+
+
+async def fetch_ranked_events(db, ranked_titles, conditions, params, after, limit, truncated=False):
+    """app.fetch_ranked_events over an async connection."""
+    pos = threaded.search_position(after)
+    chunk_size = max(limit * 2, 100)
+    events = []
+    chunks = 0
+    while pos < len(ranked_titles) and len(events) < limit and chunks < threaded.SEARCH_MAX_CHUNKS:
+        chunk = ranked_titles[pos:pos + chunk_size]
+        rows = await db.fetchall(*threaded.ranked_events_query(chunk, conditions, params))
+        pos = threaded.collect_ranked_events(events, chunk, rows, pos, limit)
+        chunks += 1
+    next_cursor = encode_cursor([pos]) if pos < len(ranked_titles) or truncated else None
+    return events, next_cursor
+
+
+async def load_facets(facet_sql):
+    if facet_sql is None:
+        return []
+
+    async def load():
+        async with Database(read=True) as db:
+            return await db.fetchall(*facet_sql)
+    return await cached(('facets',) + facet_sql, load)
+
+
+def filtered_events_tables(*args, **kwargs):
+    if 'user' not in session:
+        return None
+    tables = threaded.FILTERED_EVENTS_TABLES
+    return tables.get(request.args.get('tab', 'all'), tables['all'])
+
+
+@async_app.route('/filtered-events')
+@conditional_get(filtered_events_tables)
+async def filtered_events():
+    if 'user' not in session:
+        return jsonify({'error': 'Unauthorized access'}), 401
+
+    query = request.args.get('query', '').lower()
+    tab = request.args.get('tab', 'all')
+    after = request.args.get('after')
+    try:
+        limit = page_limit(request.args, 150)
+        # The catalog and the title index are searched under their locks, off the loop
+        listing = await asyncio.to_thread(threaded.catalog_listing, request.args, tab, query, after, limit,
+                                          refresh=False)
+        if listing is not None:
+            return listing_response(*listing)
+
+        conditions, params = threaded.event_filters(request.args)
+
+        cities = matches = None
+        truncated = False
+
+        if tab == 'popular':
+            if query:
+                conditions.append("LOWER(e.event_title) LIKE %s")
+                params.append(f'%{query}%')
+
+            async def load():
+                sql, page_params = page_query(threaded.POPULAR_EVENTS_SELECT, conditions, params,
+                                              threaded.POPULAR_ORDER, after, limit)
+                async with Database(read=True) as db:
+                    return page_result(await db.fetchall(sql, page_params), threaded.POPULAR_ORDER, limit)
+            key = ('popular', tuple(conditions), tuple(params), after, limit)
+            events, next_cursor = await cached(key, load)
+        else:
+            if threaded.search_by_index(query, after):
+                matches, truncated = await asyncio.to_thread(threaded.search_matches, query, after)
+            async with Database(read=True) as db:
+                if tab == 'major':
+                    cities = [row['city'] for row in await db.fetchall(TOP_CITIES_SQL, (5,))]
+                    if cities:
+                        conditions.append("city IN (" + ", ".join(["%s"] * len(cities)) + ")")
+                        params.extend(cities)
+
+                if cities == []:
+                    events, next_cursor = [], None
+                elif matches is not None:
+                    events, next_cursor = await fetch_ranked_events(db, matches, conditions, params, after, limit,
+                                                                    truncated)
+                else:
+                    if query:
+                        conditions.append("LOWER(event_title) LIKE %s")
+                        params.append(f'%{query}%')
+                    sql, page_params = page_query(threaded.EVENT_LISTING_SELECT, conditions, params,
+                                                  threaded.EVENT_ORDER, after, limit)
+                    events, next_cursor = page_result(await db.fetchall(sql, page_params),
+                                                      threaded.EVENT_ORDER, limit)
+
+        facets = None
+        if threaded.facets_requested(request.args):
+            facet_titles = None
+            if matches is not None:
+                facet_titles = await asyncio.to_thread(threaded.search_facet_titles, query, matches, truncated)
+            facet_sql = threaded.facets_query(request.args, tab, query, cities, facet_titles)
+            facets = summarize_facets(await load_facets(facet_sql), request.args.get('city', 'all'))
+        return listing_response(events, next_cursor, facets)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        print(e)
+        return jsonify({'error': f'An error occurred while fetching events: {str(e)}'}), 500
+
+
+async def claim_notifications(username, limit=None):
+    """notifications.claim_notifications over an async connection."""
+    async with Database() as db:
+        await db.conn.begin()
+        try:
+            notifications = await db.fetchall(*claim_query(username, limit))
+            if notifications:
+                await db.cursor.execute(*mark_read_query(notifications))
+            await db.conn.commit()
+        except Exception:
+            await db.conn.rollback()
+            raise
+    return notifications
+
+
+# Waiting clients are suspended tasks here, not threads, so they need no cap
+threaded.notification_slots.limit = None
+
+
+@async_app.route('/notifications/stream')
+async def notifications_stream():
+    """Push notifications to the browser as Server-Sent Events."""
+    if 'user' not in session:
+        return jsonify({'error': 'Unauthorized access'}), 401
+
+    username = session['user']
+    hub = threaded.notification_hub
+
+    async def stream():
+        # Ends like the threaded stream does; EventSource reconnects on its own
+        deadline = time.monotonic() + threaded.NOTIFY_STREAM_SECONDS
+        yield b'retry: 3000\n\n'
+        try:
+            while True:
+                version = hub.version(username)
+                notifications = await claim_notifications(username, 100)
+                for notification in notifications:
+                    yield (f"id: {notification['notification_id']}\n"
+                           f"event: notification\n"
+                           f"data: {async_app.json.dumps(notification)}\n\n").encode()
+                if len(notifications) == 100:
+                    continue
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                if await hub.wait_async(username, version, min(15, remaining)) == version:
+                    yield b': keep-alive\n\n'
+        except Exception as e:
+            print(e)
+
+    response = await make_response(stream(), 200, {'Content-Type': 'text/event-stream',
+                                                   'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    response.timeout = None
+    return response
+
+
+@async_app.route('/notifications/poll')
+async def notifications_poll():
+    """Long-poll fallback: return as soon as there are notifications, or after ?timeout= seconds."""
+    if 'user' not in session:
+        return jsonify({'error': 'Unauthorized access'}), 401
+
+    username = session['user']
+    try:
+        timeout = threaded.poll_timeout(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    deadline = time.monotonic() + timeout
+    try:
+        while True:
+            version = threaded.notification_hub.version(username)
+            notifications = await claim_notifications(username)
+            remaining = deadline - time.monotonic()
+            if notifications or remaining <= 0:
+                return jsonify(notifications)
+            await threaded.notification_hub.wait_async(username, version, remaining)
+    except Exception as e:
+        print(e)
+        return jsonify({'error': f'An error occurred: {str(e)}'}), 500
+
+
+# Requests are routed with the Flask app's URL map, so a path like
+# /tickets/records still reaches its Flask view rather than the
+# /tickets/<event_title> coroutine.
+ASYNC_ENDPOINTS = {rule.endpoint for rule in async_app.url_map.iter_rules()} - {'static'}
+flask_routes = threaded.app.url_map.bind('')
+flask_app = AsyncioWSGIMiddleware(threaded.app, max_body_size=int(os.getenv('ASYNC_MAX_BODY_SIZE', str(64 * 2**20))))
+
+
+def _served_async(scope):
+    try:
+        endpoint, _ = flask_routes.match(scope['path'], method=scope['method'])
+    except HTTPException:
+        return False
+    return endpoint in ASYNC_ENDPOINTS
+
+
+async def application(scope, receive, send):
+    """ASGI entry point: the coroutine views above, else the Flask app."""
+    if scope['type'] == 'http' and not _served_async(scope):
+        await flask_app(scope, receive, send)
+    else:
+        await async_app(scope, receive, send)
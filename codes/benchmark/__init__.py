@@ -0,0 +1,10 @@
+"""Offline benchmark harness for the Flask app.
+
+    python -m benchmark generate   # build a synthetic database
+    python -m benchmark run        # replay a route mix against a running server
+    python -m benchmark contention # sell out one event through the ticket hold API
+    python -m benchmark compare    # diff two result files
+
+Run from the codes/ directory. Everything is seeded, so two runs with the
+same arguments generate the same data and the same request sequence.
+"""
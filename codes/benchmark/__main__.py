@@ -0,0 +1,171 @@
+import argparse
+import os
+import sys
+
+from dotenv import load_dotenv
+
+import benchmark
+from benchmark import contention, datagen, loadgen, report
+
+
+def db_config(args):
+    return {
+        'host': args.db_host,
+        'port': args.db_port,
+        'user': args.db_user,
+        'password': args.db_password,
+        'database': args.db_name,
+    }
+
+
+def add_db_arguments(parser):
+    parser.add_argument('--db-host', default=os.getenv('GCP_DB_HOST', '127.0.0.1'))
+    parser.add_argument('--db-port', type=int, default=3306)
+    parser.add_argument('--db-user', default=os.getenv('GCP_DB_USER', 'root'))
+    parser.add_argument('--db-password', default=os.getenv('GCP_DB_PASSWORD', ''))
+    parser.add_argument('--db-name', default=os.getenv('GCP_DB_NAME', 'ticketmaster_bench'))
+
+
+def cmd_generate(args):
+    import mysql.connector
+
+    scale = dict(datagen.SCALES[args.scale])
+    for key in scale:
+        value = getattr(args, key)
+        if value is not None:
+            scale[key] = value
+    conn = mysql.connector.connect(**db_config(args))
+    try:
+        manifest = datagen.generate(conn, scale, seed=args.seed, batch_size=args.batch_size,
+                                    drop=not args.keep)
+    finally:
+        conn.close()
+    manifest['scale'] = args.scale
+    datagen.write_manifest(args.manifest, manifest)
+    print(f'Wrote {args.manifest}')
+
+
+def cmd_run(args):
+    manifest = datagen.read_manifest(args.manifest)
+    config = {
+        'base_url': args.base_url,
+        'label': args.label,
+        'mix': args.mix,
+        'concurrency': args.concurrency,
+        'duration': args.duration,
+        'warmup': args.warmup,
+        'seed': args.seed,
+        'etags': not args.no_etags,
+        'think_time': args.think_time,
+    }
+    samples, window = loadgen.run(args.base_url, manifest, mix=args.mix, concurrency=args.concurrency,
+                                  duration=args.duration, warmup=args.warmup, seed=args.seed,
+                                  etags=not args.no_etags, think_time=args.think_time)
+    result = report.build_report(config, manifest, samples, window)
+    name = '-'.join(filter(None, [result['environment']['commit'] or 'unknown', args.mix, args.label]))
+    out = args.out or os.path.join('benchmark-results', name + '.json')
+    report.write_report(out, result)
+    print(report.format_report(result))
+    print(f'Wrote {out}')
+
+
+def cmd_contention(args):
+    import mysql.connector
+
+    manifest = datagen.read_manifest(args.manifest)
+    config = {
+        'base_url': args.base_url,
+        'label': args.label,
+        'mix': 'contention',
+        'concurrency': args.concurrency,
+        'listings': args.listings,
+        'seats': args.seats,
+        'max_quantity': args.max_quantity,
+        'release_ratio': args.release_ratio,
+        'by_ticket': args.by_ticket,
+        'seed': args.seed,
+    }
+    # The primary the server writes to, not a replica that may lag it
+    conn = mysql.connector.connect(**db_config(args))
+    try:
+        samples, window, outcome = contention.run(
+            args.base_url, manifest, conn, concurrency=args.concurrency, listings=args.listings,
+            seats=args.seats, max_quantity=args.max_quantity, release_ratio=args.release_ratio,
+            by_ticket=args.by_ticket, duration=args.duration, seed=args.seed, keep=args.keep)
+    finally:
+        conn.close()
+    result = report.build_report(config, manifest, samples, window)
+    result['contention'] = outcome
+    name = '-'.join(filter(None, [result['environment']['commit'] or 'unknown', 'contention', args.label]))
+    out = args.out or os.path.join('benchmark-results', name + '.json')
+    report.write_report(out, result)
+    print(report.format_report(result))
+    print(contention.format_outcome(outcome))
+    print(f'Wrote {out}')
+    if outcome['discrepancy']:
+        return 1
+
+
+def cmd_compare(args):
+    print(report.format_comparison(report.read_report(args.base), report.read_report(args.head)))
+
+
+def main(argv=None):
+    load_dotenv()
+    parser = argparse.ArgumentParser(prog='python -m benchmark', description=benchmark.__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    gen = sub.add_parser('generate', help='Create the schema and synthetic data in a local MySQL')
+    add_db_arguments(gen)
+    gen.add_argument('--scale', choices=sorted(datagen.SCALES), default='small')
+    for key in datagen.SCALES['small']:
+        gen.add_argument('--' + key.replace('_', '-'), dest=key, type=int)
+    gen.add_argument('--seed', type=int, default=42)
+    gen.add_argument('--batch-size', type=int, default=5000)
+    gen.add_argument('--keep', action='store_true', help='Do not drop existing tables first')
+    gen.add_argument('--manifest', default='bench-manifest.json')
+    gen.set_defaults(func=cmd_generate)
+
+    run = sub.add_parser('run', help='Replay a route mix against a running server')
+    run.add_argument('--base-url', default='http://127.0.0.1:8080')
+    run.add_argument('--mix', choices=sorted(loadgen.MIXES), default='mixed')
+    run.add_argument('--concurrency', type=int, default=16)
+    run.add_argument('--duration', type=float, default=60, help='Measured seconds')
+    run.add_argument('--warmup', type=float, default=10, help='Seconds discarded before measuring')
+    run.add_argument('--seed', type=int, default=42)
+    run.add_argument('--think-time', type=float, default=0.0, help='Mean pause between requests')
+    run.add_argument('--no-etags', action='store_true', help='Never send If-None-Match')
+    run.add_argument('--manifest', default='bench-manifest.json')
+    run.add_argument('--label', help='Tag for the server setup, e.g. threaded or async')
+    run.add_argument('--out')
+    run.set_defaults(func=cmd_run)
+
+    rush = sub.add_parser('contention', help='Sell one event out through the ticket hold API')
+    rush.add_argument('--base-url', default='http://127.0.0.1:8080')
+    add_db_arguments(rush)
+    rush.add_argument('--concurrency', type=int, default=64)
+    rush.add_argument('--listings', type=int, default=20, help='Ticket listings of the event (at most 10000)')
+    rush.add_argument('--seats', type=int, default=50, help='Seats per listing')
+    rush.add_argument('--max-quantity', type=int, default=4, help='Most seats per hold (at most 10)')
+    rush.add_argument('--release-ratio', type=float, default=0.2, help='Share of holds released instead of bought')
+    rush.add_argument('--by-ticket', action='store_true', help='Hold a random listing instead of the cheapest')
+    rush.add_argument('--duration', type=float, default=120, help='Stop after this many seconds if not sold out')
+    rush.add_argument('--seed', type=int, default=42)
+    rush.add_argument('--keep', action='store_true', help='Do not delete the event afterwards')
+    rush.add_argument('--manifest', default='bench-manifest.json')
+    rush.add_argument('--label')
+    rush.add_argument('--out')
+    rush.set_defaults(func=cmd_contention)
+
+    compare = sub.add_parser('compare', help='Diff two result files')
+    compare.add_argument('base')
+    compare.add_argument('head')
+    compare.set_defaults(func=cmd_compare)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,193 @@
+import random
+import threading
+import time
+import urllib.parse
+
+from benchmark.datagen import ADMIN_USER, location_name, username
+from benchmark.loadgen import Client
+
+HOLD = 'POST /tickets/holds'
+CONFIRM = 'POST /tickets/holds/<id>/confirm'
+RELEASE = 'DELETE /tickets/holds/<id>'
+
+
+def create_sale(admin, listings, seats, run_id):
+    """A fresh event with `listings` listings of `seats` seats each; returns (title, ticket_ids)."""
+    title = f'Contention Benchmark {run_id}'
+    status, body = admin.request_json('POST', '/events/create', {
+        'event_title': title, 'event_url': '', 'datetime_local': '2030-01-01 20:00:00',
+        'location_name': location_name(0), 'promoter_name': 'Benchmark'})
+    if status != 201:
+        raise RuntimeError(f'Creating the event failed ({status}): {body}')
+    ticket_ids = []
+    for i in range(listings):
+        # Distinct row_num per listing, so GET /tickets/<title> lists each one
+        ticket_id = run_id * 10000 + i
+        status, body = admin.request_json('POST', '/tickets/create', {
+            'ticket_id': ticket_id, 'event_title': title, 'ticket_price': 50 + i, 'fee': 5,
+            'total_price': 55 + i, 'quantity': seats, 'full_section': f'Section {i % 5}',
+            'section': str(i % 5), 'row_num': str(i)})
+        if status != 201:
+            raise RuntimeError(f'Creating ticket {ticket_id} failed ({status}): {body}')
+        ticket_ids.append(ticket_id)
+    return title, ticket_ids
+
+
+def seat_counts(conn, ticket_ids):
+    """Seats of the listings by state, read from the primary in one snapshot.
+
+    Returns {'remaining', 'held', 'purchased'}: Tickets.quantity, and the
+    seats of TicketHolds rows still held or bought. Released and expired
+    holds have given their seats back to Tickets.quantity.
+    """
+    placeholders = ', '.join(['%s'] * len(ticket_ids))
+    cursor = conn.cursor()
+    try:
+        conn.start_transaction(consistent_snapshot=True, readonly=True)
+        cursor.execute(f"SELECT COALESCE(SUM(quantity), 0) FROM Tickets WHERE ticket_id IN ({placeholders})",
+                       tuple(ticket_ids))
+        counts = {'remaining': int(cursor.fetchone()[0]), 'held': 0, 'purchased': 0}
+        cursor.execute(f"SELECT status, SUM(quantity) FROM TicketHolds WHERE ticket_id IN ({placeholders}) "
+                       "AND status IN ('held', 'purchased') GROUP BY status", tuple(ticket_ids))
+        for status, quantity in cursor.fetchall():
+            counts[status] = int(quantity)
+        conn.commit()
+        return counts
+    finally:
+        cursor.close()
+
+
+def run(base_url, manifest, conn, concurrency=64, listings=20, seats=50, max_quantity=4, release_ratio=0.2,
+        by_ticket=False, duration=120, seed=42, keep=False):
+    """Sell one event out from `concurrency` buyers at once.
+
+    Each buyer holds 1 to `max_quantity` seats, then releases them with
+    probability `release_ratio` or confirms them, until the event is sold
+    out or `duration` seconds pass. Holds pick the cheapest listing with
+    enough seats, or with `by_ticket` a random listing that still has some.
+
+    `conn` is a connection to the primary database. Returns (samples,
+    window, outcome); outcome checks that the seats bought, still on sale
+    and still held add up exactly to what was put on sale.
+    """
+    run_id = int(time.time() * 1000)
+    admin = Client(base_url, etags=False)
+    admin.login(ADMIN_USER, manifest['password'])
+    title, ticket_ids = create_sale(admin, listings, seats, run_id)
+    total = listings * seats
+
+    barrier = threading.Barrier(concurrency + 1)
+    started = threading.Event()
+    sold_out = threading.Event()
+    lock = threading.Lock()
+    open_listings = list(ticket_ids)
+    results = [[] for _ in range(concurrency)]
+    bought = [0] * concurrency
+    unfinished = [0] * concurrency
+    login_errors = []
+    clock = {}
+
+    def listing_gone(ticket_id):
+        with lock:
+            if ticket_id in open_listings:
+                open_listings.remove(ticket_id)
+            if not open_listings:
+                sold_out.set()
+
+    def buyer(index):
+        rng = random.Random(seed * 1000003 + index)
+        client = Client(base_url, etags=False)
+        try:
+            client.login(username(index % manifest['users']), manifest['password'])
+        except Exception as e:
+            login_errors.append(e)
+        barrier.wait()
+        started.wait()
+        if login_errors:
+            return
+        samples = results[index]
+
+        def timed(label, method, path, body=None):
+            start = time.perf_counter()
+            try:
+                status, payload = client.request_json(method, path, body)
+            except Exception as e:
+                status, payload = type(e).__name__, None
+            samples.append((label, time.perf_counter() - start, status))
+            return status, payload
+
+        want = rng.randint(1, max_quantity)
+        while not sold_out.is_set() and time.perf_counter() < clock['stop']:
+            body = {'quantity': want}
+            if by_ticket:
+                with lock:
+                    if not open_listings:
+                        return
+                    body['ticket_id'] = rng.choice(open_listings)
+            else:
+                body['event_title'] = title
+            status, hold = timed(HOLD, 'POST', '/tickets/holds', body)
+            if status == 409:
+                # Fewer seats left than wanted: try for one before giving up
+                if want > 1:
+                    want = 1
+                elif by_ticket:
+                    listing_gone(body['ticket_id'])
+                else:
+                    sold_out.set()
+                continue
+            if status != 201:
+                continue
+            path = f"/tickets/holds/{hold['hold_id']}"
+            if rng.random() < release_ratio:
+                status, _ = timed(RELEASE, 'DELETE', path)
+            else:
+                status, _ = timed(CONFIRM, 'POST', path + '/confirm')
+                if status == 200:
+                    bought[index] += hold['quantity']
+            if status != 200:
+                # Left to expire; the reaper will put the seats back
+                unfinished[index] += hold['quantity']
+            want = rng.randint(1, max_quantity)
+
+    threads = [threading.Thread(target=buyer, args=(i,), daemon=True) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    barrier.wait()
+    start = time.perf_counter()
+    clock['stop'] = start + duration
+    started.set()
+    for thread in threads:
+        thread.join()
+    window = time.perf_counter() - start
+    if login_errors:
+        raise RuntimeError(f'{len(login_errors)} of {concurrency} logins failed: {login_errors[0]}')
+
+    counts = seat_counts(conn, ticket_ids)
+    sold = counts['purchased']
+    outcome = {
+        'event_title': title,
+        'seats': total,
+        'sold': sold,
+        'confirmed': sum(bought),
+        'remaining': counts['remaining'],
+        'held': counts['held'],
+        'unfinished_holds': sum(unfinished),
+        # Positive: seats were sold twice or created; negative: seats were lost
+        'discrepancy': sold + counts['remaining'] + counts['held'] - total,
+        'sold_out': sold_out.is_set(),
+        'seconds_to_sell': round(window, 2),
+        'purchases_per_second': round(sold / window, 2) if window else None,
+    }
+    if not keep:
+        admin.request_json('DELETE', '/events/delete/' + urllib.parse.quote(title))
+    return [sample for samples in results for sample in samples], window, outcome
+
+
+def format_outcome(outcome):
+    lines = [f"{outcome['seats']} seats: {outcome['sold']} sold ({outcome['confirmed']} confirmed to buyers), "
+             f"{outcome['remaining']} still offered, {outcome['held']} held "
+             f"({outcome['unfinished_holds']} in unfinished holds), discrepancy {outcome['discrepancy']}",
+             f"{'sold out' if outcome['sold_out'] else 'not sold out'} after {outcome['seconds_to_sell']}s, "
+             f"{outcome['purchases_per_second']} seats bought per second"]
+    return '\n'.join(lines)
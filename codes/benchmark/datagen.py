@@ -0,0 +1,186 @@
+import hashlib
+import itertools
+import json
+import random
+import time
+from datetime import datetime, timedelta
+
+from benchmark.schema import create_schema
+
+# Row counts per preset; any of them can be overridden on the command line
+SCALES = {
+    'small': {'users': 1000, 'locations': 300, 'events': 5000, 'tickets': 100000,
+              'wishlists_per_user': 8, 'notifications_per_user': 4},
+    'medium': {'users': 10000, 'locations': 2000, 'events': 50000, 'tickets': 1000000,
+               'wishlists_per_user': 12, 'notifications_per_user': 6},
+    'large': {'users': 50000, 'locations': 5000, 'events': 200000, 'tickets': 5000000,
+              'wishlists_per_user': 15, 'notifications_per_user': 8},
+}
+
+PASSWORD = 'benchmark'
+ADMIN_USER = 'bench_admin'
+
+CITIES = [
+    ('New York', 'NY'), ('Los Angeles', 'CA'), ('Chicago', 'IL'), ('Houston', 'TX'),
+    ('Phoenix', 'AZ'), ('Philadelphia', 'PA'), ('San Antonio', 'TX'), ('San Diego', 'CA'),
+    ('Dallas', 'TX'), ('Austin', 'TX'), ('Jacksonville', 'FL'), ('San Jose', 'CA'),
+    ('Columbus', 'OH'), ('Charlotte', 'NC'), ('Indianapolis', 'IN'), ('Seattle', 'WA'),
+    ('Denver', 'CO'), ('Nashville', 'TN'), ('Boston', 'MA'), ('Las Vegas', 'NV'),
+    ('Portland', 'OR'), ('Detroit', 'MI'), ('Atlanta', 'GA'), ('Miami', 'FL'),
+    ('Minneapolis', 'MN'), ('New Orleans', 'LA'), ('Cleveland', 'OH'), ('Tampa', 'FL'),
+    ('Pittsburgh', 'PA'), ('St. Louis', 'MO'), ('Kansas City', 'MO'), ('Milwaukee', 'WI'),
+    ('Salt Lake City', 'UT'), ('Raleigh', 'NC'), ('Orlando', 'FL'), ('Sacramento', 'CA'),
+    ('Champaign', 'IL'), ('Madison', 'WI'), ('Omaha', 'NE'), ('Tucson', 'AZ'),
+]
+VENUE_KINDS = ['Arena', 'Stadium', 'Theater', 'Hall', 'Amphitheater', 'Club', 'Pavilion', 'Ballroom']
+TITLE_FIRST = ['Midnight', 'Electric', 'Golden', 'Silver', 'Neon', 'Crimson', 'Velvet', 'Wild',
+               'Lost', 'Royal', 'Cosmic', 'Summer', 'Winter', 'Broken', 'Blue', 'Rolling']
+TITLE_SECOND = ['Hearts', 'Tigers', 'Echoes', 'Rebels', 'Dreams', 'Lights', 'Riders', 'Giants',
+                'Shadows', 'Stars', 'Kings', 'Waves', 'Ghosts', 'Saints', 'Wolves', 'Pilots']
+TITLE_KIND = ['Tour', 'Live', 'Festival', 'Night', 'Showcase', 'Revival', 'Experience', 'Concert']
+PROMOTERS = ['Live Nation', 'AEG Presents', 'Another Planet', 'Jam Productions', 'C3 Presents',
+             'Outback Presents', 'Messina Touring', 'Local Promoter']
+SECTIONS = ['Floor', '100', '101', '102', '103', '200', '201', '202', '300', '301', 'Balcony', 'GA']
+
+START = datetime(2025, 1, 1)
+
+
+# Names are a pure function of the row number so the load driver can build
+# requests without reading the database.
+def username(i):
+    return f'bench_user{i:06d}'
+
+
+def event_title(i):
+    first = TITLE_FIRST[i % len(TITLE_FIRST)]
+    second = TITLE_SECOND[(i // len(TITLE_FIRST)) % len(TITLE_SECOND)]
+    kind = TITLE_KIND[(i // (len(TITLE_FIRST) * len(TITLE_SECOND))) % len(TITLE_KIND)]
+    return f'{first} {second} {kind} {i}'
+
+
+def location_name(i):
+    city, _ = CITIES[i % len(CITIES)]
+    return f'{city} {VENUE_KINDS[(i // len(CITIES)) % len(VENUE_KINDS)]} {i}'
+
+
+def zipf_weights(n, s=1.1):
+    """Cumulative weights for random.choices: rank 0 is the most likely."""
+    return list(itertools.accumulate(1.0 / (rank + 1) ** s for rank in range(n)))
+
+
+def _batches(rows, size):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _load(conn, table, columns, rows, batch_size):
+    cursor = conn.cursor()
+    sql = (f"INSERT INTO {table} ({', '.join(columns)}) "
+           f"VALUES ({', '.join(['%s'] * len(columns))})")
+    total = 0
+    start = time.perf_counter()
+    for batch in _batches(rows, batch_size):
+        cursor.executemany(sql, batch)
+        conn.commit()
+        total += len(batch)
+    cursor.close()
+    elapsed = time.perf_counter() - start
+    print(f'{table}: {total} rows in {elapsed:.1f}s')
+    return total
+
+
+def generate(conn, scale, seed=42, batch_size=5000, drop=True):
+    """Create the schema and fill it with `scale` rows; returns the manifest."""
+    rng = random.Random(seed)
+    create_schema(conn, drop=drop)
+    cursor = conn.cursor()
+    cursor.execute("SET SESSION unique_checks = 0")
+    cursor.execute("SET SESSION foreign_key_checks = 0")
+    cursor.close()
+
+    password = hashlib.md5(PASSWORD.encode()).hexdigest()
+    users = [(ADMIN_USER, 'Benchmark Admin', password, 1)]
+    users += [(username(i), f'Bench User {i}', password, 0) for i in range(scale['users'])]
+    _load(conn, 'Users', ['username', 'name', 'password', 'is_admin'], users, batch_size)
+
+    _load(conn, 'Locations', ['location_name', 'city', 'state'],
+          ((location_name(i), *CITIES[i % len(CITIES)]) for i in range(scale['locations'])),
+          batch_size)
+
+    # A few cities host most events, like the real dataset
+    by_city = {}
+    for i in range(scale['locations']):
+        by_city.setdefault(i % len(CITIES), []).append(i)
+    city_ids = sorted(by_city)
+    city_weights = zipf_weights(len(city_ids))
+    span = 2 * 365 * 24 * 60
+
+    def events():
+        for i in range(scale['events']):
+            city = rng.choices(city_ids, cum_weights=city_weights)[0]
+            when = START + timedelta(minutes=rng.randrange(span) // 30 * 30)
+            yield (event_title(i), f'https://example.com/events/{i}', when,
+                   location_name(rng.choice(by_city[city])), rng.choice(PROMOTERS))
+    _load(conn, 'Events', ['event_title', 'event_url', 'datetime_local', 'location_name', 'promoter_name'],
+          events(), batch_size)
+
+    event_ids = range(scale['events'])
+    event_weights = zipf_weights(scale['events'], s=0.9)
+
+    def tickets():
+        for ticket_id in range(1, scale['tickets'] + 1):
+            event = rng.choices(event_ids, cum_weights=event_weights)[0]
+            section = rng.choice(SECTIONS)
+            price = round(rng.lognormvariate(4.3, 0.6), 2)
+            fee = round(price * rng.uniform(0.1, 0.3), 2)
+            yield (ticket_id, event_title(event), price, fee, round(price + fee, 2),
+                   rng.randint(1, 8), f'Section {section}', section, str(rng.randint(1, 40)))
+    _load(conn, 'Tickets', ['ticket_id', 'event_title', 'ticket_price', 'fee', 'total_price',
+                            'quantity', 'full_section', 'section', 'row_num'],
+          tickets(), batch_size)
+
+    def wishlists():
+        for i in range(scale['users']):
+            picks = set(rng.choices(event_ids, cum_weights=event_weights, k=scale['wishlists_per_user']))
+            for event in sorted(picks):
+                yield (username(i), event_title(event), START - timedelta(minutes=rng.randrange(span)))
+    _load(conn, 'WishList', ['username', 'event_title', 'wishlist_date'], wishlists(), batch_size)
+
+    def notifications():
+        for i in range(scale['users']):
+            for _ in range(scale['notifications_per_user']):
+                event = event_title(rng.choices(event_ids, cum_weights=event_weights)[0])
+                yield (username(i), event, f'You have added "{event}" to your wishlist.',
+                       int(rng.random() < 0.7))
+    _load(conn, 'Notifications', ['username', 'event_title', 'message', 'is_read'],
+          notifications(), batch_size)
+
+    cursor = conn.cursor()
+    cursor.execute("SET SESSION unique_checks = 1")
+    cursor.execute("SET SESSION foreign_key_checks = 1")
+    for table in ('Users', 'Locations', 'Events', 'Tickets', 'WishList', 'Notifications'):
+        cursor.execute(f"ANALYZE TABLE {table}")
+        cursor.fetchall()
+    cursor.close()
+
+    # The app's own tables, views and counters, filled now so the first run is warm
+    from migrations import migrate
+    migrate(conn)
+
+    return {'seed': seed, 'password': PASSWORD, 'admin': ADMIN_USER, **scale}
+
+
+def write_manifest(path, manifest):
+    with open(path, 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+
+
+def read_manifest(path):
+    with open(path) as f:
+        return json.load(f)
@@ -0,0 +1,181 @@
+import http.cookiejar
+import json
+import random
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+from benchmark.datagen import CITIES, TITLE_FIRST, TITLE_SECOND, event_title, username, zipf_weights
+
+
+class Client:
+    """One logged-in browser: its own cookie jar and, optionally, ETag cache."""
+
+    def __init__(self, base_url, etags=True, timeout=30):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.cookies = http.cookiejar.CookieJar()
+        self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(self.cookies))
+        self.etags = {} if etags else None
+
+    def login(self, user, password):
+        form = urllib.parse.urlencode({'username': user, 'password': password}).encode()
+        req = urllib.request.Request(self.base_url + '/login', data=form, method='POST')
+        with self.opener.open(req, timeout=self.timeout) as resp:
+            resp.read()
+        if not any(cookie.name == 'session' for cookie in self.cookies):
+            raise RuntimeError(f'Login failed for {user}')
+
+    def _send(self, method, path, body, headers):
+        data = None
+        if body is not None:
+            data = json.dumps(body).encode()
+            headers['Content-Type'] = 'application/json'
+        req = urllib.request.Request(self.base_url + path, data=data, headers=headers, method=method)
+        try:
+            with self.opener.open(req, timeout=self.timeout) as resp:
+                return resp.status, resp.headers.get('ETag'), resp.read()
+        except urllib.error.HTTPError as e:
+            return e.code, None, e.read()
+
+    def request(self, method, path, body=None):
+        headers = {'Accept-Encoding': 'gzip'}
+        if self.etags is not None and method == 'GET' and path in self.etags:
+            headers['If-None-Match'] = self.etags[path]
+        status, etag, _ = self._send(method, path, body, headers)
+        if etag and self.etags is not None:
+            self.etags[path] = etag
+        return status
+
+    def request_json(self, method, path, body=None):
+        """Like request(), but also returns the decoded JSON body (None if there is none)."""
+        status, _, raw = self._send(method, path, body, {})
+        try:
+            return status, json.loads(raw) if raw else None
+        except ValueError:
+            return status, None
+
+
+class Workload:
+    """Request builders for the generated dataset; popular events are hit more often."""
+
+    def __init__(self, manifest):
+        self.events = range(manifest['events'])
+        self.weights = zipf_weights(manifest['events'], s=0.9)
+        self.cities = sorted({city for city, _ in CITIES})
+
+    def title(self, rng):
+        return event_title(rng.choices(self.events, cum_weights=self.weights)[0])
+
+    def search_term(self, rng):
+        word = rng.choice(TITLE_FIRST + TITLE_SECOND).lower()
+        return word[:rng.choice((2, 3, 4, len(word)))]
+
+    def date_range(self, rng):
+        start = 2025 + rng.randrange(2)
+        month = rng.randint(1, 12)
+        return {'start_date': f'{start}-{month:02d}-01', 'end_date': f'{start}-{month:02d}-28'}
+
+
+def _listing(**params):
+    params.setdefault('format', 'compact')
+    return '/filtered-events?' + urllib.parse.urlencode(params)
+
+
+# label -> request builder(rng, workload) returning (method, path, body)
+OPERATIONS = {
+    'GET /events': lambda rng, w: ('GET', '/events?format=compact', None),
+    'GET /filtered-events': lambda rng, w: ('GET', _listing(city=rng.choice(w.cities), **w.date_range(rng)), None),
+    'GET /filtered-events search': lambda rng, w: ('GET', _listing(query=w.search_term(rng)), None),
+    'GET /filtered-events popular': lambda rng, w: ('GET', _listing(tab='popular'), None),
+    'GET /filtered-events major': lambda rng, w: ('GET', _listing(tab='major'), None),
+    'GET /popular-events': lambda rng, w: ('GET', '/popular-events', None),
+    'GET /top-cities-events': lambda rng, w: ('GET', '/top-cities-events', None),
+    'GET /tickets/<event_title>': lambda rng, w: ('GET', '/tickets/' + urllib.parse.quote(w.title(rng)), None),
+    'GET /wishlist': lambda rng, w: ('GET', '/wishlist', None),
+    'POST /wishlist': lambda rng, w: ('POST', '/wishlist', {'event_title': w.title(rng)}),
+    'DELETE /wishlist': lambda rng, w: ('DELETE', '/wishlist', {'event_title': w.title(rng)}),
+    'GET /get_notifications': lambda rng, w: ('GET', '/get_notifications', None),
+}
+
+# Relative weights of each operation
+MIXES = {
+    'browse': {
+        'GET /events': 20, 'GET /filtered-events': 15, 'GET /filtered-events search': 15,
+        'GET /filtered-events popular': 10, 'GET /filtered-events major': 5,
+        'GET /popular-events': 5, 'GET /top-cities-events': 5,
+        'GET /tickets/<event_title>': 15, 'GET /wishlist': 5, 'GET /get_notifications': 5,
+    },
+    'wishlist': {
+        'GET /wishlist': 25, 'POST /wishlist': 30, 'DELETE /wishlist': 20,
+        'GET /get_notifications': 15, 'GET /filtered-events': 10,
+    },
+    'mixed': {
+        'GET /events': 15, 'GET /filtered-events': 12, 'GET /filtered-events search': 12,
+        'GET /filtered-events popular': 8, 'GET /filtered-events major': 4,
+        'GET /popular-events': 4, 'GET /top-cities-events': 4,
+        'GET /tickets/<event_title>': 15, 'GET /wishlist': 8, 'POST /wishlist': 6,
+        'DELETE /wishlist': 4, 'GET /get_notifications': 8,
+    },
+}
+
+
+def run(base_url, manifest, mix='mixed', concurrency=16, duration=60, warmup=10,
+        seed=42, etags=True, think_time=0.0):
+    """Replay `mix` from `concurrency` logged-in users.
+
+    Returns (samples, window) where samples are (label, seconds, status)
+    tuples recorded after the warmup and window is the measured seconds.
+    """
+    labels = list(MIXES[mix])
+    weights = [MIXES[mix][label] for label in labels]
+    workload = Workload(manifest)
+    barrier = threading.Barrier(concurrency + 1)
+    started = threading.Event()
+    results = [[] for _ in range(concurrency)]
+    login_errors = []
+    clock = {}
+
+    def user(index):
+        rng = random.Random(seed * 1000003 + index)
+        client = Client(base_url, etags=etags)
+        try:
+            client.login(username(index % manifest['users']), manifest['password'])
+        except Exception as e:
+            login_errors.append(e)
+        barrier.wait()
+        started.wait()
+        if login_errors:
+            return
+        samples = results[index]
+        while True:
+            label = rng.choices(labels, weights=weights)[0]
+            method, path, body = OPERATIONS[label](rng, workload)
+            start = time.perf_counter()
+            if start >= clock['stop']:
+                return
+            try:
+                status = client.request(method, path, body)
+            except Exception as e:
+                status = type(e).__name__
+            end = time.perf_counter()
+            if start >= clock['measure']:
+                samples.append((label, end - start, status))
+            if think_time:
+                time.sleep(rng.expovariate(1.0 / think_time))
+
+    threads = [threading.Thread(target=user, args=(i,), daemon=True) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    barrier.wait()
+    now = time.perf_counter()
+    clock['measure'] = now + warmup
+    clock['stop'] = now + warmup + duration
+    started.set()
+    for thread in threads:
+        thread.join()
+    if login_errors:
+        raise RuntimeError(f'{len(login_errors)} of {concurrency} logins failed: {login_errors[0]}')
+    return [sample for samples in results for sample in samples], duration
@@ -0,0 +1,146 @@
+import json
+import os
+import platform
+import subprocess
+import time
+
+TOTAL = 'TOTAL'
+
+
+def percentile(sorted_values, p):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    rank = max(1, -(-len(sorted_values) * p // 100))
+    return sorted_values[int(rank) - 1]
+
+
+def _ok(status):
+    # 304s are cache hits and 404 is a normal answer for an event without tickets
+    return isinstance(status, int) and (status < 400 or status == 404)
+
+
+def summarize(samples, window):
+    """Per-label count, throughput, error count and latency percentiles (ms)."""
+    by_label = {}
+    for label, seconds, status in samples:
+        by_label.setdefault(label, []).append((seconds, status))
+    by_label[TOTAL] = [(seconds, status) for _, seconds, status in samples]
+
+    endpoints = {}
+    for label, rows in by_label.items():
+        latencies = sorted(seconds * 1000 for seconds, _ in rows)
+        statuses = {}
+        for _, status in rows:
+            statuses[str(status)] = statuses.get(str(status), 0) + 1
+        endpoints[label] = {
+            'count': len(rows),
+            'errors': sum(1 for _, status in rows if not _ok(status)),
+            'throughput_rps': round(len(rows) / window, 2) if window else None,
+            'mean_ms': round(sum(latencies) / len(latencies), 2) if latencies else None,
+            'p50_ms': _round(percentile(latencies, 50)),
+            'p95_ms': _round(percentile(latencies, 95)),
+            'p99_ms': _round(percentile(latencies, 99)),
+            'max_ms': _round(latencies[-1] if latencies else None),
+            'statuses': statuses,
+        }
+    return endpoints
+
+
+def _round(value):
+    return round(value, 2) if value is not None else None
+
+
+def _git(*args):
+    try:
+        return subprocess.run(['git', *args], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def environment():
+    """What was measured and where, so results from two commits can be lined up."""
+    return {
+        'commit': _git('rev-parse', '--short', 'HEAD'),
+        'subject': _git('log', '-1', '--format=%s'),
+        'dirty': bool(_git('status', '--porcelain', '--untracked-files=no')),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'recorded_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+    }
+
+
+def build_report(config, manifest, samples, window):
+    return {
+        'environment': environment(),
+        'config': config,
+        'dataset': manifest,
+        'window_seconds': window,
+        'endpoints': summarize(samples, window),
+    }
+
+
+def write_report(path, report):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+
+
+def read_report(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def _order(endpoints):
+    return sorted((label for label in endpoints if label != TOTAL)) + ([TOTAL] if TOTAL in endpoints else [])
+
+
+def format_report(report):
+    env = report['environment']
+    lines = [f"commit {env['commit']}{' (dirty)' if env['dirty'] else ''}  label={report['config'].get('label')}  "
+             f"mix={report['config'].get('mix')}  concurrency={report['config'].get('concurrency')}  "
+             f"window={report['window_seconds']}s",
+             f"{'endpoint':<32} {'count':>7} {'err':>5} {'rps':>8} {'p50':>8} {'p95':>8} {'p99':>8}"]
+    for label in _order(report['endpoints']):
+        row = report['endpoints'][label]
+        lines.append(f"{label:<32} {row['count']:>7} {row['errors']:>5} {row['throughput_rps']:>8} "
+                     f"{row['p50_ms']!s:>8} {row['p95_ms']!s:>8} {row['p99_ms']!s:>8}")
+    return '\n'.join(lines)
+
+
+def _delta(old, new):
+    if old is None or new is None:
+        return 'n/a'
+    if old == 0:
+        return f'{new:+}'
+    return f'{(new - old) / old * 100:+.1f}%'
+
+
+def _name(report):
+    label = report['config'].get('label')
+    return (report['environment']['commit'] or 'unknown') + (f' ({label})' if label else '')
+
+
+def _comparable(settings):
+    # Where the server ran and what it was called may differ between runs
+    return {k: v for k, v in (settings or {}).items() if k not in ('base_url', 'label')}
+
+
+def format_comparison(base, head):
+    """Side-by-side throughput and percentiles of two reports, with relative change."""
+    lines = [f"base {_name(base)}  ->  head {_name(head)}"]
+    for key in ('config', 'dataset'):
+        if _comparable(base.get(key)) != _comparable(head.get(key)):
+            lines.append(f'warning: {key} differs between runs, results are not directly comparable')
+    lines.append(f"{'endpoint':<32} {'metric':<15} {'base':>9} {'head':>9} {'change':>9}")
+    labels = _order({**base['endpoints'], **head['endpoints']})
+    for label in labels:
+        old = base['endpoints'].get(label, {})
+        new = head['endpoints'].get(label, {})
+        for metric in ('throughput_rps', 'p50_ms', 'p95_ms', 'p99_ms', 'errors'):
+            lines.append(f"{label:<32} {metric:<15} {old.get(metric)!s:>9} {new.get(metric)!s:>9} "
+                         f"{_delta(old.get(metric), new.get(metric)):>9}")
+    return '\n'.join(lines)
@@ -0,0 +1,94 @@
+# Tables and stored procedures the app expects. The production schema was
+# created by hand, so this is a reconstruction from the queries in app.py;
+# the indexes are only the keys the queries cannot work without, so index
+# changes can be measured against it.
+TABLES = [
+    """
+    CREATE TABLE Users (
+        username VARCHAR(255) NOT NULL PRIMARY KEY,
+        name VARCHAR(255),
+        password CHAR(32) NOT NULL,
+        is_admin TINYINT NOT NULL DEFAULT 0
+    )
+    """,
+    """
+    CREATE TABLE Locations (
+        location_name VARCHAR(255) NOT NULL PRIMARY KEY,
+        city VARCHAR(255) NOT NULL,
+        state VARCHAR(64)
+    )
+    """,
+    """
+    CREATE TABLE Events (
+        event_title VARCHAR(255) NOT NULL PRIMARY KEY,
+        event_url VARCHAR(512),
+        datetime_local DATETIME,
+        location_name VARCHAR(255),
+        promoter_name VARCHAR(255),
+        FOREIGN KEY (location_name) REFERENCES Locations (location_name)
+            ON UPDATE CASCADE
+    )
+    """,
+    """
+    CREATE TABLE Tickets (
+        ticket_id BIGINT NOT NULL PRIMARY KEY,
+        event_title VARCHAR(255) NOT NULL,
+        ticket_price DECIMAL(10, 2),
+        fee DECIMAL(10, 2),
+        total_price DECIMAL(10, 2),
+        quantity INT,
+        full_section VARCHAR(255),
+        section VARCHAR(64),
+        row_num VARCHAR(16),
+        FOREIGN KEY (event_title) REFERENCES Events (event_title)
+            ON UPDATE CASCADE ON DELETE CASCADE
+    )
+    """,
+    """
+    CREATE TABLE WishList (
+        username VARCHAR(255) NOT NULL,
+        event_title VARCHAR(255) NOT NULL,
+        wishlist_date DATETIME,
+        PRIMARY KEY (username, event_title),
+        FOREIGN KEY (username) REFERENCES Users (username)
+            ON UPDATE CASCADE ON DELETE CASCADE,
+        FOREIGN KEY (event_title) REFERENCES Events (event_title)
+            ON UPDATE CASCADE ON DELETE CASCADE
+    )
+    """,
+    # No foreign key on event_title: cancellation notices outlive the event
+    """
+    CREATE TABLE Notifications (
+        notification_id INT AUTO_INCREMENT PRIMARY KEY,
+        username VARCHAR(255) NOT NULL,
+        event_title VARCHAR(255),
+        message TEXT,
+        is_read TINYINT NOT NULL DEFAULT 0,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (username) REFERENCES Users (username)
+            ON UPDATE CASCADE ON DELETE CASCADE
+    )
+    """,
+]
+
+# Children first so foreign keys never block the drop
+DROP_ORDER = [
+    'SchemaMigrations', 'TicketHolds', 'IdempotencyKeys', 'NotificationJobs', 'CityEventCounts',
+    'EventWishlistCounts', 'Notifications', 'WishList', 'Tickets', 'Events', 'Locations', 'Users',
+]
+
+
+def create_schema(conn, drop=False):
+    """Create the base tables; with `drop`, start from empty."""
+    cursor = conn.cursor()
+    if drop:
+        cursor.execute("DROP VIEW IF EXISTS ActiveEvents")
+        for table in DROP_ORDER:
+            cursor.execute(f"DROP TABLE IF EXISTS {table}")
+        cursor.execute("DROP PROCEDURE IF EXISTS GetPopularEvents")
+        cursor.execute("DROP PROCEDURE IF EXISTS GetTopCitiesEvents")
+    # The procedures come from migration 7, which datagen.generate() applies
+    for ddl in TABLES:
+        cursor.execute(ddl)
+    conn.commit()
+    cursor.close()
@@ -0,0 +1,135 @@
+import csv
+import io
+import json
+import random
+import time
+
+from mysql.connector.errors import DatabaseError
+
+from transactions import RETRYABLE_ERRORS
+
+MAX_REPORTED_ERRORS = 1000
+BATCH_RETRIES = 5
+RETRY_BASE_DELAY = 0.05
+RETRY_MAX_DELAY = 2.0
+
+
+def iter_rows(stream, content_type):
+    """Yield (line_number, dict) from an NDJSON or CSV body, one line at a time."""
+    text = io.TextIOWrapper(stream, encoding='utf-8', newline='')
+    if 'csv' in (content_type or ''):
+        reader = csv.DictReader(text)
+        for row in reader:
+            yield reader.line_num, row
+    else:
+        for line_number, line in enumerate(text, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as e:
+                yield line_number, e
+                continue
+            yield line_number, row
+
+
+def ingest(conn, rows, table, columns, batch_size, on_batch=None, after_commit=None):
+    """Insert `rows` into `table` in batches of `batch_size`, one transaction each.
+
+    A batch goes in as a single multi-row INSERT; if MySQL rejects it, the
+    batch is replayed row by row so every bad row is reported and the good
+    ones are kept. A deadlock or lock wait timeout rolls the batch back and
+    runs it again after a jittered backoff, up to BATCH_RETRIES times.
+    `on_batch(cursor, inserted_rows)` runs inside each transaction before it
+    commits, `after_commit(inserted_rows)` once it has. Returns a summary
+    dict with per-row errors and rows/sec.
+    """
+    insert_sql = (f"INSERT INTO {table} ({', '.join(columns)}) "
+                  f"VALUES ({', '.join(['%s'] * len(columns))})")
+    cursor = conn.cursor()
+    summary = {'inserted': 0, 'failed': 0, 'batches': 0, 'retries': 0, 'errors': []}
+
+    def fail(line_number, error):
+        summary['failed'] += 1
+        if len(summary['errors']) < MAX_REPORTED_ERRORS:
+            summary['errors'].append({'line': line_number, 'error': error})
+
+    def write(batch):
+        """One attempt at the batch; returns (inserted rows, row errors)."""
+        try:
+            conn.start_transaction()
+            cursor.executemany(insert_sql, [values for _, _, values in batch])
+            if on_batch:
+                on_batch(cursor, [row for _, row, _ in batch])
+            conn.commit()
+            return [row for _, row, _ in batch], []
+        except DatabaseError as e:
+            conn.rollback()
+            if e.errno in RETRYABLE_ERRORS:
+                raise
+        inserted, errors = [], []
+        conn.start_transaction()
+        for line_number, row, values in batch:
+            try:
+                cursor.execute("SAVEPOINT bulk_row")
+                cursor.execute(insert_sql, values)
+                inserted.append(row)
+            except DatabaseError as e:
+                # A deadlock has already rolled the whole transaction back,
+                # savepoint included: only a rerun of the batch can recover
+                if e.errno in RETRYABLE_ERRORS:
+                    raise
+                cursor.execute("ROLLBACK TO SAVEPOINT bulk_row")
+                errors.append((line_number, str(e)))
+        if on_batch and inserted:
+            on_batch(cursor, inserted)
+        conn.commit()
+        return inserted, errors
+
+    def flush(batch):
+        attempt = 0
+        while True:
+            try:
+                inserted, errors = write(batch)
+                break
+            except DatabaseError as e:
+                conn.rollback()
+                if e.errno not in RETRYABLE_ERRORS or attempt >= BATCH_RETRIES:
+                    raise
+                time.sleep(random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** attempt)))
+                attempt += 1
+                summary['retries'] += 1
+        # Reported only for the attempt that committed, so a rerun adds no duplicates
+        for line_number, error in errors:
+            fail(line_number, error)
+        summary['inserted'] += len(inserted)
+        summary['batches'] += 1
+        if after_commit and inserted:
+            after_commit(inserted)
+
+    started = time.monotonic()
+    batch = []
+    for line_number, row in rows:
+        if isinstance(row, Exception):
+            fail(line_number, f'Malformed row: {row}')
+            continue
+        if not isinstance(row, dict):
+            fail(line_number, 'Row must be an object')
+            continue
+        missing = [c for c in columns if row.get(c) is None]
+        if missing:
+            fail(line_number, f"Missing field(s): {', '.join(missing)}")
+            continue
+        batch.append((line_number, row, tuple(row[c] for c in columns)))
+        if len(batch) >= batch_size:
+            flush(batch)
+            batch = []
+    if batch:
+        flush(batch)
+    cursor.close()
+
+    elapsed = time.monotonic() - started
+    summary['elapsed_seconds'] = round(elapsed, 3)
+    summary['rows_per_sec'] = round(summary['inserted'] / elapsed, 1) if elapsed > 0 else None
+    return summary
@@ -0,0 +1,428 @@
+import sys
+import threading
+import time
+from array import array
+from datetime import datetime, timedelta
+
+from pagination import decode_cursor, encode_cursor
+
+# Events joined with Locations, with the change timestamps the incremental
+# refresh reads from (added by migration 4). Cancelled events are left out
+# through the ActiveEvents view (migration 5). The columns have distinct names
+# so that Events NATURAL JOIN Locations keeps joining on location_name only.
+CATALOG_SELECT = """
+    SELECT e.event_title, e.datetime_local, e.location_name, e.promoter_name, l.city,
+           GREATEST(e.event_changed_at, l.location_changed_at) AS changed_at
+    FROM ActiveEvents e
+    JOIN Locations l ON l.location_name = e.location_name
+"""
+CHANGED_SINCE = (CATALOG_SELECT + " WHERE e.event_changed_at >= %s UNION " +
+                 CATALOG_SELECT + " WHERE l.location_changed_at >= %s")
+
+EPOCH = datetime(1970, 1, 1)
+NO_DATE = float('-inf')  # NULL datetimes sort first, as in MySQL
+
+
+def _seconds(value):
+    return NO_DATE if value is None else (value - EPOCH).total_seconds()
+
+
+def _datetime(seconds):
+    return None if seconds == NO_DATE else EPOCH + timedelta(seconds=seconds)
+
+
+def _parse_cursor_datetime(value):
+    try:
+        return datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        raise ValueError('Invalid cursor')
+
+
+class EventCatalog:
+    """In-process copy of Events joined with Locations for the listing routes.
+
+    Rows live in column arrays indexed by row id: datetimes as seconds in an
+    array('d'), titles with a lowercase copy, and location, promoter and city
+    strings interned. Row ids are kept sorted by (datetime, lowercase title),
+    the order of the SQL listings, overall and per city, so date ranges and
+    keyset cursors are found by bisection.
+
+    refresh() reads only rows whose change timestamp moved since the last
+    refresh, re-reading `overlap` seconds back for transactions that
+    committed late. A row count that disagrees with Events, or
+    `full_reload_after` seconds passing, triggers a full reload instead,
+    which also catches deletes made by other processes. Full reloads only
+    run on the refresher thread, and build the new arrays before taking
+    the lock, so reads are not held up by them.
+    """
+
+    def __init__(self, get_connection, overlap=5.0, full_reload_after=600.0):
+        self.get_connection = get_connection
+        self.overlap = overlap
+        self.full_reload_after = full_reload_after
+        self._lock = threading.RLock()
+        self._refresh_lock = threading.Lock()
+        self._loaded = False
+        self._stale = False
+        self._refresher_busy = False
+        self._marks = 0  # mark_stale() calls, so a reload can tell if writes landed meanwhile
+        self._removed_during_reload = None  # [title keys] mark_stale() saw while a reload ran
+        self._reset()
+        self._stats = {
+            'full_reloads': 0, 'incremental_refreshes': 0, 'rows_applied': 0, 'refresh_errors': 0,
+            'last_refresh_seconds': 0.0, 'last_refresh_rows': 0, 'total_refresh_seconds': 0.0,
+        }
+
+    def _reset(self):
+        self._titles = []
+        self._title_keys = []  # lowercase titles, the secondary sort key
+        self._when = array('d')
+        self._locations = []
+        self._promoters = []
+        self._cities = []
+        self._row_ids = {}  # lowercase title -> row id
+        self._order = []  # live row ids by (datetime, lowercase title)
+        self._by_city = {}  # lowercase city -> row ids in the same order
+        self._strings = {}
+        self._watermark = None
+        self._loaded_at = 0.0
+
+    @property
+    def loaded(self):
+        return self._loaded
+
+    def mark_stale(self, removed_titles=()):
+        """Record a committed Events write; the next fresh() check refreshes.
+
+        Titles deleted or renamed away are dropped at once, since the change
+        timestamps cannot show that a row is gone.
+        """
+        with self._lock:
+            for title in removed_titles:
+                self._remove(title.lower())
+                if self._removed_during_reload is not None:
+                    self._removed_during_reload.append(title.lower())
+            self._marks += 1
+            self._stale = True
+
+    def fresh(self, refresh=True):
+        """True when the catalog can answer reads. A stale catalog is refreshed
+        first, unless `refresh` is False, in which case it reports False.
+        A refresh from here is only incremental: while it would need a full
+        reload, or the refresher is running one, this reports False too."""
+        if not self._loaded:
+            return False
+        if self._stale:
+            if not refresh or self._refresher_busy:
+                return False
+            try:
+                with self._refresh_lock:
+                    # Another request may have refreshed while this one waited
+                    if self._stale:
+                        self._refresh(allow_full=False)
+            except Exception as e:
+                print(f'Event catalog refresh failed: {e}')
+                return False
+        return not self._stale
+
+    # Loading
+
+    def _intern(self, value):
+        return self._strings.setdefault(value, value)
+
+    def _key(self, row_id):
+        return self._when[row_id], self._title_keys[row_id]
+
+    def _bisect(self, ids, key, right=True):
+        lo, hi = 0, len(ids)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            mid_key = self._key(ids[mid])
+            if mid_key < key or (right and mid_key == key):
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def _city_key(self, row_id):
+        return (self._cities[row_id] or '').lower()
+
+    def _remove(self, title_key):
+        row_id = self._row_ids.pop(title_key, None)
+        if row_id is None:
+            return
+        for ids in (self._order, self._by_city[self._city_key(row_id)]):
+            i = self._bisect(ids, self._key(row_id), right=False)
+            del ids[i]
+        if not self._by_city[self._city_key(row_id)]:
+            del self._by_city[self._city_key(row_id)]
+        # The row's slot in the column arrays stays unused until a full reload
+
+    def _append(self, title, when, location, promoter, city):
+        row_id = len(self._titles)
+        self._titles.append(title)
+        self._title_keys.append(title.lower())
+        self._when.append(_seconds(when))
+        self._locations.append(self._intern(location))
+        self._promoters.append(self._intern(promoter))
+        self._cities.append(self._intern(city))
+        self._row_ids[title.lower()] = row_id
+        return row_id
+
+    def _apply(self, row):
+        """Insert or update one row; returns True if anything changed."""
+        title, when, location, promoter, city = row[:5]
+        title_key = title.lower()
+        row_id = self._row_ids.get(title_key)
+        if row_id is not None:
+            if (self._titles[row_id], self._when[row_id], self._locations[row_id], self._promoters[row_id],
+                    self._cities[row_id]) == (title, _seconds(when), location, promoter, city):
+                return False
+            self._remove(title_key)
+        row_id = self._append(title, when, location, promoter, city)
+        key = self._key(row_id)
+        self._order.insert(self._bisect(self._order, key), row_id)
+        city_ids = self._by_city.setdefault(self._city_key(row_id), [])
+        city_ids.insert(self._bisect(city_ids, key), row_id)
+        return True
+
+    def _load_all(self, cursor):
+        with self._lock:
+            self._removed_during_reload = []
+            marks = self._marks
+        try:
+            cursor.execute(CATALOG_SELECT)
+            rows = cursor.fetchall()
+            # Built into a new set of arrays while reads use the current one.
+            # Rows are appended in sorted order, then indexed without per-row insertion.
+            new = EventCatalog.__new__(EventCatalog)
+            new._reset()
+            rows.sort(key=lambda r: (_seconds(r[1]), r[0].lower()))
+            for title, when, location, promoter, city, changed_at in rows:
+                if title.lower() in new._row_ids:
+                    continue
+                row_id = new._append(title, when, location, promoter, city)
+                new._order.append(row_id)
+                new._by_city.setdefault(new._city_key(row_id), []).append(row_id)
+                if changed_at is not None and (new._watermark is None or changed_at > new._watermark):
+                    new._watermark = changed_at
+            with self._lock:
+                for name in self._STATE:
+                    setattr(self, name, getattr(new, name))
+                # Deletes committed while the rows were read may still be in them
+                for title_key in self._removed_during_reload:
+                    self._remove(title_key)
+                self._loaded_at = time.monotonic()
+                self._loaded = True
+                # Writes marked while the rows were read get picked up incrementally
+                self._stale = self._marks != marks
+        finally:
+            with self._lock:
+                self._removed_during_reload = None
+        return len(rows), True
+
+    # The attributes _reset() sets, swapped in as a whole by _load_all()
+    _STATE = ('_titles', '_title_keys', '_when', '_locations', '_promoters', '_cities',
+              '_row_ids', '_order', '_by_city', '_strings', '_watermark')
+
+    def _load_changes(self, cursor, allow_full=True):
+        since = self._watermark - timedelta(seconds=self.overlap) if self._watermark else EPOCH
+        cursor.execute(CHANGED_SINCE, (since, since))
+        rows = cursor.fetchall()
+        cursor.execute("SELECT COUNT(*) FROM ActiveEvents")
+        (count,) = cursor.fetchone()
+        applied = 0
+        with self._lock:
+            for row in rows:
+                if self._apply(row):
+                    applied += 1
+                if row[5] is not None and (self._watermark is None or row[5] > self._watermark):
+                    self._watermark = row[5]
+            drifted = len(self._row_ids) != count
+            if not drifted:
+                self._stale = False
+        if drifted and allow_full:
+            return self._load_all(cursor)
+        # Still stale: the refresher's next pass reloads in full
+        return applied, False
+
+    def refresh(self):
+        """Bring the catalog up to date; returns (rows read or applied, full reload)."""
+        with self._refresh_lock:
+            return self._refresh()
+
+    def _refresh(self, allow_full=True):
+        started = time.perf_counter()
+        conn = None
+        try:
+            conn = self.get_connection()
+            cursor = conn.cursor()
+            full = not self._loaded or time.monotonic() - self._loaded_at > self.full_reload_after
+            # Requests skip refreshing while the refresher works, as it may reload in full
+            self._refresher_busy = allow_full
+            if full and allow_full:
+                rows, full = self._load_all(cursor)
+            else:
+                rows, full = self._load_changes(cursor, allow_full)
+            cursor.close()
+        except Exception:
+            with self._lock:
+                self._stats['refresh_errors'] += 1
+            raise
+        finally:
+            self._refresher_busy = False
+            if conn:
+                conn.close()
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            self._stats['full_reloads' if full else 'incremental_refreshes'] += 1
+            self._stats['rows_applied'] += rows
+            self._stats['last_refresh_rows'] = rows
+            self._stats['last_refresh_seconds'] = round(elapsed, 6)
+            self._stats['total_refresh_seconds'] += elapsed
+        return rows, full
+
+    def start_refresher(self, interval):
+        """Load now, then refresh every `interval` seconds in a daemon thread."""
+        def run():
+            while True:
+                try:
+                    rows, full = self.refresh()
+                    if full:
+                        print(f'Event catalog loaded {rows} event(s)')
+                except Exception as e:
+                    print(f'Event catalog refresh failed: {e}')
+                time.sleep(interval)
+
+        thread = threading.Thread(target=run, name='event-catalog', daemon=True)
+        thread.start()
+        return thread
+
+    # Queries; `cities` is a list of city names or None, dates are datetimes
+
+    def _row(self, row_id):
+        return {
+            'event_title': self._titles[row_id],
+            'datetime_local': _datetime(self._when[row_id]),
+            'location_name': self._locations[row_id],
+            'promoter_name': self._promoters[row_id],
+            'city': self._cities[row_id],
+        }
+
+    def _matches(self, row_id, city_keys, start, end):
+        if city_keys is not None and self._city_key(row_id) not in city_keys:
+            return False
+        when = self._when[row_id]
+        if start is not None and not (when != NO_DATE and when >= start):
+            return False
+        if end is not None and not (when != NO_DATE and when < end):
+            return False
+        return True
+
+    def _range(self, ids, start, end):
+        lo = self._bisect(ids, (start, ''), right=False) if start is not None else 0
+        hi = self._bisect(ids, (end, ''), right=False) if end is not None else len(ids)
+        return lo, hi
+
+    def page(self, cities=None, start_date=None, end_date=None, after=None, limit=150):
+        """One keyset page in (datetime_local, event_title) order; (rows, next_cursor)
+        like pagination.paginate() over EVENT_LISTING_SELECT."""
+        start = _seconds(start_date) if start_date else None
+        end = _seconds(end_date) if end_date else None
+        city_keys = {c.lower() for c in cities} if cities is not None else None
+        with self._lock:
+            if city_keys is not None and len(city_keys) == 1:
+                ids = self._by_city.get(next(iter(city_keys)), [])
+            else:
+                ids = self._order
+            lo, hi = self._range(ids, start, end)
+            if after:
+                when, title = decode_cursor(after, 2)
+                when = NO_DATE if when is None else _seconds(_parse_cursor_datetime(when))
+                position = self._bisect(ids, (when, str(title).lower()))
+                lo = max(lo, position)
+            rows = []
+            for i in range(lo, hi):
+                if city_keys is None or self._city_key(ids[i]) in city_keys:
+                    rows.append(ids[i])
+                    if len(rows) > limit:
+                        break
+            events = [self._row(row_id) for row_id in rows[:limit]]
+        next_cursor = None
+        if len(rows) > limit:
+            next_cursor = encode_cursor([events[-1]['datetime_local'], events[-1]['event_title']])
+        return events, next_cursor
+
+    def ranked_page(self, ranked_titles, cities=None, start_date=None, end_date=None, after=None, limit=150,
+                    truncated=False):
+        """Search matches in rank order that pass the filters, paged by position
+        like fetch_ranked_events(); `truncated` when more matches follow."""
+        pos = decode_cursor(after, 1)[0] if after else 0
+        if not isinstance(pos, int) or pos < 0:
+            raise ValueError('Invalid cursor')
+        start = _seconds(start_date) if start_date else None
+        end = _seconds(end_date) if end_date else None
+        city_keys = {c.lower() for c in cities} if cities is not None else None
+        events = []
+        with self._lock:
+            while pos < len(ranked_titles) and len(events) < limit:
+                row_id = self._row_ids.get(ranked_titles[pos].lower())
+                pos += 1
+                if row_id is not None and self._matches(row_id, city_keys, start, end):
+                    events.append(self._row(row_id))
+        next_cursor = encode_cursor([pos]) if pos < len(ranked_titles) or truncated else None
+        return events, next_cursor
+
+    def facet_rows(self, cities=None, start_date=None, end_date=None, titles=None):
+        """(city, month) counts in the row shape of facets.facet_query()."""
+        start = _seconds(start_date) if start_date else None
+        end = _seconds(end_date) if end_date else None
+        city_keys = {c.lower() for c in cities} if cities is not None else None
+        counts = {}
+        with self._lock:
+            if titles is not None:
+                candidates = {self._row_ids[t.lower()] for t in titles if t.lower() in self._row_ids}
+            else:
+                lo, hi = self._range(self._order, start, end)
+                candidates = self._order[lo:hi]
+            for row_id in candidates:
+                if not self._matches(row_id, city_keys, start, end):
+                    continue
+                when = _datetime(self._when[row_id])
+                key = (self._cities[row_id], when.year * 100 + when.month if when else None)
+                counts[key] = counts.get(key, 0) + 1
+        return [{'city': city, 'month': month, 'events': n} for (city, month), n in counts.items()]
+
+    def titles(self):
+        with self._lock:
+            return [self._titles[row_id] for row_id in self._row_ids.values()]
+
+    def top_cities(self, n):
+        """The `n` cities with the most events, like city_counts.top_cities()."""
+        with self._lock:
+            ranked = sorted(self._by_city.items(), key=lambda item: (-len(item[1]), item[0]))
+            return [self._cities[ids[0]] for _, ids in ranked[:n]]
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['total_refresh_seconds'] = round(stats['total_refresh_seconds'], 6)
+            stats['loaded'] = self._loaded
+            stats['events'] = len(self._row_ids)
+            stats['row_slots'] = len(self._titles)
+            stats['cities'] = len(self._by_city)
+            stats['interned_strings'] = len(self._strings)
+            stats['memory_bytes'] = self._memory_bytes()
+            stats['watermark'] = self._watermark.isoformat(sep=' ') if self._watermark else None
+        return stats
+
+    def _memory_bytes(self):
+        # Containers plus the strings they own; interned strings counted once
+        containers = (self._titles, self._title_keys, self._when, self._locations, self._promoters,
+                      self._cities, self._row_ids, self._order, self._by_city, self._strings)
+        total = sum(sys.getsizeof(c) for c in containers)
+        total += sum(sys.getsizeof(ids) for ids in self._by_city.values())
+        total += sum(sys.getsizeof(s) for s in self._titles)
+        total += sum(sys.getsizeof(s) for s in self._title_keys)
+        total += sum(sys.getsizeof(s) for s in self._strings if s is not None)
+        return total
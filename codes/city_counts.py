@@ -0,0 +1,104 @@
+import threading
+import time
+
+# CityEventCounts (migration 6): city -> number of events at its locations.
+# Event writes adjust it in their own transaction; reconcile() recounts the
+# cities whose counter drifted from Events.
+
+TOP_CITIES_SQL = """
+    SELECT city FROM CityEventCounts
+    WHERE event_count > 0
+    ORDER BY event_count DESC, city
+    LIMIT %s
+"""
+
+# Cities whose counter disagrees with Events, read without locks: the event
+# count minus the stored one, summed per city, is not zero
+DRIFTED_SQL = """
+    SELECT city FROM (
+        SELECT city, COUNT(*) AS n FROM ActiveEvents NATURAL JOIN Locations GROUP BY city
+        UNION ALL
+        SELECT city, -event_count FROM CityEventCounts
+    ) d
+    GROUP BY city
+    HAVING SUM(n) <> 0
+"""
+
+RECONCILE_BATCH = 100
+
+
+def adjust_city_count(cursor, location_name, delta):
+    """Add `delta` to the event count of the city `location_name` is in."""
+    cursor.execute("""
+        INSERT INTO CityEventCounts (city, event_count)
+        SELECT city, GREATEST(%s, 0) FROM Locations WHERE location_name = %s
+        ON DUPLICATE KEY UPDATE event_count = GREATEST(event_count + %s, 0)
+    """, (delta, location_name, delta))
+
+
+def top_cities(cursor, n):
+    """Return the `n` cities with the most events, busiest first."""
+    cursor.execute(TOP_CITIES_SQL, (n,))
+    return [row['city'] if isinstance(row, dict) else row[0] for row in cursor.fetchall()]
+
+
+def reconcile(conn, batch_size=RECONCILE_BATCH):
+    """Recount the cities whose counter drifted; returns how many were repaired.
+
+    Finding drift takes no locks. Each batch of drifted cities is then
+    recounted in a short transaction that only locks their events.
+    """
+    cursor = conn.cursor()
+    try:
+        cursor.execute(DRIFTED_SQL)
+        drifted = [row[0] for row in cursor.fetchall()]
+        conn.commit()
+        repaired = 0
+        for start in range(0, len(drifted), batch_size):
+            batch = drifted[start:start + batch_size]
+            in_batch = ", ".join(["%s"] * len(batch))
+            conn.start_transaction()
+            # Cities left without events keep a zero row, which top_cities() skips
+            cursor.execute(f"UPDATE CityEventCounts SET event_count = 0 WHERE city IN ({in_batch})", tuple(batch))
+            cursor.execute(f"""
+                INSERT INTO CityEventCounts (city, event_count)
+                SELECT city, COUNT(*) FROM ActiveEvents NATURAL JOIN Locations
+                WHERE city IN ({in_batch})
+                GROUP BY city
+                ON DUPLICATE KEY UPDATE event_count = VALUES(event_count)
+            """, tuple(batch))
+            conn.commit()
+            repaired += len(batch)
+        return repaired
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+
+def start_reconciler(get_connection, interval, on_repaired=None):
+    """Run reconcile() now and then every `interval` seconds in a daemon thread.
+
+    `on_repaired(count)` runs after a pass that repaired counters.
+    """
+    def run():
+        while True:
+            conn = None
+            try:
+                conn = get_connection()
+                repaired = reconcile(conn)
+                if repaired:
+                    print(f'CityEventCounts reconcile repaired {repaired} city count(s)')
+                    if on_repaired:
+                        on_repaired(repaired)
+            except Exception as e:
+                print(f'CityEventCounts reconcile failed: {e}')
+            finally:
+                if conn:
+                    conn.close()
+            time.sleep(interval)
+
+    thread = threading.Thread(target=run, name='city-counts-reconciler', daemon=True)
+    thread.start()
+    return thread
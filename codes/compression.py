@@ -0,0 +1,47 @@
+import gzip
+
+from flask import request
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_TYPES = ('application/json', 'application/x-ndjson', 'text/html', 'text/csv', 'text/plain')
+
+
+def compress_body(body, accept_encodings, gzip_level=6, brotli_quality=4):
+    """Return (encoding, compressed body), or (None, body) if the client takes neither."""
+    accepted = {value for value, quality in accept_encodings if quality > 0}
+    if brotli is not None and 'br' in accepted:
+        return 'br', brotli.compress(body, quality=brotli_quality)
+    if 'gzip' in accepted:
+        return 'gzip', gzip.compress(body, compresslevel=gzip_level)
+    return None, body
+
+
+def init_compression(app, min_size=1024, gzip_level=6, brotli_quality=4):
+    """Compress buffered responses of at least `min_size` bytes with br or gzip.
+
+    Streamed responses (exports, SSE) are left alone. A strong ETag is
+    downgraded to weak since the bytes now depend on the encoding.
+    """
+    @app.after_request
+    def compress(response):
+        if (response.status_code != 200 or response.is_streamed or response.direct_passthrough
+                or 'Content-Encoding' in response.headers
+                or response.mimetype not in COMPRESSIBLE_TYPES):
+            return response
+        response.vary.add('Accept-Encoding')
+        body = response.get_data()
+        if len(body) < min_size:
+            return response
+        encoding, body = compress_body(body, request.accept_encodings, gzip_level, brotli_quality)
+        if encoding is None:
+            return response
+        response.set_data(body)
+        response.headers['Content-Encoding'] = encoding
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(etag, weak=True)
+        return response
@@ -0,0 +1,155 @@
+import threading
+import time
+from collections import deque
+
+import mysql.connector
+from mysql.connector.errors import PoolError
+
+from query_trace import TracedCursor
+
+
+class PooledConnection:
+    """Wraps a MySQL connection so that close() hands it back to the pool."""
+
+    def __init__(self, pool, conn, created_at):
+        self._pool = pool
+        self._conn = conn
+        self._created_at = created_at
+        self._closed = False
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def cursor(self, *args, **kwargs):
+        cursor = self._conn.cursor(*args, **kwargs)
+        if self._pool.query_listeners:
+            return TracedCursor(cursor, self._pool.query_listeners)
+        return cursor
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._pool._release(self._conn, self._created_at)
+
+    def discard(self):
+        """Close the underlying connection instead of returning it, e.g. mid-result."""
+        if self._closed:
+            return
+        self._closed = True
+        self._pool._discard(self._conn, 'invalidated')
+
+
+class ConnectionPool:
+    """Fixed-size, thread-safe pool of MySQL connections.
+
+    Connections are opened lazily up to `size`. A borrower waits at most
+    `timeout` seconds for a free connection. Idle connections are pinged
+    before being handed out, and are recycled once they are older than
+    `max_lifetime` seconds. Cursors report to `query_listeners`, if any.
+    """
+
+    def __init__(self, db_config, size=8, timeout=10.0, max_lifetime=1800.0, validate_idle=30.0):
+        self.db_config = db_config
+        self.size = size
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self.validate_idle = validate_idle
+        self.query_listeners = []
+        self._idle = deque()  # (conn, created_at, released_at)
+        self._open = 0
+        self._cond = threading.Condition()
+        self._stats = {
+            'checkouts': 0,
+            'waits': 0,
+            'timeouts': 0,
+            'created': 0,
+            'recycled': 0,
+            'invalidated': 0,
+        }
+
+    def _connect(self):
+        conn = mysql.connector.connect(**self.db_config)
+        with self._cond:
+            self._stats['created'] += 1
+        return conn
+
+    def _discard(self, conn, stat):
+        try:
+            conn.close()
+        except Exception:
+            pass
+        with self._cond:
+            self._open -= 1
+            self._stats[stat] += 1
+            self._cond.notify()
+
+    def get_connection(self):
+        deadline = time.monotonic() + self.timeout
+        while True:
+            with self._cond:
+                waited = False
+                while not self._idle and self._open >= self.size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._stats['timeouts'] += 1
+                        raise PoolError(f'Timed out after {self.timeout}s waiting for a database connection')
+                    if not waited:
+                        self._stats['waits'] += 1
+                        waited = True
+                    self._cond.wait(remaining)
+                if self._idle:
+                    conn, created_at, released_at = self._idle.pop()
+                else:
+                    conn, created_at, released_at = None, None, None
+                    self._open += 1
+                self._stats['checkouts'] += 1
+
+            if conn is None:
+                try:
+                    conn = self._connect()
+                except Exception:
+                    with self._cond:
+                        self._open -= 1
+                        self._cond.notify()
+                    raise
+                return PooledConnection(self, conn, time.monotonic())
+
+            now = time.monotonic()
+            if now - created_at > self.max_lifetime:
+                self._discard(conn, 'recycled')
+                continue
+            if now - released_at > self.validate_idle:
+                try:
+                    conn.ping(reconnect=False)
+                except Exception:
+                    self._discard(conn, 'invalidated')
+                    continue
+            return PooledConnection(self, conn, created_at)
+
+    def _release(self, conn, created_at):
+        # Never hand out a connection that still carries an open transaction
+        # or a pending SET TRANSACTION ISOLATION LEVEL from the last borrower.
+        # COM_RESET_CONNECTION rolls back and clears both in one round trip.
+        try:
+            for _ in range(8):
+                if not conn.unread_result:
+                    break
+                conn.consume_results()
+            if not conn.cmd_reset_connection():
+                conn.rollback()
+        except Exception:
+            self._discard(conn, 'invalidated')
+            return
+        with self._cond:
+            self._idle.append((conn, created_at, time.monotonic()))
+            self._cond.notify()
+
+    def stats(self):
+        with self._cond:
+            stats = dict(self._stats)
+            stats['size'] = self.size
+            stats['open'] = self._open
+            stats['idle'] = len(self._idle)
+            stats['in_use'] = self._open - len(self._idle)
+        return stats
@@ -0,0 +1,166 @@
+import itertools
+import threading
+import time
+
+from mysql.connector.errors import Error as MySQLError, PoolError
+
+
+def replica_configs(hosts, base_config, user=None, password=None):
+    """Connection configs for a comma-separated `host[:port]` list.
+
+    Replicas share the primary's database name and, unless given, its
+    credentials.
+    """
+    configs = []
+    for entry in hosts.split(','):
+        entry = entry.strip()
+        if not entry:
+            continue
+        host, _, port = entry.partition(':')
+        config = dict(base_config, host=host)
+        if port:
+            config['port'] = int(port)
+        if user:
+            config['user'] = user
+        if password:
+            config['password'] = password
+        configs.append((entry, config))
+    return configs
+
+
+def replication_lag(conn):
+    """Seconds the server is behind its source, or None if it is not a replica.
+
+    Raises if it is a replica whose replication threads are stopped.
+    """
+    cursor = conn.cursor(dictionary=True)
+    try:
+        try:
+            cursor.execute("SHOW REPLICA STATUS")
+        except MySQLError:
+            # MySQL before 8.0.22
+            cursor.execute("SHOW SLAVE STATUS")
+        rows = cursor.fetchall()
+    finally:
+        cursor.close()
+    if not rows:
+        return None
+    row = rows[0]
+    lag = row.get('Seconds_Behind_Source', row.get('Seconds_Behind_Master'))
+    if lag is None:
+        raise RuntimeError('replication is not running')
+    return lag
+
+
+class ReplicaSet:
+    """Sends reads to healthy replica pools, round-robin, and to `primary` otherwise.
+
+    A replica that fails to connect, stops replicating or falls more than
+    `max_lag` seconds behind is skipped for `retry_after` seconds, or until
+    the health checker sees it recover.
+    """
+
+    def __init__(self, primary, replicas, retry_after=30.0, max_lag=10.0):
+        self.primary = primary
+        self.replicas = replicas  # [(name, ConnectionPool)]
+        self.retry_after = retry_after
+        self.max_lag = max_lag
+        self._down_until = {name: 0.0 for name, _ in replicas}
+        self._lag = {name: None for name, _ in replicas}
+        self._turn = itertools.count()
+        self._lock = threading.Lock()
+        self._stats = {'replica_reads': 0, 'primary_reads': 0, 'failovers': 0}
+
+    def mark_down(self, name, reason):
+        with self._lock:
+            was_up = self._down_until[name] <= time.monotonic()
+            self._down_until[name] = time.monotonic() + self.retry_after
+        if was_up:
+            print(f'Replica {name} taken out of rotation: {reason}')
+
+    def _mark_up(self, name):
+        with self._lock:
+            was_down = self._down_until[name] > time.monotonic()
+            self._down_until[name] = 0.0
+        if was_down:
+            print(f'Replica {name} back in rotation')
+
+    def count(self, stat):
+        with self._lock:
+            self._stats[stat] += 1
+
+    def rotation(self):
+        """Names of the replicas in rotation, in the order the next read tries them."""
+        now = time.monotonic()
+        with self._lock:
+            healthy = [name for name, _ in self.replicas if self._down_until[name] <= now]
+        if not healthy:
+            return []
+        start = next(self._turn) % len(healthy)
+        return healthy[start:] + healthy[:start]
+
+    def read_connection(self):
+        pools = dict(self.replicas)
+        for name in self.rotation():
+            try:
+                conn = pools[name].get_connection()
+            except PoolError:
+                # Busy, not broken
+                continue
+            except Exception as e:
+                self.mark_down(name, e)
+                continue
+            self.count('replica_reads')
+            return conn
+        if self.replicas:
+            self.count('failovers')
+        self.count('primary_reads')
+        return self.primary.get_connection()
+
+    def check(self):
+        """Probe every replica once, updating lag and rotation."""
+        for name, pool in self.replicas:
+            conn = None
+            try:
+                try:
+                    conn = pool.get_connection()
+                except PoolError:
+                    # Busy serving reads, so reachable; probe it next time
+                    continue
+                lag = replication_lag(conn)
+                with self._lock:
+                    self._lag[name] = lag
+                if lag is not None and lag > self.max_lag:
+                    self.mark_down(name, f'{lag}s behind the primary')
+                else:
+                    self._mark_up(name)
+            except Exception as e:
+                self.mark_down(name, e)
+            finally:
+                if conn:
+                    conn.close()
+
+    def start_health_checker(self, interval):
+        """Run check() every `interval` seconds in a daemon thread."""
+        def run():
+            while True:
+                self.check()
+                time.sleep(interval)
+
+        thread = threading.Thread(target=run, name='replica-health', daemon=True)
+        thread.start()
+        return thread
+
+    def stats(self):
+        now = time.monotonic()
+        with self._lock:
+            stats = dict(self._stats)
+            stats['replicas'] = {
+                name: {
+                    'healthy': self._down_until[name] <= now,
+                    'lag_seconds': self._lag[name],
+                    'pool': pool.stats(),
+                }
+                for name, pool in self.replicas
+            }
+        return stats
@@ -0,0 +1,61 @@
+import csv
+import io
+
+CHUNK_ROWS = 1000
+
+CONTENT_TYPES = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+
+def parse_projection(columns_arg, allowed):
+    """Validate ?columns=a,b against `allowed`; defaults to all of them."""
+    if not columns_arg:
+        return list(allowed)
+    columns = [c.strip() for c in columns_arg.split(',') if c.strip()]
+    unknown = [c for c in columns if c not in allowed]
+    if unknown or not columns:
+        raise ValueError(f"Unknown column(s): {', '.join(unknown) or columns_arg}; "
+                         f"choose from {', '.join(allowed)}")
+    return columns
+
+
+def stream_table(get_connection, table, columns, fmt, dumps):
+    """Yield `table` as NDJSON lines or CSV text, CHUNK_ROWS rows at a time.
+
+    The cursor is unbuffered, so rows are pulled from the server as they
+    are written out and memory stays flat whatever the table size. If the
+    client goes away mid-export the connection is dropped rather than
+    drained back into the pool. The connection is only borrowed once the
+    response body starts streaming.
+    """
+    conn = get_connection()
+    finished = False
+    try:
+        cursor = conn.cursor(buffered=False)
+        cursor.execute(f"SELECT {', '.join(columns)} FROM {table}")
+        if fmt == 'csv':
+            out = io.StringIO()
+            writer = csv.writer(out)
+            writer.writerow(columns)
+        while True:
+            rows = cursor.fetchmany(CHUNK_ROWS)
+            if not rows:
+                break
+            if fmt == 'csv':
+                writer.writerows(rows)
+                yield out.getvalue()
+                out.seek(0)
+                out.truncate()
+            else:
+                yield ''.join(dumps(dict(zip(columns, row))) + '\n' for row in rows)
+        if fmt == 'csv' and out.tell():
+            yield out.getvalue()
+        cursor.close()
+        finished = True
+    finally:
+        if finished:
+            conn.close()
+        else:
+            conn.discard()
@@ -0,0 +1,39 @@
+# Facet counts for the event listings. One GROUP BY (city, month) over the
+# current filters, minus the city filter: the city facet is read straight
+# off it, so the dropdown offers every city that has matches, while the
+# month facet and the total only count the rows of the selected city.
+FACETS_SELECT = "SELECT city, EXTRACT(YEAR_MONTH FROM datetime_local) AS month, COUNT(*) AS events "
+
+
+def facet_query(from_sql, conditions, params):
+    sql = FACETS_SELECT + from_sql
+    if conditions:
+        sql += ' WHERE ' + ' AND '.join(conditions)
+    return sql + ' GROUP BY city, month', tuple(params)
+
+
+def _month(value):
+    # 202501 -> '2025-01'
+    return f'{int(value) // 100:04d}-{int(value) % 100:02d}' if value else None
+
+
+def summarize(rows, city='all'):
+    """{'total', 'city': [{value, count}], 'month': [{value, count}]} from facet_query() rows."""
+    cities = {}
+    months = {}
+    total = 0
+    for row in rows:
+        count = int(row['events'])
+        cities[row['city']] = cities.get(row['city'], 0) + count
+        # Compared case-insensitively, like the city = %s filter
+        if city == 'all' or (row['city'] or '').lower() == city.lower():
+            month = _month(row['month'])
+            months[month] = months.get(month, 0) + count
+            total += count
+    return {
+        'total': total,
+        'city': [{'value': c, 'count': n}
+                 for c, n in sorted(cities.items(), key=lambda item: (-item[1], item[0] or ''))],
+        'month': [{'value': m, 'count': n}
+                  for m, n in sorted(months.items(), key=lambda item: (item[0] is None, item[0] or ''))],
+    }
@@ -0,0 +1,67 @@
+import decimal
+import functools
+from datetime import date, datetime, timezone
+
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+_DAYS = ('Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun')
+_MONTHS = ('Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec')
+
+
+@functools.lru_cache(maxsize=8192)
+def _http_date(value):
+    """werkzeug.http.http_date() in one format step; listing pages repeat the same dates."""
+    if isinstance(value, datetime):
+        if value.tzinfo is not None:
+            value = value.astimezone(timezone.utc)
+        clock = f'{value.hour:02d}:{value.minute:02d}:{value.second:02d}'
+    else:
+        clock = '00:00:00'
+    return f'{_DAYS[value.weekday()]}, {value.day:02d} {_MONTHS[value.month - 1]} {value.year:04d} {clock} GMT'
+
+
+def _default(o):
+    # Same representations as Flask's DefaultJSONProvider, so clients see
+    # identical JSON whichever provider is active
+    if isinstance(o, date):
+        return _http_date(o)
+    if isinstance(o, decimal.Decimal):
+        return str(o)
+    raise TypeError(f'Object of type {type(o).__name__} is not JSON serializable')
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    """JSON provider backed by orjson, with Flask-compatible output."""
+
+    def __init__(self, app):
+        super().__init__(app)
+        # Datetimes go through _default to keep Flask's HTTP-date format,
+        # which the pages show as is; orjson's native output would be
+        # ISO 8601. The trade-off is deliberate: _http_date() is one cached
+        # format step, not werkzeug's parse-and-convert per value.
+        self.option = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+        if self.sort_keys:
+            self.option |= orjson.OPT_SORT_KEYS
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=_default, option=self.option).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        body = orjson.dumps(obj, default=_default, option=self.option) + b'\n'
+        return self._app.response_class(body, mimetype=self.mimetype)
+
+
+def init_json(app):
+    """Install the orjson provider when orjson is available."""
+    if orjson is not None:
+        app.json = OrjsonProvider(app)
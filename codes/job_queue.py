@@ -0,0 +1,166 @@
+import threading
+
+# Durable queue for event cancellations (NotificationJobs, created by
+# migration 5). A job carries the event and its message; the worker reads
+# the recipients from the event's WishList rows in bounded batches,
+# recording its progress in the job row in the same transaction, and
+# deletes the event once everyone is notified.
+
+
+def enqueue_cancellation(cursor, event_title):
+    """Queue the removal of an event, with "event cancelled" notices for its wishlisters.
+
+    Runs in the transaction that hides the event (sets event_cancelled_at)
+    and only writes the job row. No notice is sent when the city has no
+    other events. Returns the job id.
+    """
+    cursor.execute("""
+        INSERT INTO NotificationJobs (event_title, message)
+        SELECT
+            e.event_title,
+            IF(c.event_count > 1,
+               CONCAT('The event "', e.event_title,
+                   ' at ', l.location_name, ' (', l.city, ', ', l.state, ') ',
+                   'has been cancelled. ',
+                   'There are ', c.event_count - 1, ' other events happening in ', l.city, '. ',
+                   'Check them out!'),
+               NULL)
+        FROM Events e
+        JOIN Locations l ON e.location_name = l.location_name
+        LEFT JOIN CityEventCounts c ON l.city = c.city
+        WHERE e.event_title = %s
+    """, (event_title,))
+    return cursor.lastrowid if cursor.rowcount else None
+
+
+def queue_stats(cursor):
+    """Pending jobs, undelivered recipients and the age of the oldest pending job."""
+    cursor.execute("""
+        SELECT COUNT(*), COALESCE(TIMESTAMPDIFF(SECOND, MIN(created_at), NOW()), 0)
+        FROM NotificationJobs WHERE done_at IS NULL
+    """)
+    pending_jobs, lag_seconds = cursor.fetchone()
+    cursor.execute("""
+        SELECT COUNT(*)
+        FROM NotificationJobs j
+        JOIN WishList w ON w.event_title = j.event_title
+        WHERE j.done_at IS NULL AND j.message IS NOT NULL AND w.username > COALESCE(j.last_username, '')
+    """)
+    pending_recipients = cursor.fetchone()[0]
+    return {
+        'pending_jobs': pending_jobs,
+        'pending_recipients': pending_recipients,
+        'lag_seconds': lag_seconds,
+    }
+
+
+class NotificationWorker:
+    """Drains NotificationJobs from a daemon thread.
+
+    Several workers (threads or processes) can share the queue: jobs are
+    claimed with SKIP LOCKED. `on_delivered(usernames)` runs after each
+    committed batch.
+    """
+
+    def __init__(self, get_connection, batch_size=500, interval=5.0, on_delivered=None):
+        self.get_connection = get_connection
+        self.batch_size = batch_size
+        self.interval = interval
+        self.on_delivered = on_delivered
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+        self._stats = {'batches': 0, 'delivered': 0, 'jobs_completed': 0, 'errors': 0}
+
+    def wake(self):
+        self._wake.set()
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats)
+
+    def _count(self, stat, n=1):
+        with self._lock:
+            self._stats[stat] += n
+
+    def run_batch(self, conn):
+        """Deliver one batch of the oldest pending job, or once all are delivered
+        remove a batch of its WishList rows; returns False when idle."""
+        cursor = conn.cursor()
+        try:
+            conn.start_transaction()
+            cursor.execute("""
+                SELECT job_id, event_title, message, last_username FROM NotificationJobs
+                WHERE done_at IS NULL
+                ORDER BY job_id
+                LIMIT 1
+                FOR UPDATE SKIP LOCKED
+            """)
+            job = cursor.fetchone()
+            if job is None:
+                conn.commit()
+                return False
+            job_id, event_title, message, last_username = job
+            usernames = []
+            if message is not None:
+                cursor.execute("""
+                    SELECT username FROM WishList
+                    WHERE event_title = %s AND username > %s
+                    ORDER BY username
+                    LIMIT %s
+                """, (event_title, last_username or '', self.batch_size))
+                usernames = [row[0] for row in cursor.fetchall()]
+            done = False
+            if usernames:
+                cursor.executemany(
+                    "INSERT INTO Notifications (username, event_title, message) VALUES (%s, %s, %s)",
+                    [(username, event_title, message) for username in usernames])
+                cursor.execute("""
+                    UPDATE NotificationJobs SET last_username = %s, delivered = delivered + %s
+                    WHERE job_id = %s
+                """, (usernames[-1], len(usernames), job_id))
+            else:
+                # Everyone is notified: drop the WishList rows a batch at a
+                # time, so the final delete has nothing large to cascade to
+                cursor.execute("DELETE FROM WishList WHERE event_title = %s LIMIT %s",
+                               (event_title, self.batch_size))
+                if cursor.rowcount < self.batch_size:
+                    cursor.execute("DELETE FROM Events WHERE event_title = %s AND event_cancelled_at IS NOT NULL",
+                                   (event_title,))
+                    cursor.execute("UPDATE NotificationJobs SET done_at = NOW() WHERE job_id = %s", (job_id,))
+                    done = True
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cursor.close()
+
+        if usernames:
+            self._count('batches')
+            self._count('delivered', len(usernames))
+            if self.on_delivered:
+                self.on_delivered(usernames)
+        elif done:
+            self._count('jobs_completed')
+        return True
+
+    def start(self):
+        def run():
+            while True:
+                self._wake.clear()
+                conn = None
+                try:
+                    conn = self.get_connection()
+                    while self.run_batch(conn):
+                        pass
+                except Exception as e:
+                    self._count('errors')
+                    print(f'Notification worker failed: {e}')
+                finally:
+                    if conn:
+                        conn.close()
+                self._wake.wait(self.interval)
+
+        thread = threading.Thread(target=run, name='notification-worker', daemon=True)
+        thread.start()
+        return thread
@@ -0,0 +1,127 @@
+import bisect
+import threading
+
+from query_trace import QueryListener, fingerprint
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+ROW_BUCKETS = (0, 1, 5, 10, 50, 100, 500, 1000, 5000, 10000)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=''):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class Counter:
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} counter']
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(f'{self.name}{_labels(self.labelnames, labels)} {value}')
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}  # labels -> [bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 2)
+            series[i] += 1
+            series[-1] += value
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            series = {labels: list(values) for labels, values in self._series.items()}
+        for labels, values in sorted(series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), values):
+                cumulative += count
+                le = f'le="{bound}"'
+                lines.append(f'{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}')
+            lines.append(f'{self.name}_sum{_labels(self.labelnames, labels)} {values[-1]}')
+            lines.append(f'{self.name}_count{_labels(self.labelnames, labels)} {cumulative}')
+        return lines
+
+
+class Registry:
+    """Holds metrics plus gauge callbacks and renders Prometheus text format."""
+
+    def __init__(self):
+        self._metrics = []
+        self._gauges = []  # (name, help, callback returning {labels tuple: value})
+
+    def counter(self, *args, **kwargs):
+        metric = Counter(*args, **kwargs)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, *args, **kwargs):
+        metric = Histogram(*args, **kwargs)
+        self._metrics.append(metric)
+        return metric
+
+    def gauge(self, name, help, labelnames, callback):
+        self._gauges.append((name, help, tuple(labelnames), callback))
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines += metric.render()
+        for name, help, labelnames, callback in self._gauges:
+            lines += [f'# HELP {name} {help}', f'# TYPE {name} gauge']
+            try:
+                values = callback()
+            except Exception as e:
+                print(f'Metrics gauge {name} failed: {e}')
+                continue
+            for labels, value in sorted(values.items()):
+                lines.append(f'{name}{_labels(labelnames, labels)} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+class QueryMetrics(QueryListener):
+    """Query duration, rows returned and MySQL error codes, by statement fingerprint."""
+
+    def __init__(self, registry):
+        self.duration = registry.histogram(
+            'db_query_duration_seconds', 'Time spent in cursor.execute.', ['statement'])
+        self.rows = registry.histogram(
+            'db_query_rows', 'Rows fetched per fetch call.', ['statement'], buckets=ROW_BUCKETS)
+        self.errors = registry.counter(
+            'db_errors_total', 'Statements that raised, by MySQL error code.', ['code'])
+
+    def on_execute(self, sql, params, duration, error):
+        self.duration.observe(duration, fingerprint(sql))
+        if error is not None:
+            self.errors.inc(getattr(error, 'errno', None) or 'unknown')
+
+    def on_rows(self, sql, count):
+        self.rows.observe(count, fingerprint(sql))
@@ -0,0 +1,426 @@
+import os
+import sys
+import threading
+
+# Versioned schema changes, applied in order and recorded in
+# SchemaMigrations. Each index is created only when no existing index
+# already starts with its columns, so a migration can be re-run safely
+# against a database whose indexes were added by hand.
+CREATE_TABLE = """
+    CREATE TABLE IF NOT EXISTS SchemaMigrations (
+        version INT NOT NULL PRIMARY KEY,
+        name VARCHAR(255) NOT NULL,
+        applied_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP
+    )
+"""
+
+# (version, name, [(table, index name, columns)])
+MIGRATIONS = [
+    (1, 'ticket and wishlist lookups', [
+        # /tickets/<title> and the number_of_tickets subquery
+        ('Tickets', 'idx_tickets_event_quantity', ['event_title', 'quantity']),
+        # /wishlist for one user; wishlist counts and cancellation recipients per event
+        ('WishList', 'idx_wishlist_user_event', ['username', 'event_title']),
+        ('WishList', 'idx_wishlist_event_user', ['event_title', 'username']),
+    ]),
+    (2, 'unread notifications', [
+        ('Notifications', 'idx_notifications_user_unread', ['username', 'is_read', 'notification_id']),
+    ]),
+    (3, 'event listing filters', [
+        # Keyset order of the listings (EVENT_ORDER in app.py)
+        ('Events', 'idx_events_datetime_title', ['datetime_local', 'event_title']),
+        # Events NATURAL JOIN Locations, driven from a city filter
+        ('Events', 'idx_events_location_datetime', ['location_name', 'datetime_local']),
+        ('Locations', 'idx_locations_city', ['city', 'location_name']),
+    ]),
+    (4, 'change timestamps for the event catalog', [
+        # Incremental refresh of catalog.EventCatalog
+        ('Events', 'idx_events_changed_at', ['event_changed_at']),
+        ('Locations', 'idx_locations_changed_at', ['location_changed_at']),
+    ]),
+    (5, 'event cancellation queue', []),
+    (6, 'tables the app maintains', []),
+    (7, 'procedures skip cancelled events', []),
+    (8, 'popular events by wishlist counter', []),
+]
+
+# Tables a migration creates before anything else: {version: [CREATE TABLE IF NOT EXISTS ...]}
+MIGRATION_TABLES = {
+    # job_queue.NotificationWorker: one row per cancelled event, whose
+    # wishlisters it notifies in batches before deleting the event
+    5: ["""
+        CREATE TABLE IF NOT EXISTS NotificationJobs (
+            job_id BIGINT AUTO_INCREMENT PRIMARY KEY,
+            event_title VARCHAR(255) NOT NULL,
+            message TEXT NULL,
+            last_username VARCHAR(255) NULL,
+            delivered INT NOT NULL DEFAULT 0,
+            created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            done_at DATETIME NULL,
+            INDEX idx_jobs_pending (done_at, job_id)
+        )
+    """],
+    6: [
+        # wishlist_counts: event_title -> number of users with it wishlisted
+        """
+        CREATE TABLE IF NOT EXISTS EventWishlistCounts (
+            event_title VARCHAR(255) NOT NULL PRIMARY KEY,
+            wishlist_count INT NOT NULL DEFAULT 0,
+            INDEX idx_wishlist_count (wishlist_count, event_title),
+            FOREIGN KEY (event_title) REFERENCES Events (event_title)
+                ON UPDATE CASCADE ON DELETE CASCADE
+        )
+        """,
+        # city_counts: city -> number of events at its locations
+        """
+        CREATE TABLE IF NOT EXISTS CityEventCounts (
+            city VARCHAR(255) NOT NULL PRIMARY KEY,
+            event_count INT NOT NULL DEFAULT 0,
+            INDEX idx_city_event_count (event_count, city)
+        )
+        """,
+        # transactions: stored responses of writes by Idempotency-Key
+        """
+        CREATE TABLE IF NOT EXISTS IdempotencyKeys (
+            idempotency_key VARCHAR(255) NOT NULL PRIMARY KEY,
+            request_hash CHAR(64) NOT NULL,
+            status_code SMALLINT NOT NULL,
+            response_body MEDIUMTEXT NOT NULL,
+            created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            INDEX idx_idempotency_created (created_at)
+        )
+        """,
+        # ticket_holds: seats held for a buyer until they confirm, release or expire
+        """
+        CREATE TABLE IF NOT EXISTS TicketHolds (
+            hold_id BIGINT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+            ticket_id BIGINT NOT NULL,
+            username VARCHAR(255) NOT NULL,
+            quantity INT NOT NULL,
+            status ENUM('held', 'purchased', 'released', 'expired') NOT NULL DEFAULT 'held',
+            created_at DATETIME(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6),
+            expires_at DATETIME(6) NOT NULL,
+            INDEX idx_holds_expiry (status, expires_at),
+            INDEX idx_holds_ticket (ticket_id, status)
+        )
+        """,
+    ],
+}
+
+# Columns a migration adds before creating its indexes:
+# {version: [(table, column, definition)]}. Names differ per table so that
+# Events NATURAL JOIN Locations still joins on location_name alone.
+MIGRATION_COLUMNS = {
+    4: [
+        ('Events', 'event_changed_at',
+         'TIMESTAMP(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6) ON UPDATE CURRENT_TIMESTAMP(6)'),
+        ('Locations', 'location_changed_at',
+         'TIMESTAMP(6) NOT NULL DEFAULT CURRENT_TIMESTAMP(6) ON UPDATE CURRENT_TIMESTAMP(6)'),
+    ],
+    # Set when an event is deleted; the row stays until its cancellation
+    # notices are out, since deleting it cascades to its WishList rows
+    5: [('Events', 'event_cancelled_at', 'DATETIME(6) NULL')],
+}
+
+# Statements run after a migration's columns and indexes, e.g. views and
+# backfills; each must be safe to run again: {version: [sql]}
+MIGRATION_STATEMENTS = {
+    # Events still on offer; the routes read this instead of Events
+    5: ["CREATE OR REPLACE VIEW ActiveEvents AS SELECT * FROM Events WHERE event_cancelled_at IS NULL"],
+    # Fill the counters; the reconcilers only repair drift from here on
+    6: [
+        """
+        INSERT INTO EventWishlistCounts (event_title, wishlist_count)
+        SELECT e.event_title, COUNT(w.username)
+        FROM Events e
+        LEFT JOIN WishList w ON w.event_title = e.event_title
+        GROUP BY e.event_title
+        ON DUPLICATE KEY UPDATE wishlist_count = VALUES(wishlist_count)
+        """,
+        """
+        INSERT INTO CityEventCounts (city, event_count)
+        SELECT city, COUNT(*) FROM ActiveEvents NATURAL JOIN Locations GROUP BY city
+        ON DUPLICATE KEY UPDATE event_count = VALUES(event_count)
+        """,
+    ],
+    # The popular and top-cities tabs, read through ActiveEvents like the routes
+    7: [
+        "DROP PROCEDURE IF EXISTS GetPopularEvents",
+        """
+        CREATE PROCEDURE GetPopularEvents(IN n INT)
+        BEGIN
+            SELECT e.event_title, e.datetime_local, e.location_name, e.promoter_name, l.city,
+                   COUNT(w.username) AS wishlist_count,
+                   (SELECT SUM(t.quantity) FROM Tickets t
+                    WHERE t.event_title = e.event_title) AS number_of_tickets
+            FROM ActiveEvents e
+            JOIN Locations l ON e.location_name = l.location_name
+            JOIN WishList w ON w.event_title = e.event_title
+            GROUP BY e.event_title, e.datetime_local, e.location_name, e.promoter_name, l.city
+            ORDER BY wishlist_count DESC, e.event_title
+            LIMIT n;
+        END
+        """,
+        "DROP PROCEDURE IF EXISTS GetTopCitiesEvents",
+        """
+        CREATE PROCEDURE GetTopCitiesEvents(IN n INT)
+        BEGIN
+            SELECT e.event_title, e.datetime_local, e.location_name, e.promoter_name, l.city
+            FROM ActiveEvents e
+            JOIN Locations l ON e.location_name = l.location_name
+            JOIN (
+                SELECT l2.city
+                FROM ActiveEvents e2
+                JOIN Locations l2 ON e2.location_name = l2.location_name
+                GROUP BY l2.city
+                ORDER BY COUNT(*) DESC, l2.city
+                LIMIT 5
+            ) top ON top.city = l.city
+            ORDER BY e.datetime_local, e.event_title
+            LIMIT n;
+        END
+        """,
+    ],
+    # Rank by EventWishlistCounts (migration 6) instead of counting WishList
+    8: [
+        "DROP PROCEDURE IF EXISTS GetPopularEvents",
+        """
+        CREATE PROCEDURE GetPopularEvents(IN n INT)
+        BEGIN
+            SELECT e.event_title, e.datetime_local, e.location_name, e.promoter_name, l.city,
+                   w.wishlist_count,
+                   (SELECT SUM(t.quantity) FROM Tickets t
+                    WHERE t.event_title = e.event_title) AS number_of_tickets
+            FROM EventWishlistCounts w
+            JOIN ActiveEvents e ON e.event_title = w.event_title
+            JOIN Locations l ON e.location_name = l.location_name
+            WHERE w.wishlist_count > 0
+            ORDER BY w.wishlist_count DESC, w.event_title
+            LIMIT n;
+        END
+        """,
+    ],
+}
+
+# Hot statements from app.py with sample parameters, for explain_checks()
+HOT_QUERIES = [
+    ('tickets for event',
+     "SELECT DISTINCT t.section, t.row_num, t.quantity, t.total_price FROM Tickets t WHERE t.event_title = %s",
+     ('x',)),
+    ('tickets per event',
+     "SELECT SUM(t.quantity) FROM Tickets t WHERE t.event_title = %s",
+     ('x',)),
+    ('wishlist for user',
+     "SELECT W.event_title, E.datetime_local, E.location_name, E.promoter_name "
+     "FROM WishList W JOIN Events E ON W.event_title = E.event_title WHERE W.username = %s",
+     ('x',)),
+    ('wishlisters of event',
+     "SELECT username FROM WishList WHERE event_title = %s",
+     ('x',)),
+    ('unread notifications',
+     "SELECT notification_id, message FROM Notifications WHERE username = %s AND is_read = 0 "
+     "ORDER BY notification_id",
+     ('x',)),
+    ('events listing page',
+     "SELECT event_title, datetime_local, location_name, promoter_name, city FROM Events NATURAL JOIN Locations "
+     "WHERE (datetime_local > %s OR (datetime_local = %s AND event_title > %s)) "
+     "ORDER BY datetime_local, event_title LIMIT 151",
+     ('2025-01-01 00:00:00', '2025-01-01 00:00:00', 'x')),
+    ('events in city',
+     "SELECT event_title, datetime_local, location_name, promoter_name, city FROM Events NATURAL JOIN Locations "
+     "WHERE city = %s ORDER BY datetime_local, event_title LIMIT 151",
+     ('x',)),
+    ('events in date range',
+     "SELECT event_title, datetime_local, location_name, promoter_name, city FROM Events NATURAL JOIN Locations "
+     "WHERE datetime_local >= %s AND datetime_local < %s ORDER BY datetime_local, event_title LIMIT 151",
+     ('2025-01-01', '2025-02-01')),
+]
+
+
+def _existing_indexes(cursor, table):
+    """Column lists of every index on `table` in the current database."""
+    cursor.execute("""
+        SELECT INDEX_NAME, COLUMN_NAME FROM information_schema.STATISTICS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s
+        ORDER BY INDEX_NAME, SEQ_IN_INDEX
+    """, (table,))
+    indexes = {}
+    for name, column in cursor.fetchall():
+        indexes.setdefault(name, []).append(column.lower())
+    return list(indexes.values())
+
+
+def _has_column(cursor, table, column):
+    cursor.execute("""
+        SELECT COUNT(*) FROM information_schema.COLUMNS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND COLUMN_NAME = %s
+    """, (table, column))
+    return cursor.fetchone()[0] > 0
+
+
+def _covered(existing, columns):
+    wanted = [c.lower() for c in columns]
+    return any(index[:len(wanted)] == wanted for index in existing)
+
+
+def missing_indexes(cursor):
+    """Indexes from MIGRATIONS that no existing index covers: [(table, name, columns)]."""
+    missing = []
+    cache = {}
+    for _, _, indexes in MIGRATIONS:
+        for table, name, columns in indexes:
+            if table not in cache:
+                cache[table] = _existing_indexes(cursor, table)
+            if not _covered(cache[table], columns):
+                missing.append((table, name, columns))
+    return missing
+
+
+def pending_migrations(cursor):
+    """Versions in MIGRATIONS not yet recorded in SchemaMigrations."""
+    cursor.execute("""
+        SELECT COUNT(*) FROM information_schema.TABLES
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'SchemaMigrations'
+    """)
+    done = set()
+    if cursor.fetchone()[0]:
+        cursor.execute("SELECT version FROM SchemaMigrations")
+        done = {row[0] for row in cursor.fetchall()}
+    return [version for version, _, _ in MIGRATIONS if version not in done]
+
+
+def migrate(conn):
+    """Apply pending migrations in order; returns the versions applied."""
+    cursor = conn.cursor()
+    cursor.execute("SELECT GET_LOCK('schema_migrations', 60)")
+    if cursor.fetchone()[0] != 1:
+        raise RuntimeError('Another process is running migrations')
+    try:
+        cursor.execute(CREATE_TABLE)
+        cursor.execute("SELECT version FROM SchemaMigrations")
+        done = {row[0] for row in cursor.fetchall()}
+        applied = []
+        for version, name, indexes in MIGRATIONS:
+            if version in done:
+                continue
+            for ddl in MIGRATION_TABLES.get(version, []):
+                cursor.execute(ddl)
+            for table, column, definition in MIGRATION_COLUMNS.get(version, []):
+                if not _has_column(cursor, table, column):
+                    print(f'Migration {version}: adding {column} to {table}')
+                    cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+            for table, index_name, columns in indexes:
+                if not _covered(_existing_indexes(cursor, table), columns):
+                    print(f'Migration {version}: creating {index_name} on {table}')
+                    cursor.execute(f"CREATE INDEX {index_name} ON {table} ({', '.join(columns)})")
+            for statement in MIGRATION_STATEMENTS.get(version, []):
+                cursor.execute(statement)
+            cursor.execute("INSERT INTO SchemaMigrations (version, name) VALUES (%s, %s)", (version, name))
+            conn.commit()
+            applied.append(version)
+        return applied
+    finally:
+        cursor.execute("SELECT RELEASE_LOCK('schema_migrations')")
+        cursor.fetchall()
+        cursor.close()
+
+
+def explain_checks(cursor, min_rows=1000):
+    """EXPLAIN each of HOT_QUERIES; returns [(query name, table, rows)] for full scans.
+
+    Full scans of tables the optimizer estimates at fewer than `min_rows`
+    rows are ignored, since MySQL prefers them on small test data.
+    """
+    scans = []
+    for name, sql, params in HOT_QUERIES:
+        cursor.execute("EXPLAIN " + sql, params)
+        columns = [d[0] for d in cursor.description]
+        for row in cursor.fetchall():
+            plan = dict(zip(columns, row))
+            table = plan.get('table') or ''
+            if plan.get('type') == 'ALL' and not table.startswith('<') and (plan.get('rows') or 0) >= min_rows:
+                scans.append((name, table, plan.get('rows')))
+    return scans
+
+
+def require_schema(get_connection, run_migrations=True):
+    """Optionally migrate, then raise RuntimeError if any migration is still pending.
+
+    The routes read tables and views that migrations create, so an app on
+    an older schema would answer every request with an error.
+    """
+    conn = get_connection()
+    try:
+        if run_migrations:
+            applied = migrate(conn)
+            if applied:
+                print(f'Applied schema migrations {applied}')
+        cursor = conn.cursor()
+        pending = pending_migrations(cursor)
+        cursor.close()
+    finally:
+        conn.close()
+    if pending:
+        raise RuntimeError(f'Schema migrations {pending} are not applied; '
+                           f'run `python migrations.py migrate` before serving')
+
+
+def start_index_check(get_connection):
+    """Warn about missing indexes from a daemon thread."""
+    def run():
+        conn = None
+        try:
+            conn = get_connection()
+            cursor = conn.cursor()
+            for table, name, columns in missing_indexes(cursor):
+                print(f"WARNING: {table} has no index on ({', '.join(columns)}); "
+                      f"run `python migrations.py migrate` to create {name}")
+            cursor.close()
+        except Exception as e:
+            print(f'Index check failed: {e}')
+        finally:
+            if conn:
+                conn.close()
+
+    thread = threading.Thread(target=run, name='index-check', daemon=True)
+    thread.start()
+    return thread
+
+
+def main(argv):
+    """python migrations.py [migrate|check|explain]; exits 1 when a check fails."""
+    import mysql.connector
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    command = argv[1] if len(argv) > 1 else 'check'
+    conn = mysql.connector.connect(
+        host=os.getenv('GCP_DB_HOST'),
+        user=os.getenv('GCP_DB_USER'),
+        password=os.getenv('GCP_DB_PASSWORD'),
+        database=os.getenv('GCP_DB_NAME'),
+    )
+    try:
+        cursor = conn.cursor()
+        if command == 'migrate':
+            print(f'Applied: {migrate(conn) or "nothing, schema is up to date"}')
+            return 0
+        if command == 'check':
+            missing = missing_indexes(cursor)
+            for table, name, columns in missing:
+                print(f"missing: {name} on {table} ({', '.join(columns)})")
+            return 1 if missing else 0
+        if command == 'explain':
+            min_rows = int(os.getenv('EXPLAIN_MIN_ROWS', '1000'))
+            scans = explain_checks(cursor, min_rows)
+            for name, table, rows in scans:
+                print(f'full scan: {name} reads {table} (~{rows} rows)')
+            return 1 if scans else 0
+        print(main.__doc__)
+        return 2
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
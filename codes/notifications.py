@@ -0,0 +1,211 @@
+import asyncio
+import threading
+import time
+from collections import defaultdict
+
+
+def claim_query(username, limit=None):
+    """(sql, params) locking the user's unread notifications, oldest first."""
+    sql = """
+        SELECT notification_id, message FROM Notifications
+        WHERE username = %s AND is_read = 0
+        ORDER BY notification_id
+    """
+    params = [username]
+    if limit:
+        sql += " LIMIT %s"
+        params.append(limit)
+    return sql + " FOR UPDATE SKIP LOCKED", tuple(params)
+
+
+def mark_read_query(notifications):
+    """(sql, params) marking exactly the claimed `notifications` read."""
+    ids = [n['notification_id'] for n in notifications]
+    return ("UPDATE Notifications SET is_read = 1 WHERE notification_id IN ("
+            + ", ".join(["%s"] * len(ids)) + ")", tuple(ids))
+
+
+def claim_notifications(conn, username, limit=None):
+    """Return the user's unread notifications and mark exactly those as read.
+
+    Rows are locked with SKIP LOCKED so two concurrent claimers (two open
+    tabs) never return the same notification, and the UPDATE only touches
+    the IDs that were read, so a row inserted meanwhile stays unread.
+    """
+    cursor = conn.cursor(dictionary=True)
+    try:
+        conn.start_transaction()
+        cursor.execute(*claim_query(username, limit))
+        notifications = cursor.fetchall()
+        if notifications:
+            cursor.execute(*mark_read_query(notifications))
+        conn.commit()
+        return notifications
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+
+class StreamSlots:
+    """Counts the notification streams and long-polls holding a worker thread.
+
+    acquire() fails once `limit` are open, so waiting clients can never
+    take every thread; a limit of None means no cap.
+    """
+
+    def __init__(self, limit=None):
+        self.limit = limit
+        self._lock = threading.Lock()
+        self._active = 0
+        self._rejected = 0
+
+    def acquire(self):
+        with self._lock:
+            if self.limit is not None and self._active >= self.limit:
+                self._rejected += 1
+                return False
+            self._active += 1
+            return True
+
+    def release(self):
+        with self._lock:
+            self._active -= 1
+
+    def available(self):
+        with self._lock:
+            return self.limit is None or self._active < self.limit
+
+    def stats(self):
+        with self._lock:
+            return {'active': self._active, 'limit': self.limit, 'rejected': self._rejected}
+
+
+class NotificationHub:
+    """Wakes up the streams and long-polls waiting on a user's notifications.
+
+    Writes in this process call notify() directly; start_poller() also
+    watches Notifications for rows inserted by other processes.
+
+    Versions come from one counter shared by all users, and only users with
+    a waiter keep an entry; the others read the counter itself. notify()
+    always moves the counter, so a version read before a notify() never
+    matches after it, even if the user's entry was dropped in between.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._counter = 0
+        self._versions = {}  # username -> version, while the user has waiters
+        self._waiting = defaultdict(int)  # username -> open streams and long-polls
+        self._subscribers = 0
+        self._async_waiters = defaultdict(set)  # username -> {(loop, asyncio.Event)}
+
+    def _current(self, username):
+        return self._versions.get(username, self._counter)
+
+    def version(self, username):
+        with self._cond:
+            return self._current(username)
+
+    def notify(self, username):
+        with self._cond:
+            self._counter += 1
+            if username in self._versions:
+                self._versions[username] = self._counter
+            self._cond.notify_all()
+            waiters = list(self._async_waiters.get(username, ()))
+        for loop, woken in waiters:
+            try:
+                loop.call_soon_threadsafe(woken.set)
+            except RuntimeError:
+                # The waiter's loop has closed
+                pass
+
+    def _subscribe(self, username, version):
+        """Register a waiter; returns False if a notify() already came after `version`."""
+        if self._current(username) != version:
+            return False
+        self._versions[username] = version
+        self._waiting[username] += 1
+        self._subscribers += 1
+        return True
+
+    def _unsubscribe(self, username):
+        self._subscribers -= 1
+        self._waiting[username] -= 1
+        if not self._waiting[username]:
+            # The last one: drop the user's entry rather than keep one per user ever seen
+            del self._waiting[username]
+            del self._versions[username]
+
+    def wait(self, username, version, timeout):
+        """Block until notify(username) happens after `version`; returns the new version."""
+        with self._cond:
+            if not self._subscribe(username, version):
+                return self._current(username)
+            try:
+                self._cond.wait_for(lambda: self._versions[username] != version, timeout)
+                return self._versions[username]
+            finally:
+                self._unsubscribe(username)
+
+    async def wait_async(self, username, version, timeout):
+        """wait() for coroutines: suspends the task instead of blocking a thread."""
+        waiter = (asyncio.get_running_loop(), asyncio.Event())
+        with self._cond:
+            if not self._subscribe(username, version):
+                return self._current(username)
+            self._async_waiters[username].add(waiter)
+        try:
+            await asyncio.wait_for(waiter[1].wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            with self._cond:
+                current = self._versions[username]
+                self._async_waiters[username].discard(waiter)
+                if not self._async_waiters[username]:
+                    del self._async_waiters[username]
+                self._unsubscribe(username)
+        return current
+
+    def start_poller(self, get_connection, interval):
+        """Poll for new Notifications rows while anyone is waiting."""
+        def run():
+            last_id = None
+            while True:
+                time.sleep(interval)
+                with self._cond:
+                    idle = self._subscribers == 0
+                if idle and last_id is not None:
+                    continue
+                conn = None
+                try:
+                    conn = get_connection()
+                    cursor = conn.cursor()
+                    if last_id is None:
+                        cursor.execute("SELECT COALESCE(MAX(notification_id), 0) FROM Notifications")
+                        last_id = cursor.fetchone()[0]
+                        continue
+                    cursor.execute("""
+                        SELECT notification_id, username FROM Notifications
+                        WHERE notification_id > %s
+                        ORDER BY notification_id
+                        LIMIT 1000
+                    """, (last_id,))
+                    rows = cursor.fetchall()
+                    for username in {row[1] for row in rows}:
+                        self.notify(username)
+                    if rows:
+                        last_id = rows[-1][0]
+                except Exception as e:
+                    print(f'Notification poller failed: {e}')
+                finally:
+                    if conn:
+                        conn.close()
+
+        thread = threading.Thread(target=run, name='notification-poller', daemon=True)
+        thread.start()
+        return thread
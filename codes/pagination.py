@@ -0,0 +1,101 @@
+import base64
+import json
+from datetime import date, datetime
+from decimal import Decimal
+
+MAX_PAGE_SIZE = 500
+
+
+def _cursor_value(value):
+    if isinstance(value, datetime):
+        return value.isoformat(sep=' ')
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+def encode_cursor(values):
+    """Pack the sort-key values of the last row into an opaque token."""
+    raw = json.dumps([_cursor_value(v) for v in values], separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token, size):
+    """Unpack a token produced by encode_cursor; raises ValueError if malformed."""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except Exception:
+        raise ValueError('Invalid cursor')
+    if not isinstance(values, list) or len(values) != size:
+        raise ValueError('Invalid cursor')
+    return values
+
+
+def page_limit(args, default):
+    """Read ?limit=N, clamped to [1, MAX_PAGE_SIZE]."""
+    try:
+        limit = int(args.get('limit', default))
+    except (TypeError, ValueError):
+        raise ValueError('limit must be an integer')
+    return max(1, min(limit, MAX_PAGE_SIZE))
+
+
+def _sort_column(column):
+    """Split 'col' or 'col DESC' into (col, comparison operator)."""
+    name, _, direction = column.partition(' ')
+    return name, '<' if direction.strip().upper() == 'DESC' else '>'
+
+
+def keyset_predicate(columns, values):
+    """SQL and params for "sort key comes after `values`".
+
+    Expanded as (a > %s) OR (a = %s AND b > %s) ... which MySQL turns into
+    an index range scan, unlike the row-constructor form. Columns written
+    as 'col DESC' compare with < instead.
+    """
+    clauses = []
+    params = []
+    for i, column in enumerate(columns):
+        name, op = _sort_column(column)
+        parts = [f'{_sort_column(c)[0]} = %s' for c in columns[:i]] + [f'{name} {op} %s']
+        clauses.append('(' + ' AND '.join(parts) + ')')
+        params += values[:i + 1]
+    return '(' + ' OR '.join(clauses) + ')', params
+
+
+def page_query(select_sql, conditions, params, columns, after, limit):
+    """SQL and params for one keyset page, fetching one extra row to detect the next page.
+
+    `conditions` are ANDed into the WHERE clause; every column in `columns`
+    must appear in the select list so the next cursor can be built.
+    """
+    conditions = list(conditions)
+    params = list(params)
+    if after:
+        predicate, predicate_params = keyset_predicate(columns, decode_cursor(after, len(columns)))
+        conditions.append(predicate)
+        params += predicate_params
+    sql = select_sql
+    if conditions:
+        sql += ' WHERE ' + ' AND '.join(conditions)
+    sql += ' ORDER BY ' + ', '.join(columns) + ' LIMIT %s'
+    params.append(limit + 1)
+    return sql, tuple(params)
+
+
+def page_result(rows, columns, limit):
+    """Trim the rows fetched by page_query() and return (rows, next_cursor)."""
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor([rows[-1][_sort_column(c)[0].split('.')[-1]] for c in columns])
+    return rows, next_cursor
+
+
+def paginate(cursor, select_sql, conditions, params, columns, after, limit):
+    """Fetch one keyset page and return (rows, next_cursor); see page_query()."""
+    cursor.execute(*page_query(select_sql, conditions, params, columns, after, limit))
+    return page_result(cursor.fetchall(), columns, limit)
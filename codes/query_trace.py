@@ -0,0 +1,131 @@
+import re
+import time
+
+_STRING_RE = re.compile(r"'(?:[^'\\]|\\.|'')*'|\"(?:[^\"\\]|\\.)*\"")
+_NUMBER_RE = re.compile(r'\b\d+(?:\.\d+)?\b')
+_IN_LIST_RE = re.compile(r'\bIN\s*\(\s*\?(?:\s*,\s*\?)*\s*\)', re.IGNORECASE)
+_VALUES_RE = re.compile(r'\bVALUES\s*(?=\()', re.IGNORECASE)
+_NEXT_ROW_RE = re.compile(r'\s*,\s*\(')
+_SPACE_RE = re.compile(r'\s+')
+
+_fingerprints = {}
+
+
+def _group_end(text, start):
+    """Index just past the parenthesised group opening at `start`, or None if unbalanced."""
+    depth = 0
+    for i in range(start, len(text)):
+        if text[i] == '(':
+            depth += 1
+        elif text[i] == ')':
+            depth -= 1
+            if depth == 0:
+                return i + 1
+    return None
+
+
+def _collapse_values(text):
+    """Keep only the first row of each multi-row VALUES list. Rows are matched
+    by balanced parentheses, so rows like (?, GREATEST(?, ?)) collapse too."""
+    out = []
+    pos = 0
+    for match in _VALUES_RE.finditer(text):
+        if match.start() < pos:
+            continue
+        end = _group_end(text, match.end())
+        if end is None:
+            break
+        out.append(text[pos:end])
+        pos = end
+        while True:
+            row = _NEXT_ROW_RE.match(text, pos)
+            if row is None:
+                break
+            row_end = _group_end(text, row.end() - 1)
+            if row_end is None:
+                break
+            pos = row_end
+    out.append(text[pos:])
+    return ''.join(out)
+
+
+def fingerprint(sql):
+    """Normalize a statement so queries differing only in literals, IN-list
+    length or multi-row VALUES share one label."""
+    cached = _fingerprints.get(sql)
+    if cached is not None:
+        return cached
+    text = sql.decode() if isinstance(sql, bytes) else str(sql)
+    text = _STRING_RE.sub('?', text)
+    text = _NUMBER_RE.sub('?', text).replace('%s', '?')
+    text = _IN_LIST_RE.sub('IN (...)', text)
+    text = _collapse_values(text)
+    text = _SPACE_RE.sub(' ', text).strip().rstrip(';')
+    if len(_fingerprints) < 10000:
+        _fingerprints[sql] = text
+    return text
+
+
+class QueryListener:
+    """Receives timing for every statement run through a TracedCursor."""
+
+    def on_execute(self, sql, params, duration, error):
+        pass
+
+    def on_rows(self, sql, count):
+        pass
+
+
+class TracedCursor:
+    """Cursor proxy that reports each execute() and fetch to `listeners`."""
+
+    def __init__(self, cursor, listeners):
+        self._cursor = cursor
+        self._listeners = listeners
+        self._sql = None
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def _run(self, method, sql, params, *args, **kwargs):
+        self._sql = sql
+        error = None
+        start = time.perf_counter()
+        try:
+            return method(sql, params, *args, **kwargs)
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            duration = time.perf_counter() - start
+            for listener in self._listeners:
+                listener.on_execute(sql, params, duration, error)
+
+    def execute(self, operation, params=(), *args, **kwargs):
+        return self._run(self._cursor.execute, operation, params, *args, **kwargs)
+
+    def executemany(self, operation, seq_params, *args, **kwargs):
+        return self._run(self._cursor.executemany, operation, seq_params, *args, **kwargs)
+
+    def _rows(self, count):
+        if count and self._sql is not None:
+            for listener in self._listeners:
+                listener.on_rows(self._sql, count)
+
+    def fetchone(self):
+        row = self._cursor.fetchone()
+        self._rows(1 if row is not None else 0)
+        return row
+
+    def fetchmany(self, *args, **kwargs):
+        rows = self._cursor.fetchmany(*args, **kwargs)
+        self._rows(len(rows))
+        return rows
+
+    def fetchall(self):
+        rows = self._cursor.fetchall()
+        self._rows(len(rows))
+        return rows
@@ -0,0 +1,138 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class ResultCache:
+    """Bounded LRU cache with a TTL, for read-only query results.
+
+    Concurrent misses on the same key share one load. invalidate() bumps a
+    generation counter so a load that started before a write commits never
+    stores its stale result; invalidate(keys) does the same for those keys
+    only, and invalidate(groups=...) for every tuple key whose first element
+    is one of `groups`. Cached values are shared; callers must not mutate them.
+    """
+
+    def __init__(self, ttl=30.0, max_entries=128):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._loading = {}  # key -> Lock held while the value is loaded
+        self._generation = 0
+        self._cleared = 0  # generation of the last invalidate() of every key
+        self._invalidated_at = None  # time.monotonic() of that invalidate()
+        self._invalidated_keys = {}  # key -> (generation, time.monotonic()) of its last invalidate(keys)
+        self._invalidated_groups = {}  # group -> (generation, time.monotonic()), likewise
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'invalidations': 0}
+
+    def _lookup(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def lookup(self, key):
+        """Non-blocking read for callers that load on their own, e.g. from asyncio.
+
+        Returns (True, value) on a hit, else (False, generation) to pass to store().
+        """
+        with self._lock:
+            entry = self._lookup(key)
+            if entry is not None:
+                self._stats['hits'] += 1
+                return True, entry[1]
+            self._stats['misses'] += 1
+            return False, self._generation
+
+    def store(self, key, value, generation):
+        """Cache `value` unless invalidate() ran since `generation` was read."""
+        with self._lock:
+            self._store(key, value, generation)
+
+    @staticmethod
+    def _group(key):
+        return key[0] if isinstance(key, tuple) and key else None
+
+    def _store(self, key, value, generation):
+        if (generation < self._cleared or generation < self._invalidated_keys.get(key, (0,))[0]
+                or generation < self._invalidated_groups.get(self._group(key), (0,))[0]):
+            return
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._stats['evictions'] += 1
+
+    def get_or_load(self, key, load):
+        with self._lock:
+            entry = self._lookup(key)
+            if entry is not None:
+                self._stats['hits'] += 1
+                return entry[1]
+            self._stats['misses'] += 1
+            key_lock = self._loading.setdefault(key, threading.Lock())
+
+        with key_lock:
+            try:
+                with self._lock:
+                    entry = self._lookup(key)
+                    if entry is not None:
+                        return entry[1]
+                    generation = self._generation
+                value = load()
+                with self._lock:
+                    self._store(key, value, generation)
+            finally:
+                # Also when load() raises, so failing keys don't pile up in _loading
+                with self._lock:
+                    self._loading.pop(key, None)
+        return value
+
+    def invalidate(self, keys=None, groups=None):
+        """Drop every entry, or only those of `keys` and of `groups`."""
+        with self._lock:
+            self._generation += 1
+            self._stats['invalidations'] += 1
+            now = time.monotonic()
+            if (keys is None and groups is None) or len(self._invalidated_keys) >= self.max_entries * 4:
+                # Too many keys to track one by one: treat it as a full invalidation
+                self._entries.clear()
+                self._invalidated_keys.clear()
+                self._invalidated_groups.clear()
+                self._cleared = self._generation
+                self._invalidated_at = now
+                return
+            for key in keys or ():
+                self._entries.pop(key, None)
+                self._invalidated_keys[key] = (self._generation, now)
+            if groups:
+                for group in groups:
+                    self._invalidated_groups[group] = (self._generation, now)
+                for key in [key for key in self._entries if self._group(key) in groups]:
+                    del self._entries[key]
+
+    def invalidated_within(self, seconds, key=None):
+        """Whether every entry, or `key`'s, was invalidated in the last `seconds` seconds."""
+        since = time.monotonic() - seconds
+        with self._lock:
+            if self._invalidated_at is not None and self._invalidated_at > since:
+                return True
+            if key is None:
+                return False
+            return (self._invalidated_keys.get(key, (0, since))[1] > since
+                    or self._invalidated_groups.get(self._group(key), (0, since))[1] > since)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entries'] = len(self._entries)
+            stats['ttl'] = self.ttl
+            stats['max_entries'] = self.max_entries
+            lookups = stats['hits'] + stats['misses']
+            stats['hit_ratio'] = stats['hits'] / lookups if lookups else 0.0
+        return stats
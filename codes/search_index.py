@@ -0,0 +1,198 @@
+import bisect
+import heapq
+import re
+import threading
+import time
+from collections import defaultdict
+
+_WORD_RE = re.compile(r'\w+')
+
+
+def _trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def _words(text):
+    return set(_WORD_RE.findall(text))
+
+
+class TitleIndex:
+    """In-process trigram index over event titles.
+
+    Queries of three or more characters are answered by intersecting the
+    posting sets of their trigrams and confirming the substring, so the
+    cost follows the number of matches rather than the size of Events.
+    Shorter queries fall back to word-prefix lookups on a sorted word list.
+    Results are ranked: exact title, title prefix, word prefix, then any
+    substring, earlier matches and shorter titles first.
+    """
+
+    def __init__(self):
+        self.loaded = False
+        self.watermark = None  # load_watermark() as of the last build by start_loader()
+        self._lock = threading.RLock()
+        self._titles = {}  # lowercase title -> title
+        self._postings = defaultdict(set)  # trigram -> lowercase titles
+        self._words = []  # sorted (word, lowercase title)
+        self._changes = None  # [(method, args)] made while build() runs
+
+    def build(self, load_titles):
+        """Index `load_titles()` from scratch, then swap the result in.
+
+        The index is built outside the lock with one sort of the word list,
+        so searches are not held up. add/remove/rename calls made meanwhile
+        are replayed on the new index, since `load_titles()` may not have
+        seen them.
+        """
+        with self._lock:
+            self._changes = []
+        try:
+            titles = {}
+            postings = defaultdict(set)
+            words = []
+            for title in load_titles():
+                key = title.lower()
+                if key in titles:
+                    continue
+                titles[key] = title
+                for gram in _trigrams(key):
+                    postings[gram].add(key)
+                words.extend((word, key) for word in _words(key))
+            words.sort()
+            with self._lock:
+                self._titles, self._postings, self._words = titles, postings, words
+                for method, args in self._changes:
+                    method(*args)
+                self.loaded = True
+        finally:
+            with self._lock:
+                self._changes = None
+        return len(titles)
+
+    def start_loader(self, load_titles, retry_interval=30.0, load_watermark=None, refresh_interval=0):
+        """build() in a daemon thread, retrying every `retry_interval` seconds until it succeeds.
+
+        With `load_watermark` and a positive `refresh_interval`, the thread
+        then calls `load_watermark()` every `refresh_interval` seconds and
+        builds again whenever its value changed, so titles written by other
+        processes or straight into the database show up within that time.
+        """
+        def build(watermark):
+            started = time.perf_counter()
+            count = self.build(load_titles)
+            self.watermark = watermark
+            print(f'Title index built over {count} title(s) in {time.perf_counter() - started:.1f}s')
+
+        def run():
+            while True:
+                try:
+                    # Read before the titles: a change made during the build moves it again
+                    build(load_watermark() if load_watermark else None)
+                    break
+                except Exception as e:
+                    print(f'Title index build failed: {e}')
+                time.sleep(retry_interval)
+            if not load_watermark or refresh_interval <= 0:
+                return
+            while True:
+                time.sleep(refresh_interval)
+                try:
+                    watermark = load_watermark()
+                    if watermark != self.watermark:
+                        build(watermark)
+                except Exception as e:
+                    print(f'Title index refresh failed: {e}')
+
+        thread = threading.Thread(target=run, name='title-index-loader', daemon=True)
+        thread.start()
+        return thread
+
+    def _record(self, method, *args):
+        if self._changes is not None:
+            self._changes.append((method, args))
+
+    def _add(self, title):
+        key = title.lower()
+        if key in self._titles:
+            return
+        self._titles[key] = title
+        for gram in _trigrams(key):
+            self._postings[gram].add(key)
+        for word in _words(key):
+            bisect.insort(self._words, (word, key))
+
+    def _remove(self, title):
+        key = title.lower()
+        if self._titles.pop(key, None) is None:
+            return
+        for gram in _trigrams(key):
+            posting = self._postings.get(gram)
+            if posting is not None:
+                posting.discard(key)
+                if not posting:
+                    del self._postings[gram]
+        for word in _words(key):
+            i = bisect.bisect_left(self._words, (word, key))
+            if i < len(self._words) and self._words[i] == (word, key):
+                del self._words[i]
+
+    def add(self, title):
+        with self._lock:
+            self._add(title)
+            self._record(self._add, title)
+
+    def remove(self, title):
+        with self._lock:
+            self._remove(title)
+            self._record(self._remove, title)
+
+    def rename(self, old_title, new_title):
+        with self._lock:
+            self._remove(old_title)
+            self._add(new_title)
+            self._record(self._remove, old_title)
+            self._record(self._add, new_title)
+
+    def _rank(self, key, q):
+        if key == q:
+            kind = 0
+        elif key.startswith(q):
+            kind = 1
+        elif any(word.startswith(q) for word in _words(key)):
+            kind = 2
+        else:
+            kind = 3
+        return (kind, key.find(q), len(key), key)
+
+    def _matches(self, q):
+        if len(q) >= 3:
+            postings = sorted((self._postings.get(gram, set()) for gram in _trigrams(q)), key=len)
+            candidates = set(postings[0]).intersection(*postings[1:])
+            return [key for key in candidates if q in key]
+        matches = set()
+        i = bisect.bisect_left(self._words, (q, ''))
+        while i < len(self._words) and self._words[i][0].startswith(q):
+            matches.add(self._words[i][1])
+            i += 1
+        return matches
+
+    def search(self, query, limit=None):
+        """Return the titles matching `query`, best match first; only the best `limit` if given."""
+        q = query.lower().strip()
+        if not q:
+            return []
+        with self._lock:
+            matches = self._matches(q)
+            if limit is not None and len(matches) > limit:
+                ranked = heapq.nsmallest(limit, matches, key=lambda key: self._rank(key, q))
+            else:
+                ranked = sorted(matches, key=lambda key: self._rank(key, q))
+            return [self._titles[key] for key in ranked]
+
+    def matching(self, query):
+        """Every title matching `query`, unranked."""
+        q = query.lower().strip()
+        if not q:
+            return []
+        with self._lock:
+            return [self._titles[key] for key in self._matches(q)]
@@ -0,0 +1,93 @@
+import itertools
+import json
+import queue
+import threading
+import time
+from collections import deque
+
+from flask import has_request_context, request
+
+from query_trace import QueryListener, fingerprint
+
+EXPLAINABLE = ('SELECT', 'INSERT', 'UPDATE', 'DELETE', 'REPLACE')
+
+
+def _shape(params):
+    if params is None:
+        return None
+    if isinstance(params, dict):
+        return {k: type(v).__name__ for k, v in params.items()}
+    return [type(v).__name__ for v in params]
+
+
+class SlowQueryLog(QueryListener):
+    """Keeps the last `size` statements slower than `threshold` seconds.
+
+    Only the fingerprint and the types of the bind parameters are kept.
+    The parameter values are held just long enough for a background
+    thread to run EXPLAIN FORMAT=JSON on a pooled connection and attach
+    the plan to the entry.
+    """
+
+    def __init__(self, threshold=0.2, size=200):
+        self.threshold = threshold
+        self._entries = deque(maxlen=size)
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._explain_queue = queue.Queue(maxsize=100)
+
+    def on_execute(self, sql, params, duration, error):
+        if duration < self.threshold:
+            return
+        text = fingerprint(sql)
+        if text.upper().startswith('EXPLAIN'):
+            return
+        many = isinstance(params, (list, tuple)) and params and isinstance(params[0], (list, tuple, dict))
+        entry = {
+            'id': next(self._ids),
+            'statement': text,
+            'param_shapes': (_shape(params[0]) if many else _shape(params)),
+            'batch_size': len(params) if many else None,
+            'duration_ms': round(duration * 1000, 2),
+            'route': request.endpoint if has_request_context() else threading.current_thread().name,
+            'error': str(error) if error else None,
+            'recorded_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'plan': None,
+        }
+        with self._lock:
+            self._entries.append(entry)
+        if text.upper().startswith(EXPLAINABLE):
+            try:
+                self._explain_queue.put_nowait((entry, sql, params[0] if many else params))
+            except queue.Full:
+                entry['plan'] = {'skipped': 'explain queue full'}
+
+    def entries(self):
+        with self._lock:
+            return list(self._entries)
+
+    def reset(self):
+        with self._lock:
+            self._entries.clear()
+
+    def start_explainer(self, get_connection):
+        """Attach EXPLAIN FORMAT=JSON plans to recorded entries from a daemon thread."""
+        def run():
+            while True:
+                entry, sql, params = self._explain_queue.get()
+                conn = None
+                try:
+                    conn = get_connection()
+                    cursor = conn.cursor()
+                    cursor.execute('EXPLAIN FORMAT=JSON ' + sql, params or ())
+                    entry['plan'] = json.loads(cursor.fetchone()[0])
+                    cursor.close()
+                except Exception as e:
+                    entry['plan'] = {'error': str(e)}
+                finally:
+                    if conn:
+                        conn.close()
+
+        thread = threading.Thread(target=run, name='slow-query-explainer', daemon=True)
+        thread.start()
+        return thread
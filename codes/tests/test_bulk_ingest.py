@@ -0,0 +1,102 @@
+import io
+import unittest
+from unittest import mock
+
+from mysql.connector.errors import DatabaseError
+
+from bulk_ingest import BATCH_RETRIES, ingest, iter_rows
+
+COLUMNS = ['user_id', 'event_title']
+
+
+class IterRowsTest(unittest.TestCase):
+    def test_ndjson(self):
+        body = b'{"user_id": 1, "event_title": "A"}\n\n  \nnot json\n{"user_id": 2, "event_title": "B"}\n'
+        rows = list(iter_rows(io.BytesIO(body), 'application/x-ndjson'))
+        self.assertEqual([line for line, _ in rows], [1, 4, 5])
+        self.assertEqual(rows[0][1], {'user_id': 1, 'event_title': 'A'})
+        self.assertIsInstance(rows[1][1], Exception)
+        self.assertEqual(rows[2][1], {'user_id': 2, 'event_title': 'B'})
+
+    def test_csv(self):
+        body = 'user_id,event_title\n1,"Jazz, live"\n2,Café\n'.encode()
+        rows = list(iter_rows(io.BytesIO(body), 'text/csv; charset=utf-8'))
+        self.assertEqual(rows, [(2, {'user_id': '1', 'event_title': 'Jazz, live'}),
+                                (3, {'user_id': '2', 'event_title': 'Café'})])
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def executemany(self, sql, seq_params):
+        if self.conn.deadlocks:
+            self.conn.deadlocks -= 1
+            raise DatabaseError(errno=1213, msg='Deadlock found')
+        if any(params[0] == 'bad' for params in seq_params):
+            raise DatabaseError(errno=1366, msg='Incorrect integer value')
+        self.conn.pending.extend(seq_params)
+
+    def execute(self, sql, params=()):
+        if sql.startswith('INSERT'):
+            if params[0] == 'bad':
+                raise DatabaseError(errno=1366, msg='Incorrect integer value')
+            self.conn.pending.append(params)
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def __init__(self, deadlocks=0):
+        self.deadlocks = deadlocks
+        self.pending = []
+        self.committed = []
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def start_transaction(self):
+        self.pending = []
+
+    def commit(self):
+        self.committed.extend(self.pending)
+        self.pending = []
+
+    def rollback(self):
+        self.pending = []
+
+
+def rows(*user_ids):
+    return [(i + 1, {'user_id': user_id, 'event_title': 'A'}) for i, user_id in enumerate(user_ids)]
+
+
+class IngestTest(unittest.TestCase):
+    def test_reports_invalid_rows_and_keeps_the_rest(self):
+        conn = FakeConnection()
+        source = rows(1, 'bad', 3) + [(4, ValueError('oops')), (5, ['x']), (6, {'user_id': 6})]
+        summary = ingest(conn, source, 'WishList', COLUMNS, batch_size=2)
+        self.assertEqual(conn.committed, [(1, 'A'), (3, 'A')])
+        self.assertEqual(summary['inserted'], 2)
+        self.assertEqual(summary['failed'], 4)
+        self.assertEqual([error['line'] for error in summary['errors']], [2, 4, 5, 6])
+
+    def test_retries_a_deadlocked_batch(self):
+        conn = FakeConnection(deadlocks=2)
+        committed = []
+        with mock.patch('bulk_ingest.time.sleep'):
+            summary = ingest(conn, rows(1, 2, 3), 'WishList', COLUMNS, batch_size=10, after_commit=committed.extend)
+        self.assertEqual(conn.committed, [(1, 'A'), (2, 'A'), (3, 'A')])
+        self.assertEqual(summary['retries'], 2)
+        self.assertEqual(summary['inserted'], 3)
+        self.assertEqual(len(committed), 3)
+
+    def test_gives_up_after_batch_retries(self):
+        conn = FakeConnection(deadlocks=BATCH_RETRIES + 1)
+        with mock.patch('bulk_ingest.time.sleep'), self.assertRaises(DatabaseError):
+            ingest(conn, rows(1), 'WishList', COLUMNS, batch_size=10)
+        self.assertEqual(conn.committed, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,46 @@
+import unittest
+
+from facets import FACETS_SELECT, facet_query, summarize
+
+ROWS = [
+    {'city': 'Boston', 'month': 203001, 'events': 2},
+    {'city': 'Boston', 'month': 203002, 'events': 1},
+    {'city': 'Austin', 'month': 203001, 'events': 3},
+    {'city': None, 'month': None, 'events': 1},
+]
+
+
+class FacetQueryTest(unittest.TestCase):
+    def test_adds_conditions_and_grouping(self):
+        sql, params = facet_query('FROM ActiveEvents', ['datetime_local >= %s', 'event_title LIKE %s'],
+                                  ['2030-01-01', '%jazz%'])
+        self.assertEqual(sql, FACETS_SELECT + 'FROM ActiveEvents WHERE datetime_local >= %s AND event_title LIKE %s'
+                              ' GROUP BY city, month')
+        self.assertEqual(params, ('2030-01-01', '%jazz%'))
+
+    def test_without_conditions(self):
+        self.assertEqual(facet_query('FROM ActiveEvents', [], []),
+                         (FACETS_SELECT + 'FROM ActiveEvents GROUP BY city, month', ()))
+
+
+class SummarizeTest(unittest.TestCase):
+    def test_all_cities(self):
+        facets = summarize(ROWS)
+        self.assertEqual(facets['total'], 7)
+        self.assertEqual(facets['city'], [{'value': 'Austin', 'count': 3}, {'value': 'Boston', 'count': 3},
+                                          {'value': None, 'count': 1}])
+        self.assertEqual(facets['month'], [{'value': '2030-01', 'count': 5}, {'value': '2030-02', 'count': 1},
+                                           {'value': None, 'count': 1}])
+
+    def test_city_filter_limits_months_and_total_only(self):
+        facets = summarize(ROWS, city='boston')
+        self.assertEqual(facets['total'], 3)
+        self.assertEqual(facets['month'], [{'value': '2030-01', 'count': 2}, {'value': '2030-02', 'count': 1}])
+        self.assertEqual(len(facets['city']), 3)
+
+    def test_no_rows(self):
+        self.assertEqual(summarize([], city='Nowhere'), {'total': 0, 'city': [], 'month': []})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+import base64
+import unittest
+from datetime import datetime
+from decimal import Decimal
+
+from pagination import (MAX_PAGE_SIZE, decode_cursor, encode_cursor, keyset_predicate, page_limit, page_query,
+                        page_result)
+
+ORDER = ['datetime_local', 'event_title']
+
+
+class CursorTest(unittest.TestCase):
+    def test_round_trip(self):
+        token = encode_cursor([datetime(2030, 1, 2, 20, 0), 'Show', Decimal('1.50'), 7])
+        self.assertEqual(decode_cursor(token, 4), ['2030-01-02 20:00:00', 'Show', '1.50', 7])
+
+    def test_token_is_url_safe(self):
+        token = encode_cursor(['?&/+' * 10])
+        self.assertNotIn('=', token)
+        self.assertTrue(all(c.isalnum() or c in '-_' for c in token))
+
+    def test_rejects_malformed_tokens(self):
+        not_a_list = base64.urlsafe_b64encode(b'{"a":1}').decode()
+        for token in ('', 'not base64!', encode_cursor([1]) + 'x', not_a_list):
+            with self.assertRaises(ValueError):
+                decode_cursor(token, 1)
+
+    def test_rejects_wrong_size(self):
+        with self.assertRaises(ValueError):
+            decode_cursor(encode_cursor([1, 2]), 1)
+
+
+class PageLimitTest(unittest.TestCase):
+    def test_clamps(self):
+        self.assertEqual(page_limit({}, 150), 150)
+        self.assertEqual(page_limit({'limit': '0'}, 150), 1)
+        self.assertEqual(page_limit({'limit': '100000'}, 150), MAX_PAGE_SIZE)
+
+    def test_rejects_non_integers(self):
+        with self.assertRaises(ValueError):
+            page_limit({'limit': 'ten'}, 150)
+
+
+class KeysetTest(unittest.TestCase):
+    def test_predicate_expands_per_column(self):
+        sql, params = keyset_predicate(['a', 'b DESC'], [1, 2])
+        self.assertEqual(sql, '((a > %s) OR (a = %s AND b < %s))')
+        self.assertEqual(params, [1, 1, 2])
+
+    def test_first_page(self):
+        sql, params = page_query('SELECT * FROM Events', ['city = %s'], ['Chicago'], ORDER, None, 10)
+        self.assertEqual(sql, 'SELECT * FROM Events WHERE city = %s ORDER BY datetime_local, event_title LIMIT %s')
+        self.assertEqual(params, ('Chicago', 11))
+
+    def test_next_page_continues_after_cursor(self):
+        after = encode_cursor(['2030-01-01 00:00:00', 'B'])
+        sql, params = page_query('SELECT * FROM Events', [], [], ORDER, after, 2)
+        self.assertIn('WHERE ((datetime_local > %s) OR (datetime_local = %s AND event_title > %s))', sql)
+        self.assertEqual(params, ('2030-01-01 00:00:00', '2030-01-01 00:00:00', 'B', 3))
+
+    def test_result_trims_and_points_at_last_row(self):
+        rows = [{'datetime_local': datetime(2030, 1, i), 'event_title': f'E{i}'} for i in (1, 2, 3)]
+        page, next_cursor = page_result(rows, ['e.datetime_local', 'e.event_title'], 2)
+        self.assertEqual(page, rows[:2])
+        self.assertEqual(decode_cursor(next_cursor, 2), ['2030-01-02 00:00:00', 'E2'])
+
+    def test_last_page_has_no_cursor(self):
+        rows = [{'datetime_local': datetime(2030, 1, 1), 'event_title': 'E'}]
+        self.assertEqual(page_result(rows, ORDER, 2), (rows, None))
+
+
+if __name__ == '__main__':
+    unittest.main()
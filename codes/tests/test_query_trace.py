@@ -0,0 +1,40 @@
+import unittest
+
+from query_trace import fingerprint
+
+
+class FingerprintTest(unittest.TestCase):
+    def test_replaces_literals(self):
+        self.assertEqual(fingerprint("SELECT * FROM Events WHERE city = 'O''Hare' AND id = 42 AND price > 9.5"),
+                         'SELECT * FROM Events WHERE city = ? AND id = ? AND price > ?')
+        self.assertEqual(fingerprint(b'SELECT * FROM Events WHERE id = %s;'), 'SELECT * FROM Events WHERE id = ?')
+
+    def test_collapses_in_lists(self):
+        self.assertEqual(fingerprint('SELECT * FROM Tickets WHERE ticket_id IN (%s, %s, %s)'),
+                         fingerprint('SELECT * FROM Tickets WHERE ticket_id IN (1)'))
+
+    def test_normalizes_whitespace(self):
+        self.assertEqual(fingerprint('SELECT  1\n  FROM\tEvents '), 'SELECT ? FROM Events')
+
+    def test_collapses_multi_row_values(self):
+        one = fingerprint('INSERT INTO WishList (user_id, event_title) VALUES (%s, %s)')
+        three = fingerprint('INSERT INTO WishList (user_id, event_title) VALUES (%s, %s), (%s, %s),(%s, %s)')
+        self.assertEqual(one, three)
+        self.assertEqual(one, 'INSERT INTO WishList (user_id, event_title) VALUES (?, ?)')
+
+    def test_collapses_rows_with_nested_parentheses(self):
+        sql = 'INSERT INTO Counts (city, n) VALUES (%s, GREATEST(%s, 0)), (%s, GREATEST(%s, 0))'
+        self.assertEqual(fingerprint(sql), 'INSERT INTO Counts (city, n) VALUES (?, GREATEST(?, ?))')
+
+    def test_keeps_on_duplicate_key_values(self):
+        sql = ('INSERT INTO Counts (city, n) VALUES (%s, %s), (%s, %s) '
+               'ON DUPLICATE KEY UPDATE n = n + VALUES(n)')
+        self.assertEqual(fingerprint(sql),
+                         'INSERT INTO Counts (city, n) VALUES (?, ?) ON DUPLICATE KEY UPDATE n = n + VALUES(n)')
+
+    def test_leaves_unbalanced_values_alone(self):
+        self.assertEqual(fingerprint('INSERT INTO T VALUES (1, (2'), 'INSERT INTO T VALUES (?, (?')
+
+
+if __name__ == '__main__':
+    unittest.main()
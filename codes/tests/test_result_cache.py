@@ -0,0 +1,124 @@
+import threading
+import time
+import unittest
+
+from result_cache import ResultCache
+
+
+class LoadTest(unittest.TestCase):
+    def test_loads_once_then_hits(self):
+        cache = ResultCache()
+        calls = []
+        self.assertEqual(cache.get_or_load('k', lambda: calls.append(1) or 'v'), 'v')
+        self.assertEqual(cache.get_or_load('k', lambda: calls.append(1) or 'other'), 'v')
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(cache.stats()['hits'], 1)
+
+    def test_entries_expire(self):
+        cache = ResultCache(ttl=0.01)
+        cache.get_or_load('k', lambda: 1)
+        time.sleep(0.02)
+        self.assertEqual(cache.get_or_load('k', lambda: 2), 2)
+
+    def test_evicts_least_recently_used(self):
+        cache = ResultCache(max_entries=2)
+        cache.get_or_load('a', lambda: 1)
+        cache.get_or_load('b', lambda: 2)
+        cache.get_or_load('a', lambda: 1)
+        cache.get_or_load('c', lambda: 3)
+        self.assertEqual(cache.lookup('a'), (True, 1))
+        self.assertFalse(cache.lookup('b')[0])
+
+    def test_concurrent_misses_share_one_load(self):
+        cache = ResultCache()
+        calls = []
+        release = threading.Event()
+
+        def load():
+            calls.append(1)
+            release.wait(5)
+            return 'v'
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(cache.get_or_load('k', load))) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        time.sleep(0.05)
+        release.set()
+        for thread in threads:
+            thread.join(5)
+        self.assertEqual(results, ['v'] * 4)
+        self.assertEqual(len(calls), 1)
+
+    def test_failed_load_leaves_nothing_behind(self):
+        cache = ResultCache()
+
+        def fail():
+            raise RuntimeError('down')
+
+        with self.assertRaises(RuntimeError):
+            cache.get_or_load('k', fail)
+        self.assertEqual(cache._loading, {})
+        self.assertEqual(cache.get_or_load('k', lambda: 'v'), 'v')
+
+
+class GenerationTest(unittest.TestCase):
+    def test_load_started_before_invalidate_is_not_stored(self):
+        cache = ResultCache()
+
+        def load():
+            cache.invalidate()
+            return 'stale'
+
+        self.assertEqual(cache.get_or_load('k', load), 'stale')
+        self.assertFalse(cache.lookup('k')[0])
+
+    def test_store_checks_the_generation_of_lookup(self):
+        cache = ResultCache()
+        _, generation = cache.lookup('k')
+        cache.invalidate(['k'])
+        cache.store('k', 'stale', generation)
+        self.assertFalse(cache.lookup('k')[0])
+        cache.store('other', 'fine', generation)
+        self.assertEqual(cache.lookup('other'), (True, 'fine'))
+
+    def test_invalidate_keys_keeps_the_others(self):
+        cache = ResultCache()
+        for key in ('a', 'b'):
+            cache.get_or_load(key, lambda: key)
+        cache.invalidate(['a'])
+        self.assertFalse(cache.lookup('a')[0])
+        self.assertEqual(cache.lookup('b'), (True, 'b'))
+
+    def test_invalidate_groups(self):
+        cache = ResultCache()
+        cache.get_or_load(('popular', 1), lambda: 1)
+        cache.get_or_load(('facets', 1), lambda: 2)
+        _, generation = cache.lookup(('popular', 2))
+        cache.invalidate(groups=['popular'])
+        cache.store(('popular', 2), 'stale', generation)
+        self.assertFalse(cache.lookup(('popular', 1))[0])
+        self.assertFalse(cache.lookup(('popular', 2))[0])
+        self.assertEqual(cache.lookup(('facets', 1)), (True, 2))
+
+    def test_invalidated_within(self):
+        cache = ResultCache()
+        self.assertFalse(cache.invalidated_within(60))
+        cache.invalidate(['a'])
+        self.assertTrue(cache.invalidated_within(60, 'a'))
+        self.assertFalse(cache.invalidated_within(60, 'b'))
+        self.assertFalse(cache.invalidated_within(60))
+        cache.invalidate()
+        self.assertTrue(cache.invalidated_within(60, 'b'))
+
+    def test_too_many_tracked_keys_fall_back_to_a_full_clear(self):
+        cache = ResultCache(max_entries=2)
+        cache.get_or_load('keep', lambda: 1)
+        for i in range(9):
+            cache.invalidate([('gone', i)])
+        self.assertFalse(cache.lookup('keep')[0])
+        self.assertLessEqual(len(cache._invalidated_keys), 8)
+
+
+if __name__ == '__main__':
+    unittest.main()
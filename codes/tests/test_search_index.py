@@ -0,0 +1,98 @@
+import threading
+import time
+import unittest
+
+from search_index import TitleIndex
+
+TITLES = ['Taylor Swift', 'Swift Boat Race', 'Jazz Night', 'The Swiftest', 'Rock Night', 'Night Swim']
+
+
+def built(titles=TITLES):
+    index = TitleIndex()
+    index.build(lambda: list(titles))
+    return index
+
+
+class SearchTest(unittest.TestCase):
+    def test_substring_matches_case_insensitively(self):
+        self.assertEqual(set(built().search('WIFT')), {'Taylor Swift', 'Swift Boat Race', 'The Swiftest'})
+
+    def test_ranks_exact_then_prefix_then_word_prefix_then_substring(self):
+        index = built(['Swift Tour', 'Taylor Swift', 'Swift', 'Bigswift'])
+        self.assertEqual(index.search('swift'), ['Swift', 'Swift Tour', 'Taylor Swift', 'Bigswift'])
+
+    def test_limit_keeps_the_best_matches(self):
+        index = built(['Swift Tour', 'Taylor Swift', 'Swift', 'Bigswift'])
+        self.assertEqual(index.search('swift', limit=2), ['Swift', 'Swift Tour'])
+
+    def test_short_queries_match_word_prefixes(self):
+        self.assertEqual(set(built().search('ni')), {'Jazz Night', 'Rock Night', 'Night Swim'})
+
+    def test_blank_query_matches_nothing(self):
+        self.assertEqual(built().search('  '), [])
+        self.assertEqual(built().matching(''), [])
+
+    def test_matching_is_unranked_and_complete(self):
+        self.assertEqual(set(built().matching('night')), {'Jazz Night', 'Rock Night', 'Night Swim'})
+
+
+class UpdateTest(unittest.TestCase):
+    def test_add_remove_rename(self):
+        index = built()
+        index.add('Swift Encore')
+        index.remove('Taylor Swift')
+        index.rename('Jazz Night', 'Jazz Swift')
+        self.assertEqual(set(index.search('swift')),
+                         {'Swift Boat Race', 'The Swiftest', 'Swift Encore', 'Jazz Swift'})
+        self.assertEqual(index.search('jazz night'), [])
+        self.assertEqual(index.search('ni'), ['Night Swim', 'Rock Night'])
+
+    def test_titles_are_unique_case_insensitively(self):
+        index = built(['Rock Night', 'ROCK NIGHT'])
+        index.add('rock night')
+        self.assertEqual(index.search('rock'), ['Rock Night'])
+
+    def test_changes_during_build_are_replayed(self):
+        index = TitleIndex()
+        loading = threading.Event()
+        resume = threading.Event()
+
+        def load_titles():
+            loading.set()
+            resume.wait(5)
+            return ['Old Show', 'Renamed Show']
+
+        builder = threading.Thread(target=index.build, args=(load_titles,))
+        builder.start()
+        loading.wait(5)
+        index.add('New Show')
+        index.rename('Renamed Show', 'Fresh Show')
+        resume.set()
+        builder.join(5)
+        self.assertTrue(index.loaded)
+        self.assertEqual(set(index.search('show')), {'Old Show', 'New Show', 'Fresh Show'})
+
+
+class LoaderTest(unittest.TestCase):
+    def test_rebuilds_when_the_watermark_moves(self):
+        titles = ['Old Show']
+        watermark = [1]
+        index = TitleIndex()
+        index.start_loader(lambda: list(titles), 0.01, lambda: watermark[0], 0.01)
+        self.assertTrue(wait_for(lambda: index.search('show') == ['Old Show']))
+        titles.append('New Show')
+        watermark[0] = 2
+        self.assertTrue(wait_for(lambda: len(index.search('show')) == 2))
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+import unittest
+from unittest import mock
+
+from flask import Flask, g
+
+from versions import VersionCounters, conditional_get
+
+
+class VersionCountersTest(unittest.TestCase):
+    def test_bump_changes_only_its_etags(self):
+        versions = VersionCounters()
+        events, tickets = versions.etag(['Events']), versions.etag(['Tickets'])
+        versions.bump('Tickets')
+        self.assertEqual(versions.etag(['Events']), events)
+        self.assertNotEqual(versions.etag(['Tickets']), tickets)
+
+    def test_etag_differs_between_processes(self):
+        with mock.patch('versions.os.getpid', return_value=1):
+            first = VersionCounters().etag(['Events'])
+        with mock.patch('versions.os.getpid', return_value=2):
+            second = VersionCounters().etag(['Events'])
+        self.assertNotEqual(first, second)
+
+    def test_etag_rolls_over_after_max_age(self):
+        versions = VersionCounters(max_age=60)
+        with mock.patch('versions.time.time', return_value=600):
+            before = versions.etag(['Events'])
+        with mock.patch('versions.time.time', return_value=659):
+            self.assertEqual(versions.etag(['Events']), before)
+        with mock.patch('versions.time.time', return_value=660):
+            self.assertNotEqual(versions.etag(['Events']), before)
+
+    def test_recently_bumped(self):
+        versions = VersionCounters(replica_lag=60)
+        self.assertFalse(versions.recently_bumped(['Events']))
+        versions.bump('Events')
+        self.assertTrue(versions.recently_bumped(['Tickets', 'Events']))
+        self.assertFalse(versions.recently_bumped(['Tickets']))
+        self.assertFalse(VersionCounters().recently_bumped(['Events']))
+
+
+class ConditionalGetTest(unittest.TestCase):
+    def setUp(self):
+        self.versions = VersionCounters(replica_lag=60)
+        self.calls = []
+        app = Flask(__name__)
+
+        @app.route('/events')
+        @conditional_get(self.versions, lambda: ['Events'])
+        def events():
+            self.calls.append(g.get('read_from_primary', False))
+            return {'events': []}
+
+        @app.route('/missing')
+        @conditional_get(self.versions, lambda: ['Events'])
+        def missing():
+            return {'error': 'not found'}, 404
+
+        @app.route('/anonymous')
+        @conditional_get(self.versions, lambda: None)
+        def anonymous():
+            return {'events': []}
+
+        self.client = app.test_client()
+
+    def test_matching_etag_skips_the_view(self):
+        etag = self.client.get('/events').headers['ETag']
+        response = self.client.get('/events', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.headers['ETag'], etag)
+        self.assertEqual(len(self.calls), 1)
+
+    def test_bump_invalidates_the_etag(self):
+        etag = self.client.get('/events').headers['ETag']
+        self.versions.bump('Events')
+        response = self.client.get('/events', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.headers['ETag'], etag)
+        self.assertEqual(response.headers['Cache-Control'], 'private, no-cache')
+
+    def test_recent_bump_reads_from_primary(self):
+        self.client.get('/events')
+        self.versions.bump('Events')
+        self.client.get('/events')
+        self.assertEqual(self.calls, [False, True])
+
+    def test_errors_and_skipped_requests_carry_no_etag(self):
+        self.assertNotIn('ETag', self.client.get('/missing').headers)
+        self.assertNotIn('ETag', self.client.get('/anonymous').headers)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,194 @@
+import threading
+import time
+
+# TicketHolds (migration 6): seats taken out of Tickets.quantity for a buyer
+# until they confirm (the purchase), release them, or expires_at passes and
+# the reaper gives them back. Tickets.quantity is therefore what is still on
+# sale; the seats of a listing are quantity plus its held and purchased holds.
+
+MAX_QUANTITY = 10
+REAP_BATCH = 500
+
+# Cheapest listing of the event with enough seats. Rows another buyer is
+# decrementing are skipped rather than waited for, so a rush on one event
+# spreads over its listings instead of queueing on the first one.
+PICK_LISTING = """
+    SELECT ticket_id FROM Tickets
+    WHERE event_title = %s AND quantity >= %s{section}
+    ORDER BY total_price, ticket_id
+    LIMIT 1
+    FOR UPDATE{skip}
+"""
+
+
+class HoldError(Exception):
+    """A hold that cannot be taken or changed; `status` is the HTTP status to answer with."""
+
+    def __init__(self, message, status):
+        super().__init__(message)
+        self.status = status
+
+
+def parse_quantity(value):
+    if isinstance(value, bool) or not isinstance(value, int) or not 0 < value <= MAX_QUANTITY:
+        raise ValueError(f'quantity must be an integer from 1 to {MAX_QUANTITY}')
+    return value
+
+
+def _take(cursor, ticket_id, quantity):
+    # The decrement is conditional, so two buyers of the last seats cannot
+    # both succeed: the second one matches no row once the first commits
+    cursor.execute("UPDATE Tickets SET quantity = quantity - %s WHERE ticket_id = %s AND quantity >= %s",
+                   (quantity, ticket_id, quantity))
+    return cursor.rowcount == 1
+
+
+def _pick(cursor, event_title, section, quantity):
+    params = [event_title, quantity] + ([section] if section else [])
+    section_sql = ' AND section = %s' if section else ''
+    for skip in (' SKIP LOCKED', ''):
+        # Nothing unlocked left: wait on the locked rows before answering
+        # "sold out", since their buyers may still roll back
+        cursor.execute(PICK_LISTING.format(section=section_sql, skip=skip), tuple(params))
+        row = cursor.fetchone()
+        cursor.fetchall()
+        if row:
+            return row[0]
+    return None
+
+
+def event_titles(cursor, ticket_ids):
+    """The event titles of the listings `ticket_ids`."""
+    if not ticket_ids:
+        return set()
+    cursor.execute(f"SELECT DISTINCT event_title FROM Tickets WHERE ticket_id IN ({', '.join(['%s'] * len(ticket_ids))})",
+                   tuple(ticket_ids))
+    return {row[0] for row in cursor.fetchall()}
+
+
+def reserve(cursor, username, quantity, ttl, ticket_id=None, event_title=None, section=None):
+    """Hold `quantity` seats of one listing for `ttl` seconds, in the caller's transaction.
+
+    Takes them from `ticket_id`, or from the cheapest listing of
+    `event_title` (and `section`) with enough seats. Returns
+    {'hold_id', 'ticket_id', 'quantity', 'expires_in'}.
+    """
+    if ticket_id is None:
+        ticket_id = _pick(cursor, event_title, section, quantity)
+        if ticket_id is None:
+            raise HoldError('Not enough tickets available', 409)
+    if not _take(cursor, ticket_id, quantity):
+        cursor.execute("SELECT quantity FROM Tickets WHERE ticket_id = %s", (ticket_id,))
+        found = cursor.fetchall()
+        if not found:
+            raise HoldError('Ticket not found', 404)
+        raise HoldError('Not enough tickets available', 409)
+    cursor.execute("""
+        INSERT INTO TicketHolds (ticket_id, username, quantity, expires_at)
+        VALUES (%s, %s, %s, NOW(6) + INTERVAL %s SECOND)
+    """, (ticket_id, username, quantity, int(ttl)))
+    return {'hold_id': cursor.lastrowid, 'ticket_id': ticket_id, 'quantity': quantity, 'expires_in': int(ttl)}
+
+
+def _locked_hold(cursor, hold_id, username):
+    cursor.execute("SELECT ticket_id, quantity, status, expires_at <= NOW(6) FROM TicketHolds "
+                   "WHERE hold_id = %s AND username = %s FOR UPDATE", (hold_id, username))
+    rows = cursor.fetchall()
+    if not rows:
+        raise HoldError('Hold not found', 404)
+    return rows[0]
+
+
+def confirm(cursor, hold_id, username):
+    """Turn an unexpired hold into a purchase; returns {'hold_id', 'ticket_id', 'quantity'}."""
+    ticket_id, quantity, status, expired = _locked_hold(cursor, hold_id, username)
+    if status == 'purchased':
+        return {'hold_id': hold_id, 'ticket_id': ticket_id, 'quantity': quantity}
+    if status != 'held' or expired:
+        # The seats are back on sale, or about to be once the reaper runs
+        raise HoldError('Hold has expired' if status != 'released' else 'Hold was released', 409)
+    cursor.execute("UPDATE TicketHolds SET status = 'purchased' WHERE hold_id = %s", (hold_id,))
+    return {'hold_id': hold_id, 'ticket_id': ticket_id, 'quantity': quantity}
+
+
+def release(cursor, hold_id, username):
+    """Give the seats of a hold back; returns its ticket_id, or None if it was no longer held."""
+    ticket_id, quantity, status, _ = _locked_hold(cursor, hold_id, username)
+    if status == 'purchased':
+        raise HoldError('Hold was already purchased', 409)
+    if status != 'held':
+        return None
+    cursor.execute("UPDATE TicketHolds SET status = 'released' WHERE hold_id = %s", (hold_id,))
+    cursor.execute("UPDATE Tickets SET quantity = quantity + %s WHERE ticket_id = %s", (quantity, ticket_id))
+    return ticket_id
+
+
+def reap_expired(conn, batch_size=REAP_BATCH):
+    """Return the seats of expired holds to their listings.
+
+    Returns (holds expired, event titles of the listings that got seats back).
+
+    Holds a confirm or release is working on are skipped and picked up on
+    a later pass if they are still held then.
+    """
+    cursor = conn.cursor()
+    try:
+        expired = 0
+        titles = set()
+        while True:
+            conn.start_transaction(isolation_level='READ COMMITTED')
+            cursor.execute("""
+                SELECT hold_id, ticket_id, quantity FROM TicketHolds
+                WHERE status = 'held' AND expires_at <= NOW(6)
+                ORDER BY expires_at
+                LIMIT %s
+                FOR UPDATE SKIP LOCKED
+            """, (batch_size,))
+            holds = cursor.fetchall()
+            if holds:
+                cursor.execute(
+                    f"UPDATE TicketHolds SET status = 'expired' WHERE hold_id IN ({', '.join(['%s'] * len(holds))})",
+                    tuple(hold_id for hold_id, _, _ in holds))
+                returned = {}
+                for _, ticket_id, quantity in holds:
+                    returned[ticket_id] = returned.get(ticket_id, 0) + quantity
+                # In ticket_id order, so concurrent reapers lock listings in the same order
+                cursor.executemany("UPDATE Tickets SET quantity = quantity + %s WHERE ticket_id = %s",
+                                   [(returned[ticket_id], ticket_id) for ticket_id in sorted(returned)])
+                titles |= event_titles(cursor, list(returned))
+            conn.commit()
+            expired += len(holds)
+            if len(holds) < batch_size:
+                return expired, titles
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+
+def start_reaper(get_connection, interval, on_reaped=None):
+    """Run reap_expired() every `interval` seconds in a daemon thread.
+
+    `on_reaped(count, event_titles)` runs after a pass that gave seats back.
+    """
+    def run():
+        while True:
+            conn = None
+            try:
+                conn = get_connection()
+                expired, titles = reap_expired(conn)
+                if expired:
+                    print(f'Released {expired} expired ticket hold(s)')
+                    if on_reaped:
+                        on_reaped(expired, titles)
+            except Exception as e:
+                print(f'Ticket hold reaper failed: {e}')
+            finally:
+                if conn:
+                    conn.close()
+            time.sleep(interval)
+
+    thread = threading.Thread(target=run, name='ticket-hold-reaper', daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,105 @@
+import math
+
+import pandas as pd
+
+# Ticket price statistics computed with pandas over whole columns rather
+# than row by row. Prices are total_price (what a buyer pays) per listing;
+# fee_ratio is total fees over total face value.
+COLUMNS = ['event_title', 'section', 'ticket_price', 'fee', 'total_price', 'quantity']
+TICKETS_SELECT = "SELECT event_title, section, ticket_price, fee, total_price, quantity FROM Tickets"
+
+PRICE_BANDS = [0, 50, 100, 200, 500, math.inf]
+BAND_LABELS = ['0-50', '50-100', '100-200', '200-500', '500+']
+
+
+def _frame(rows):
+    df = pd.DataFrame.from_records(rows, columns=COLUMNS)
+    for column in ('ticket_price', 'fee', 'total_price', 'quantity'):
+        df[column] = pd.to_numeric(df[column], errors='coerce')
+    df['quantity'] = df['quantity'].fillna(0)
+    return df
+
+
+def _aggregate(grouped):
+    price = grouped['total_price']
+    face_value = grouped['ticket_price'].sum()
+    return pd.DataFrame({
+        'listings': grouped.size(),
+        'quantity': grouped['quantity'].sum(),
+        'min_price': price.min(),
+        'median_price': price.median(),
+        'p90_price': price.quantile(0.9),
+        'max_price': price.max(),
+        'fee_ratio': grouped['fee'].sum() / face_value.where(face_value != 0),
+    })
+
+
+def _value(value, digits):
+    if pd.isna(value):
+        return None
+    return round(float(value), digits)
+
+
+def _records(stats, key):
+    records = []
+    for name, row in stats.iterrows():
+        records.append({
+            key: name,
+            'listings': int(row['listings']),
+            'quantity': int(row['quantity']),
+            'min_price': _value(row['min_price'], 2),
+            'median_price': _value(row['median_price'], 2),
+            'p90_price': _value(row['p90_price'], 2),
+            'max_price': _value(row['max_price'], 2),
+            'fee_ratio': _value(row['fee_ratio'], 4),
+        })
+    return records
+
+
+def summarize_event(rows):
+    """Overall, per-section and per-price-band stats for one event's Tickets rows."""
+    df = _frame(rows)
+    df['section'] = df['section'].fillna('')
+    bands = pd.cut(df['total_price'], bins=PRICE_BANDS, labels=BAND_LABELS, right=False)
+    overall = _records(_aggregate(df.groupby('event_title')), 'event_title')[0]
+    del overall['event_title']
+    return {
+        'overall': overall,
+        'by_section': _records(_aggregate(df.groupby('section')), 'section'),
+        'by_price_band': _records(_aggregate(df.groupby(bands, observed=True)), 'band'),
+    }
+
+
+def summarize_events(chunks):
+    """Overall stats per event from row chunks ordered by event_title.
+
+    Only the current chunk and the rows of the event it ends on are held in
+    memory; an event split across chunks is carried over until complete.
+    """
+    results = []
+    carry = None
+    for rows in chunks:
+        df = _frame(rows)
+        if carry is not None:
+            df = pd.concat([carry, df], ignore_index=True)
+        if df.empty:
+            continue
+        complete = df['event_title'] != df['event_title'].iloc[-1]
+        carry = df[~complete]
+        if complete.any():
+            results.append(_aggregate(df[complete].groupby('event_title')))
+    if carry is not None and not carry.empty:
+        results.append(_aggregate(carry.groupby('event_title')))
+    if not results:
+        return []
+    return _records(pd.concat(results), 'event_title')
+
+
+def iter_chunks(cursor, size):
+    """Stream every ticket ordered by event, `size` rows at a time."""
+    cursor.execute(TICKETS_SELECT + " ORDER BY event_title")
+    while True:
+        rows = cursor.fetchmany(size)
+        if not rows:
+            break
+        yield rows
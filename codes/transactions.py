@@ -0,0 +1,142 @@
+import json
+import random
+import threading
+import time
+
+from mysql.connector.errors import DatabaseError
+
+# MySQL errors after which the whole transaction can simply be run again:
+# the server has already rolled back (deadlock) or the statement (lock wait)
+RETRYABLE_ERRORS = {1205: 'lock_wait_timeout', 1213: 'deadlock'}
+DUPLICATE_KEY = 1062
+
+# Responses of committed writes by Idempotency-Key, in IdempotencyKeys
+# (migration 6). The key row is written in the same transaction as the
+# write, so it exists exactly when the write does.
+
+
+class IdempotencyConflict(Exception):
+    """The key was already used for a request with a different body or target."""
+
+
+class TransactionRunner:
+    """Runs work(cursor) -> (body, status) in a transaction on a fresh connection.
+
+    Deadlocks and lock wait timeouts roll back and run the work again after
+    a jittered exponential backoff, until `budget` seconds have passed; the
+    last error is then raised. With an idempotency key the response is
+    stored with the write, and a repeat of the request gets it back instead
+    of writing again.
+    """
+
+    def __init__(self, get_connection, registry, budget=10.0, base_delay=0.05, max_delay=2.0):
+        self.get_connection = get_connection
+        self.budget = budget
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.retries = registry.counter(
+            'db_transaction_retries_total', 'Transactions retried after a lock conflict.', ['endpoint', 'error'])
+        self.exhausted = registry.counter(
+            'db_transaction_retries_exhausted_total', 'Transactions that ran out of retry budget.', ['endpoint'])
+        self.replays = registry.counter(
+            'idempotent_replays_total', 'Writes answered from a stored Idempotency-Key response.', ['endpoint'])
+
+    def backoff(self, attempt):
+        # Full jitter: concurrent losers of the same conflict spread out
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def run(self, work, endpoint, idempotency_key=None, request_hash=None, isolation_level=None):
+        """Returns (body, status, replayed)."""
+        deadline = time.monotonic() + self.budget
+        conn = self.get_connection()
+        try:
+            cursor = conn.cursor()
+            attempt = 0
+            while True:
+                key_claimed = False
+                try:
+                    conn.start_transaction(isolation_level=isolation_level)
+                    if idempotency_key:
+                        cursor.execute("""
+                            INSERT INTO IdempotencyKeys (idempotency_key, request_hash, status_code, response_body)
+                            VALUES (%s, %s, 0, '')
+                        """, (idempotency_key, request_hash))
+                        key_claimed = True
+                    body, status = work(cursor)
+                    if idempotency_key:
+                        cursor.execute("""
+                            UPDATE IdempotencyKeys SET status_code = %s, response_body = %s
+                            WHERE idempotency_key = %s
+                        """, (status, json.dumps(body), idempotency_key))
+                    conn.commit()
+                    return body, status, False
+                except DatabaseError as e:
+                    conn.rollback()
+                    # A duplicate key row means the request already committed
+                    if idempotency_key and not key_claimed and e.errno == DUPLICATE_KEY:
+                        body, status = self._stored(cursor, idempotency_key, request_hash)
+                        self.replays.inc(endpoint)
+                        return body, status, True
+                    error = RETRYABLE_ERRORS.get(e.errno)
+                    if error is None:
+                        raise
+                    delay = self.backoff(attempt)
+                    if time.monotonic() + delay > deadline:
+                        self.exhausted.inc(endpoint)
+                        raise
+                    self.retries.inc(endpoint, error)
+                    attempt += 1
+                    time.sleep(delay)
+                except Exception:
+                    conn.rollback()
+                    raise
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _stored(cursor, idempotency_key, request_hash):
+        cursor.execute("SELECT request_hash, status_code, response_body FROM IdempotencyKeys "
+                       "WHERE idempotency_key = %s", (idempotency_key,))
+        row = cursor.fetchone()
+        cursor.fetchall()
+        if row[0] != request_hash:
+            raise IdempotencyConflict(idempotency_key)
+        return json.loads(row[2]), row[1]
+
+
+def purge_idempotency_keys(conn, max_age_seconds, batch_size=1000):
+    """Delete keys older than `max_age_seconds`; returns how many were removed."""
+    cursor = conn.cursor()
+    try:
+        removed = 0
+        while True:
+            cursor.execute("DELETE FROM IdempotencyKeys WHERE created_at < NOW() - INTERVAL %s SECOND LIMIT %s",
+                           (int(max_age_seconds), batch_size))
+            conn.commit()
+            removed += cursor.rowcount
+            if cursor.rowcount < batch_size:
+                return removed
+    finally:
+        cursor.close()
+
+
+def start_key_purger(get_connection, max_age_seconds, interval):
+    """Run purge_idempotency_keys() now and then every `interval` seconds in a daemon thread."""
+    def run():
+        while True:
+            conn = None
+            try:
+                conn = get_connection()
+                removed = purge_idempotency_keys(conn, max_age_seconds)
+                if removed:
+                    print(f'Purged {removed} expired idempotency key(s)')
+            except Exception as e:
+                print(f'Idempotency key purge failed: {e}')
+            finally:
+                if conn:
+                    conn.close()
+            time.sleep(interval)
+
+    thread = threading.Thread(target=run, name='idempotency-key-purger', daemon=True)
+    thread.start()
+    return thread
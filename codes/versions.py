@@ -0,0 +1,85 @@
+import functools
+import os
+import threading
+import time
+
+from flask import g, make_response, request
+
+
+class VersionCounters:
+    """Per-table change counters for conditional GETs.
+
+    Write routes bump() the tables they touched after committing; listing
+    routes derive their ETag from the counters they read. The epoch keeps
+    ETags from a previous process from matching after a restart.
+
+    For `replica_lag` seconds after a bump a replica may not have the write
+    yet, so conditional_get() sends the reads of views on that table to the
+    primary rather than serve a stale body under the new ETag.
+
+    The counters are per process: a write served by another instance or
+    worker does not bump them. With `max_age`, every ETag also rolls over
+    after at most `max_age` seconds, which bounds how long such a write
+    can be answered with 304.
+    """
+
+    def __init__(self, replica_lag=0.0, max_age=None):
+        self.replica_lag = replica_lag
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._versions = {}
+        self._bumped_at = {}  # name -> time.monotonic() of the last bump
+        self._epoch = f'{os.getpid():x}.{int(time.time()):x}'
+
+    def bump(self, *names):
+        now = time.monotonic()
+        with self._lock:
+            for name in names:
+                self._versions[name] = self._versions.get(name, 0) + 1
+                self._bumped_at[name] = now
+
+    def recently_bumped(self, names):
+        """Whether any of `names` was bumped within the last `replica_lag` seconds."""
+        if self.replica_lag <= 0:
+            return False
+        since = time.monotonic() - self.replica_lag
+        with self._lock:
+            return any(self._bumped_at.get(name, since) > since for name in names)
+
+    def etag(self, names):
+        with self._lock:
+            parts = [str(self._versions.get(name, 0)) for name in names]
+        epoch = self._epoch
+        if self.max_age:
+            epoch += f'.{int(time.time() // self.max_age):x}'
+        return f'{epoch}-' + '.'.join(parts)
+
+
+def conditional_get(versions, tables_for_request, cache_control='private, no-cache'):
+    """Answer If-None-Match with 304 before running the view.
+
+    `tables_for_request()` returns the counter names the response depends
+    on, or None to skip conditional handling (e.g. unauthenticated calls).
+    While one of them was recently bumped, g.read_from_primary is set for
+    the view's reads.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            tables = tables_for_request(*args, **kwargs)
+            if tables is None:
+                return view(*args, **kwargs)
+            etag = versions.etag(tables)
+            if request.if_none_match.contains_weak(etag):
+                response = make_response('', 304)
+            else:
+                if versions.recently_bumped(tables):
+                    g.read_from_primary = True
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag)
+            response.headers['Cache-Control'] = cache_control
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,100 @@
+from wishlist_counts import adjust_wishlist_counts
+
+MAX_BATCH = 200
+
+# One notification per wishlisted event, quoting its wishlist counter (which
+# already includes the user who just added it)
+NOTIFICATIONS_INSERT = """
+    INSERT INTO Notifications (username, event_title, message)
+    SELECT
+        %s,
+        e.event_title,
+        CONCAT('You have added "', e.event_title, '" to your wishlist. ',
+            ' at ', e.location_name, ' (', l.city, ', ', l.state, '). ',
+            'Promoted by ', e.promoter_name, '. ',
+            'Currently, ', GREATEST(COALESCE(c.wishlist_count, 0), 1),
+            ' user(s) have wishlisted this event, including you. ')
+    FROM Events e
+    JOIN Locations l ON e.location_name = l.location_name
+    LEFT JOIN EventWishlistCounts c ON c.event_title = e.event_title
+    WHERE e.event_title IN ({titles})
+"""
+
+
+def _placeholders(n):
+    return ", ".join(["%s"] * n)
+
+
+def parse_titles(value):
+    """Validate an `event_titles` list; returns it de-duplicated, in order."""
+    if not isinstance(value, list) or not value:
+        raise ValueError('event_titles must be a non-empty list')
+    if len(value) > MAX_BATCH:
+        raise ValueError(f'At most {MAX_BATCH} event titles per request')
+    titles = []
+    seen = set()
+    for title in value:
+        if not isinstance(title, str) or not title:
+            raise ValueError('Every event title must be a non-empty string')
+        if title.lower() not in seen:
+            seen.add(title.lower())
+            titles.append(title)
+    return titles
+
+
+def _matching(cursor, sql, params):
+    # Titles compare case-insensitively, like the tables' collation
+    cursor.execute(sql, params)
+    return {row[0].lower() for row in cursor.fetchall()}
+
+
+def add_items(cursor, username, titles, wishlist_date):
+    """Add `titles` to the user's wishlist and write their notifications.
+
+    Runs one multi-row upsert, one counter update and one multi-row
+    notification insert in the caller's transaction. Returns {title: 'added' | 'updated' | 'not_found'}.
+    """
+    events = _matching(cursor, f"SELECT event_title FROM ActiveEvents WHERE event_title IN ({_placeholders(len(titles))})",
+                       tuple(titles))
+    found = [t for t in titles if t.lower() in events]
+    if not found:
+        return {t: 'not_found' for t in titles}
+    # Locked so a concurrent add by the same user cannot count twice
+    listed = _matching(cursor, "SELECT event_title FROM WishList WHERE username = %s "
+                               f"AND event_title IN ({_placeholders(len(found))}) FOR UPDATE",
+                       (username, *found))
+
+    # Sorted so concurrent batches take row locks in the same order
+    rows = sorted(found, key=str.lower)
+    cursor.execute(
+        "INSERT INTO WishList (username, event_title, wishlist_date) VALUES "
+        + ", ".join(["(%s, %s, %s)"] * len(rows))
+        + " ON DUPLICATE KEY UPDATE wishlist_date = VALUES(wishlist_date)",
+        tuple(value for title in rows for value in (username, title, wishlist_date)))
+    adjust_wishlist_counts(cursor, [t for t in found if t.lower() not in listed], 1)
+    cursor.execute(NOTIFICATIONS_INSERT.format(titles=_placeholders(len(found))), (username, *found))
+
+    results = {}
+    for title in titles:
+        if title.lower() not in events:
+            results[title] = 'not_found'
+        else:
+            results[title] = 'updated' if title.lower() in listed else 'added'
+    return results
+
+
+def remove_items(cursor, username, titles):
+    """Delete `titles` from the user's wishlist with one statement and
+    decrement their counters, in the caller's transaction.
+
+    Returns {title: 'removed' | 'not_in_wishlist'}.
+    """
+    in_list = _placeholders(len(titles))
+    listed = _matching(cursor, "SELECT event_title FROM WishList WHERE username = %s "
+                               f"AND event_title IN ({in_list}) FOR UPDATE",
+                       (username, *titles))
+    if listed:
+        cursor.execute(f"DELETE FROM WishList WHERE username = %s AND event_title IN ({in_list})",
+                       (username, *titles))
+        adjust_wishlist_counts(cursor, [t for t in titles if t.lower() in listed], -1)
+    return {t: 'removed' if t.lower() in listed else 'not_in_wishlist' for t in titles}
@@ -0,0 +1,93 @@
+import threading
+import time
+
+# EventWishlistCounts (migration 6): event_title -> number of users with the
+# event wishlisted. Wishlist writes adjust it in their own transaction;
+# reconcile() recounts drifted events. Renaming or deleting an event
+# cascades here like it does to WishList.
+
+# Events whose counter disagrees with WishList, read without locks
+DRIFTED_SQL = """
+    SELECT e.event_title
+    FROM Events e
+    LEFT JOIN (SELECT event_title, COUNT(*) AS n FROM WishList GROUP BY event_title) w
+        ON w.event_title = e.event_title
+    LEFT JOIN EventWishlistCounts c ON c.event_title = e.event_title
+    WHERE COALESCE(w.n, 0) <> COALESCE(c.wishlist_count, 0)
+"""
+
+RECONCILE_BATCH = 500
+
+
+def adjust_wishlist_counts(cursor, event_titles, delta):
+    """Add `delta` to the wishlist count of every event in `event_titles`."""
+    if not event_titles:
+        return
+    # Sorted so concurrent writers lock counter rows in the same order
+    titles = sorted(event_titles, key=str.lower)
+    cursor.execute(
+        "INSERT INTO EventWishlistCounts (event_title, wishlist_count) VALUES "
+        + ", ".join(["(%s, GREATEST(%s, 0))"] * len(titles))
+        + " ON DUPLICATE KEY UPDATE wishlist_count = GREATEST(wishlist_count + %s, 0)",
+        tuple(value for title in titles for value in (title, delta)) + (delta,))
+
+
+def reconcile(conn, batch_size=RECONCILE_BATCH):
+    """Recount the events whose counter drifted; returns how many were repaired.
+
+    Finding drift takes no locks. Each batch of drifted events is then
+    recounted in a short transaction that only locks their WishList rows.
+    """
+    cursor = conn.cursor()
+    try:
+        cursor.execute(DRIFTED_SQL)
+        drifted = [row[0] for row in cursor.fetchall()]
+        conn.commit()
+        repaired = 0
+        for start in range(0, len(drifted), batch_size):
+            batch = drifted[start:start + batch_size]
+            conn.start_transaction()
+            cursor.execute(f"""
+                INSERT INTO EventWishlistCounts (event_title, wishlist_count)
+                SELECT e.event_title, COUNT(w.username)
+                FROM Events e
+                LEFT JOIN WishList w ON w.event_title = e.event_title
+                WHERE e.event_title IN ({", ".join(["%s"] * len(batch))})
+                GROUP BY e.event_title
+                ON DUPLICATE KEY UPDATE wishlist_count = VALUES(wishlist_count)
+            """, tuple(batch))
+            conn.commit()
+            repaired += len(batch)
+        return repaired
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+
+def start_reconciler(get_connection, interval, on_repaired=None):
+    """Run reconcile() now and then every `interval` seconds in a daemon thread.
+
+    `on_repaired(count)` runs after a pass that repaired counters.
+    """
+    def run():
+        while True:
+            conn = None
+            try:
+                conn = get_connection()
+                repaired = reconcile(conn)
+                if repaired:
+                    print(f'EventWishlistCounts reconcile repaired {repaired} event(s)')
+                    if on_repaired:
+                        on_repaired(repaired)
+            except Exception as e:
+                print(f'EventWishlistCounts reconcile failed: {e}')
+            finally:
+                if conn:
+                    conn.close()
+            time.sleep(interval)
+
+    thread = threading.Thread(target=run, name='wishlist-counts-reconciler', daemon=True)
+    thread.start()
+    return thread